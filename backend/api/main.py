@@ -1,4 +1,6 @@
-from flask import Flask
+import os
+from flask import Flask, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from dotenv import load_dotenv
 from backend.api.routes.ollama_routes import ollama_bp
@@ -7,6 +9,15 @@ from backend.api.routes.layoutlmv3_routes import layoutlmv3_bp
 from backend.api.routes.extraction_routes import extraction_bp
 from backend.api.routes.auth_routes import auth_bp, init_db
 from backend.api.routes.invoice_routes import invoice_bp, init_invoice_db
+from backend.api.routes.job_routes import jobs_bp
+from backend.api.routes.metrics_routes import metrics_bp
+from backend.api.routes.profiling_routes import profiling_bp
+from backend.services.job_queue import init_job_db
+from backend.services.extraction_jobs import start_job_workers
+from backend.services.ollama_manager import get_ollama_manager
+from backend.utils.uploads import UploadRequest, REQUEST_MAX_BYTES
+from backend.services.admission import install_admission
+from backend.utils.metrics import REGISTRY
 
 # Load environment variables
 load_dotenv()
@@ -14,12 +25,26 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
+# Uploads are kept in memory (spooled to disk only when large) and the
+# request body size is capped while it is read
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = REQUEST_MAX_BYTES
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    # Raised while the body is parsed, before the view sees the upload
+    return jsonify({'error': e.description}), 413
+
 # Enable CORS for frontend communication
 CORS(app, supports_credentials=True)
 
+# Priority lanes, per-user fair share and 429s in front of the engines
+install_admission(app)
+
 # Initialize databases
 init_db()
 init_invoice_db()
+init_job_db()
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -28,7 +53,29 @@ app.register_blueprint(ollama_bp, url_prefix='/api/ollama')
 app.register_blueprint(groq_bp, url_prefix='/api/groq')
 app.register_blueprint(layoutlmv3_bp, url_prefix='/api/layoutlmv3')
 app.register_blueprint(extraction_bp, url_prefix='/api/extraction')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+app.register_blueprint(metrics_bp)
+app.register_blueprint(profiling_bp, url_prefix='/api/profiles')
+
+def start_background_tasks():
+    """
+    Start the per-process background threads. Called once the serving
+    process exists: below for the development server, from the gunicorn
+    post_fork hook in production (threads do not survive a fork).
+    """
+    # Load the Ollama model in the background so the first request finds it warm
+    if os.getenv('OLLAMA_PRELOAD', '1') != '0':
+        get_ollama_manager().preload_async()
+
+    # Background workers for /api/jobs (JOB_WORKERS=0 to run none in this process)
+    start_job_workers()
+
+    # Share this worker's metrics with the others (gunicorn sets METRICS_DIR)
+    REGISTRY.start_flusher()
 
 if __name__ == '__main__':
+    # With the reloader only the child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
     app.run(debug=True)
 #python -m backend.api.main
@@ -3,23 +3,24 @@ import sqlite3
 import hashlib
 import os
 from datetime import datetime
+from backend.utils.db import get_connection, transaction
 
 auth_bp = Blueprint('auth', __name__)
 
+# Usernames allowed to use admin tools (request profiling), comma-separated
+ADMIN_USERS = {name.strip() for name in os.getenv('ADMIN_USERS', '').split(',') if name.strip()}
+
 def init_db():
     """Initialize the SQLite database for users"""
-    conn = sqlite3.connect('invoices.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
 
 def hash_password(password):
     """Hash a password using SHA-256"""
@@ -44,13 +45,9 @@ def register():
         
         password_hash = hash_password(password)
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', 
-                         (username, password_hash))
-            conn.commit()
+            cursor = get_connection().execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', 
+                                              (username, password_hash))
             user_id = cursor.lastrowid
             
             # Log in the user after registration
@@ -67,8 +64,6 @@ def register():
             
         except sqlite3.IntegrityError:
             return jsonify({'error': 'Username already exists'}), 409
-        finally:
-            conn.close()
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -86,13 +81,8 @@ def login():
         
         password_hash = hash_password(password)
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, username FROM users WHERE username = ? AND password_hash = ?', 
-                      (username, password_hash))
-        user = cursor.fetchone()
-        conn.close()
+        user = get_connection().execute('SELECT id, username FROM users WHERE username = ? AND password_hash = ?', 
+                                        (username, password_hash)).fetchone()
         
         if user:
             user_id, username = user
@@ -141,4 +131,19 @@ def require_auth(f):
             return jsonify({'error': 'Authentication required'}), 401
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
-    return decorated_function 
\ No newline at end of file
+    return decorated_function
+
+def is_admin():
+    """Whether the signed-in user is listed in ADMIN_USERS"""
+    return 'user_id' in session and session.get('username') in ADMIN_USERS
+
+def require_admin(f):
+    """Decorator to require an admin user"""
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Authentication required'}), 401
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
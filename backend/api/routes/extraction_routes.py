@@ -1,66 +1,163 @@
-from flask import Blueprint, request, jsonify
-import os
-import tempfile
-import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g, session
+import json
 from backend.services.ollama_service import build_llm_prompt, call_ollama
 from backend.services.layoutlmv3_service import extract_with_layoutlmv3
+from backend.services.cascade_service import extract_with_cascade
+from backend.services.llm_cache import cache_bypassed
+from backend.services.llm_backends import LLM_BACKENDS
+from backend.services.hedging import hedged_extract
+from backend.services.chunked_extraction import needs_chunking, extract_chunked
+from backend.services.extraction_jobs import params_from_form, validate_job_params
+from backend.services.batch_extraction import process_batch
+from backend.services.compare_extraction import compare_extract, parse_engines
 from backend.utils.utils import run_paddle_ocr
+from backend.utils.uploads import read_upload, UploadError, REQUEST_MAX_BYTES
+from backend.services.staging import staging_fields
+from backend.services.admission import check_admission, engines_for, too_busy, AdmissionRejected
+from backend.services.single_flight import coalesce_extraction, extraction_key
 
 extraction_bp = Blueprint('extraction_bp', __name__)
 
-def safe_delete_file(file_path, max_retries=3):
-    """Safely delete a file with retries for Windows file locking issues"""
-    for attempt in range(max_retries):
+def _extract(upload, method, form, use_cache):
+    """
+    Run an extraction method on an upload; returns (body, status). The
+    result is shared by identical requests in flight, so everything read
+    here must be part of their single-flight key.
+    """
+    if method == 'llm':
+        # Use LLM approach
+        ocr_tokens = run_paddle_ocr(upload.image())
+        prompt = build_llm_prompt(ocr_tokens)
+        if needs_chunking(ocr_tokens):
+            extracted_fields = extract_chunked(ocr_tokens, backend='ollama', use_cache=use_cache)
+        else:
+            extracted_fields = call_ollama(prompt, use_cache=use_cache)
+    elif method == 'layoutlmv3':
+        # Use LayoutLMv3 approach
+        extracted_fields = extract_with_layoutlmv3(upload.image())
+    elif method == 'cascade':
+        # LayoutLMv3 first, LLM only for low-confidence fields (and items if no table was found)
+        llm_backend = form.get('llm_backend', 'groq')
+        if llm_backend not in LLM_BACKENDS:
+            return {'error': 'Invalid llm_backend'}, 400
+        extracted_fields = extract_with_cascade(
+            upload.image(), llm_backend=llm_backend, use_cache=use_cache
+        )
+    elif method == 'hedged':
+        # Primary LLM backend, hedged to the secondary if it is slow
+        primary = form.get('primary', 'groq')
+        secondary = form.get('secondary', 'ollama')
+        if primary not in LLM_BACKENDS or secondary not in LLM_BACKENDS or primary == secondary:
+            return {'error': 'primary and secondary must be two different LLM backends'}, 400
         try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-                return True
-        except PermissionError:
-            if attempt < max_retries - 1:
-                time.sleep(0.1)  # Small delay before retry
-            else:
-                print(f"Warning: Could not delete temporary file {file_path}")
-                return False
-        except Exception as e:
-            print(f"Warning: Error deleting file {file_path}: {e}")
-            return False
-    return True
+            hedge_delay = float(form['hedge_delay']) if form.get('hedge_delay') else None
+            timeout = float(form['deadline']) if form.get('deadline') else None
+        except ValueError:
+            return {'error': 'hedge_delay and deadline must be numbers of seconds'}, 400
+
+        ocr_tokens = run_paddle_ocr(upload.image())
+        if not ocr_tokens:
+            return {'error': 'No text found in image'}, 400
+        outcome = hedged_extract(
+            build_llm_prompt(ocr_tokens), primary, secondary,
+            hedge_delay=hedge_delay, timeout=timeout, use_cache=use_cache
+        )
+        if outcome['extracted_fields'] is None:
+            return {
+                'error': 'No LLM backend returned a valid result before the deadline',
+                'hedged': outcome['hedged']
+            }, 504
+        return {'method': method, **outcome}, 200
+    elif method == 'compare':
+        # One OCR pass shared by all selected engines, run concurrently
+        engines, error = parse_engines(form.get('engines', ''))
+        if error:
+            return {'error': error}, 400
+        llm_backend = form.get('llm_backend', 'groq')
+        if llm_backend not in LLM_BACKENDS:
+            return {'error': 'Invalid llm_backend'}, 400
+        try:
+            timeout = float(form['deadline']) if form.get('deadline') else None
+        except ValueError:
+            return {'error': 'deadline must be a number of seconds'}, 400
+
+        outcome = compare_extract(
+            upload.image(), engines, use_cache=use_cache,
+            timeout=timeout, llm_backend=llm_backend
+        )
+        return {'method': method, **outcome}, 200
+    elif method == 'donut':
+        # Use Donut approach (you'll need to implement this)
+        extracted_fields = extract_with_donut(upload.image())
+    else:
+        return {'error': 'Invalid method'}, 400
+    
+    return {'method': method, 'extracted_fields': extracted_fields}, 200
 
 @extraction_bp.route('/extract', methods=['POST'])
 def extract_invoice():
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
-    file = request.files['file']
-    method = request.form.get('method', 'llm')  # llm, layoutlmv3, donut
+    method = request.form.get('method', 'llm')  # llm, layoutlmv3, cascade, hedged, compare, donut
     
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    # Turn the request away now rather than after decoding and OCR
+    try:
+        check_admission(engines_for(
+            method, primary=request.form.get('primary', 'groq'),
+            engines=parse_engines(request.form.get('engines', ''))[0]
+        ))
+    except AdmissionRejected as e:
+        return too_busy(e)
     
-    # Use temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-        file.save(tmp_file.name)
+    try:
+        upload = read_upload(request.files['file'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    
+    g.extraction_method = method
+    # The document is decoded once in memory and handed to the engines
+    with upload:
         try:
-            if method == 'llm':
-                # Use LLM approach
-                ocr_tokens = run_paddle_ocr(tmp_file.name)
-                prompt = build_llm_prompt(ocr_tokens)
-                extracted_fields = call_ollama(prompt)
-            elif method == 'layoutlmv3':
-                # Use LayoutLMv3 approach
-                extracted_fields = extract_with_layoutlmv3(tmp_file.name)
-            elif method == 'donut':
-                # Use Donut approach (you'll need to implement this)
-                extracted_fields = extract_with_donut(tmp_file.name)
-            else:
-                return jsonify({'error': 'Invalid method'}), 400
-            
-            return jsonify({
-                'method': method,
-                'extracted_fields': extracted_fields
-            })
+            # Identical concurrent submissions (double clicks, retries) share one run
+            options = {key: value for key, value in request.form.items() if key != 'method'}
+            options['use_cache'] = not cache_bypassed(request)
+            body, status = coalesce_extraction(
+                extraction_key('route', upload.sha256(), method, options),
+                lambda: _extract(upload, method, request.form, options['use_cache'])
+            )
+            if status != 200:
+                return jsonify(body), status
+            # Lets the save endpoint reuse this upload instead of a second one
+            return jsonify({**body, **staging_fields(upload, session.get('user_id'))})
+        except AdmissionRejected as e:
+            return too_busy(e)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
-        finally:
-            # Clean up temporary file with retry mechanism
-            safe_delete_file(tmp_file.name)
+
+@extraction_bp.route('/batch', methods=['POST'])
+def extract_batch():
+    """
+    Extract many documents (several 'files' and/or zip archives) with one
+    request. Results are streamed as NDJSON, one line per document in
+    completion order, followed by a summary line.
+    """
+    # Zip archives hold many documents: parts are only capped by the request size
+    request.upload_max_bytes = REQUEST_MAX_BYTES
+    files = request.files.getlist('files') + request.files.getlist('file')
+    files = [f for f in files if f.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+
+    method = request.form.get('method', 'layoutlmv3')
+    params, error = params_from_form(request.form)
+    error = error or validate_job_params(method, params)
+    if error:
+        return jsonify({'error': error}), 400
+
+    def lines():
+        for result in process_batch(files, method, params):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,76 +1,99 @@
-import os
-import tempfile
-import time
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g, session
 from backend.utils.utils import run_paddle_ocr
-from backend.services.groq_service import GroqService
+from backend.utils.uploads import read_upload, UploadError
+from backend.services.staging import staging_fields
+from backend.services.admission import check_admission, engines_for, too_busy, AdmissionRejected
+from backend.services.groq_service import get_groq_service
 from backend.utils.prompts import build_llm_prompt
+from backend.utils.streaming import wants_event_stream, stream_extraction_events, replay_extraction_events
+from backend.services.llm_cache import cache_bypassed
+from backend.services.chunked_extraction import needs_chunking, extract_chunked
+from backend.services.single_flight import coalesce_extraction, extraction_key
 
 groq_bp = Blueprint('groq_bp', __name__)
 
-_groq_service = None
-def get_groq_service():
-    global _groq_service
-    if _groq_service is None:
-        try:
-            _groq_service = GroqService()
-        except Exception as e:
-            print(f"Warning: Could not initialize Groq service: {e}")
-            return None
-    return _groq_service
-
-def safe_delete_file(file_path, max_retries=5):
-    """Safely delete a file with retries."""
-    for attempt in range(max_retries):
-        try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-                print(f"Successfully deleted: {file_path}")
-                return True
-        except PermissionError as e:
-            if attempt < max_retries - 1:
-                print(f"Attempt {attempt + 1}: File {file_path} is still in use, retrying...")
-                time.sleep(0.1)
-            else:
-                print(f"Warning: Could not delete {file_path} after {max_retries} attempts: {e}")
-                return False
-        except Exception as e:
-            print(f"Error deleting {file_path}: {e}")
-            return False
-    return True
+def _extract_groq(groq_service, upload, use_cache):
+    """OCR and Groq extraction of an upload: (extracted_fields, chunked), or None without text"""
+    ocr_tokens = run_paddle_ocr(upload.image())
+    if not ocr_tokens:
+        return None
+    prompt = build_llm_prompt(ocr_tokens)
+    # Long documents are extracted chunk by chunk in parallel
+    if needs_chunking(ocr_tokens):
+        return extract_chunked(ocr_tokens, backend='groq', use_cache=use_cache), True
+    return groq_service.call_groq(prompt, use_cache=use_cache), False
 
 @groq_bp.route('/extract_llm_groq', methods=['POST'])
 def extract_llm_groq():
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
     groq_service = get_groq_service()
     if groq_service is None:
         return jsonify({'error': 'Groq service not available. Please set GROQ_API_KEY environment variable.'}), 503
     
-    # Save uploaded file to temporary location
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-        file.save(tmp_file.name)
+    # Turn the request away now rather than after decoding and OCR
+    try:
+        check_admission(engines_for('groq'))
+    except AdmissionRejected as e:
+        return too_busy(e)
+    
+    try:
+        upload = read_upload(request.files['file'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    
+    g.extraction_method = 'groq'
+    # OCR the upload straight from memory
+    with upload:
         try:
-            # Run OCR
-            ocr_tokens = run_paddle_ocr(tmp_file.name)
+            use_cache = not cache_bypassed(request)
+            if not wants_event_stream(request):
+                # Identical concurrent uploads share one OCR + LLM run
+                outcome = coalesce_extraction(
+                    extraction_key('route', upload.sha256(), 'groq', {'use_cache': use_cache}),
+                    lambda: _extract_groq(groq_service, upload, use_cache)
+                )
+                if outcome is None:
+                    return jsonify({'error': 'No text found in image'}), 400
+                extracted_fields, chunked = outcome
+                
+                return jsonify({
+                    'method': 'llm',
+                    'extracted_fields': extracted_fields,
+                    'chunked': chunked,
+                    # Lets the save endpoint reuse this upload instead of a second one
+                    **staging_fields(upload, session.get('user_id'))
+                })
+            
+            # Event stream: run OCR, then relay the LLM output as it is generated
+            ocr_tokens = run_paddle_ocr(upload.image())
             if not ocr_tokens:
                 return jsonify({'error': 'No text found in image'}), 400
             
             # Build prompt and call Groq
             prompt = build_llm_prompt(ocr_tokens)
-            extracted_fields = groq_service.call_groq(prompt)
-            
-            return jsonify({
-                'method': 'llm',
-                'extracted_fields': extracted_fields
-            })
+            # Long documents are extracted chunk by chunk in parallel
+            chunked = needs_chunking(ocr_tokens)
+            cached = groq_service.get_cached_result(prompt) if use_cache and not chunked else None
+            # Staged now, while the upload is open; the id comes with the 'done' event
+            staging = staging_fields(upload, session.get('user_id'))
+            if chunked:
+                events = replay_extraction_events(
+                    extract_chunked(ocr_tokens, backend='groq', use_cache=use_cache), cached=False,
+                    done_fields=staging
+                )
+            elif cached is not None:
+                events = replay_extraction_events(cached, done_fields=staging)
+            else:
+                events = stream_extraction_events(
+                    groq_service.stream_groq(prompt), groq_service._get_empty_result(), done_fields=staging,
+                    on_complete=(lambda result: groq_service.cache_result(prompt, result)) if use_cache else None
+                )
+            return Response(stream_with_context(events), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
             
+        except AdmissionRejected as e:
+            return too_busy(e)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
-        finally:
-            safe_delete_file(tmp_file.name)
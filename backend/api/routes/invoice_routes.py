@@ -1,11 +1,15 @@
-from flask import Blueprint, request, jsonify, session
-import sqlite3
+from flask import Blueprint, request, jsonify, session, current_app, send_file, redirect, url_for
+import base64
 import json
 import os
 import shutil
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from backend.api.routes.auth_routes import require_auth
+from backend.utils.db import get_connection, transaction
+from backend.services.staging import get_staging_store, StagingError
+from backend.services.thumbnails import THUMBNAIL_WIDTHS, create_thumbnails, file_sha256, thumbnail_path
+from backend.services.blob_store import get_blob_store
 
 invoice_bp = Blueprint('invoice', __name__)
 
@@ -37,9 +41,41 @@ def resolve_image_path(stored_path: str) -> str | None:
     except Exception:
         return None
 
+# Fields of the invoice JSON copied into columns, so listings never decode it
+SUMMARY_FIELDS = ('invoice_number', 'supplier_name', 'customer_name', 'invoice_total')
+
+def selected_value(fields, key):
+    """Selected value of a field of the extracted fields structure (first candidate if none)"""
+    try:
+        value_obj = fields.get(key)
+        if isinstance(value_obj, dict):
+            selected = value_obj.get('selected')
+            # If candidates only and no selected, fallback to first candidate value
+            if not selected and isinstance(value_obj.get('candidates'), list) and value_obj['candidates']:
+                return value_obj['candidates'][0].get('value')
+            return selected
+        return None
+    except Exception:
+        return None
+
+def summary_values(fields):
+    """Values of the SUMMARY_FIELDS columns for an invoice's extracted fields (dict or JSON)"""
+    if isinstance(fields, str):
+        try:
+            fields = json.loads(fields)
+        except ValueError:
+            fields = {}
+    if not isinstance(fields, dict):
+        fields = {}
+    values = []
+    for key in SUMMARY_FIELDS:
+        value = selected_value(fields, key)
+        values.append(value if value is None or isinstance(value, (str, int, float)) else json.dumps(value))
+    return tuple(values)
+
 def init_invoice_db():
     """Initialize the SQLite database for invoices"""
-    conn = sqlite3.connect('invoices.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS invoices (
@@ -64,34 +100,62 @@ def init_invoice_db():
             FOREIGN KEY (invoice_id) REFERENCES invoices (id)
         )
     ''')
-    conn.commit()
+    # Uploaded files by content hash, with the number of invoices using each
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
     # Lightweight migration: ensure 'status' column exists
     try:
         cursor.execute("PRAGMA table_info(invoices)")
         cols = [row[1] for row in cursor.fetchall()]
         if 'status' not in cols:
             cursor.execute("ALTER TABLE invoices ADD COLUMN status TEXT NOT NULL DEFAULT 'Draft'")
-            conn.commit()
+        # Content hash of the image: names its thumbnails and is its ETag
+        if 'image_hash' not in cols:
+            cursor.execute("ALTER TABLE invoices ADD COLUMN image_hash TEXT")
+        # Summary columns for listings, filled once from the existing JSON
+        missing = [key for key in SUMMARY_FIELDS if key not in cols]
+        if missing:
+            with transaction():
+                for key in missing:
+                    cursor.execute(f"ALTER TABLE invoices ADD COLUMN {key}")
+                rows = cursor.execute("SELECT id, extracted_fields FROM invoices").fetchall()
+                cursor.executemany(
+                    f"UPDATE invoices SET {', '.join(f'{key} = ?' for key in SUMMARY_FIELDS)} WHERE id = ?",
+                    [(*summary_values(fields), invoice_id) for invoice_id, fields in rows]
+                )
     except Exception:
         # If pragma fails, proceed without blocking app startup
         pass
-
-    conn.close()
+    # Listing pages walk this index newest first (id breaks ties, being the rowid)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_invoices_user_created
+        ON invoices (user_id, created_at)
+    ''')
 
 @invoice_bp.route('/invoices', methods=['POST'])
 @require_auth
 def save_invoice():
-    """Save extracted invoice data with file upload"""
+    """Save extracted invoice data with file upload (or a staged upload's staging_id)"""
     try:
         user_id = session['user_id']
         
-        # Check if file was uploaded
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'error': 'No image file selected'}), 400
+        # The image either comes from an extraction (staged on the server)
+        # or is uploaded with the request
+        staging_id = request.form.get('staging_id')
+        if not staging_id:
+            if 'image' not in request.files:
+                return jsonify({'error': 'No image file provided'}), 400
+            
+            file = request.files['image']
+            if file.filename == '':
+                return jsonify({'error': 'No image file selected'}), 400
         
         # Get extracted fields from request
         extracted_fields = request.form.get('extracted_fields')
@@ -106,31 +170,48 @@ def save_invoice():
         except json.JSONDecodeError:
             return jsonify({'error': 'Invalid JSON in extracted_fields'}), 400
         
-        # Save image file
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{user_id}_{timestamp}_{filename}"
-        image_path = os.path.join(UPLOADS_DIR, unique_filename)
-        
-        file.save(image_path)
-        
-        # Save to database
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO invoices (user_id, image_path, extracted_fields, method)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, image_path, extracted_fields, method))
-        
-        invoice_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # Uploads go to the content-addressed blob store: identical files
+        # are stored once, whoever uploads them
+        blobs = get_blob_store()
+        if staging_id:
+            # Promote the staged upload with a rename, no second upload
+            staging = get_staging_store()
+            try:
+                meta = staging.get(staging_id, user_id)
+                ext = meta['ext']
+                incoming_path = blobs.incoming_path(ext)
+                staging.promote(staging_id, user_id, incoming_path)
+            except StagingError as e:
+                return jsonify({'error': str(e)}), e.status_code
+        else:
+            # Save image file
+            ext = os.path.splitext(secure_filename(file.filename))[1]
+            incoming_path = blobs.incoming_path(ext)
+            file.save(incoming_path)
+        image_hash = file_sha256(incoming_path)
+        
+        # Save to database; the invoice and its blob reference commit together
+        with transaction(immediate=True) as conn:
+            image_hash, image_path = blobs.add(conn, incoming_path, ext, image_hash)
+            cursor = conn.execute('''
+                INSERT INTO invoices (user_id, image_path, extracted_fields, method, image_hash,
+                                      invoice_number, supplier_name, customer_name, invoice_total)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, image_path, extracted_fields, method, image_hash, *summary_values(fields_data)))
+            
+            invoice_id = cursor.lastrowid
+        
+        # Render the dashboard thumbnails now rather than on first view
+        try:
+            create_thumbnails(image_path, image_hash)
+        except Exception as e:
+            print(f"Could not create thumbnails for {image_path}: {str(e)}")
         
         return jsonify({
             'message': 'Invoice saved successfully',
             'invoice_id': invoice_id,
-            'image_path': image_path
+            'image_path': image_path,
+            'image_hash': image_hash
         }), 201
         
     except Exception as e:
@@ -155,17 +236,13 @@ def save_invoice_data():
         image_path = f"placeholder_{user_id}_{timestamp}.txt"
         
         # Save to database
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO invoices (user_id, image_path, extracted_fields, method)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, image_path, json.dumps(extracted_fields), method))
+        cursor = get_connection().execute('''
+            INSERT INTO invoices (user_id, image_path, extracted_fields, method,
+                                  invoice_number, supplier_name, customer_name, invoice_total)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, image_path, json.dumps(extracted_fields), method, *summary_values(extracted_fields)))
         
         invoice_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
         
         return jsonify({
             'message': 'Invoice data saved successfully',
@@ -175,77 +252,109 @@ def save_invoice_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Page size of the invoice listing (?limit=)
+INVOICE_PAGE_SIZE = 50
+INVOICE_PAGE_MAX = 200
+# Fields a listing can project with ?fields= (comma-separated, or "summary")
+INVOICE_LIST_FIELDS = ('id', 'image_path', 'image_exists', 'image_hash', 'extracted_fields',
+                       'method', 'status', 'created_at') + SUMMARY_FIELDS
+INVOICE_SUMMARY = ('id', 'image_exists', 'image_hash', 'method', 'status', 'created_at') + SUMMARY_FIELDS
+# Whether an invoice has a stored image, from the row alone (no filesystem check)
+_HAS_IMAGE_SQL = "(image_hash IS NOT NULL OR image_path NOT LIKE 'placeholder\\_%' ESCAPE '\\')"
+
+def encode_cursor(created_at, invoice_id):
+    """Opaque cursor of the page following a row"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, invoice_id]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError if malformed"""
+    try:
+        created_at, invoice_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, str) or not isinstance(invoice_id, int):
+        raise ValueError('Invalid cursor')
+    return created_at, invoice_id
+
+def _list_fields(value):
+    """Fields requested by ?fields= (None: every field, as before projections existed)"""
+    if not value:
+        return None
+    if value == 'summary':
+        return INVOICE_SUMMARY
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in INVOICE_LIST_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Invalid fields, expected 'summary' or some of {', '.join(INVOICE_LIST_FIELDS)}")
+    return fields
+
 @invoice_bp.route('/invoices', methods=['GET'])
 @require_auth
 def get_user_invoices():
-    """Get all invoices for the current user"""
+    """
+    Get the current user's invoices, newest first, one page at a time:
+    ?limit= (default 50), ?cursor= (next_cursor of the previous page) and
+    ?fields= to return only some fields ("summary" for the dashboard cards,
+    read from columns without decoding the extracted fields).
+    """
     try:
         user_id = session['user_id']
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
+        try:
+            limit = int(request.args.get('limit', INVOICE_PAGE_SIZE))
+            if not 1 <= limit <= INVOICE_PAGE_MAX:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': f'limit must be between 1 and {INVOICE_PAGE_MAX}'}), 400
+        try:
+            fields = _list_fields(request.args.get('fields'))
+            after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Without a projection every field is returned, image_exists checked on disk
+        projected = fields is not None
+        fields = fields or INVOICE_LIST_FIELDS
+        columns = {'id', 'created_at'} | set(fields)
+        if not projected:
+            columns.add('image_path')
+        select = ', '.join(
+            f"{_HAS_IMAGE_SQL} AS image_exists" if name == 'image_exists' else name
+            for name in INVOICE_LIST_FIELDS if name in columns
+        )
         
-        cursor.execute('''
-            SELECT id, image_path, extracted_fields, method, status, created_at
+        # Keyset pagination: continue strictly after the cursor's (created_at, id)
+        where = 'user_id = ?'
+        params = [user_id]
+        if after is not None:
+            where += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+            params += [after[0], after[0], after[1]]
+        rows = get_connection().execute(f'''
+            SELECT {select}
             FROM invoices 
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        ''', (user_id,))
+            WHERE {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit + 1)).fetchall()
         
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         invoices = []
-        for row in cursor.fetchall():
-            try:
-                invoice_id, image_path, extracted_fields, method, status, created_at = row
-
-                # Safely check if image file exists
-                try:
-                    # Resolve absolute path considering project root
-                    resolved_path = resolve_image_path(image_path)
-                    image_exists = bool(resolved_path)
-                except Exception:
-                    image_exists = False
-
+        for row in rows:
+            invoice = {name: row[name] for name in fields if name not in ('image_exists', 'extracted_fields')}
+            if 'image_exists' in fields:
+                invoice['image_exists'] = resolve_image_path(row['image_path']) is not None if not projected \
+                    else bool(row['image_exists'])
+            if 'extracted_fields' in fields:
                 # Safely parse extracted_fields JSON
                 try:
-                    parsed_fields = json.loads(extracted_fields) if isinstance(extracted_fields, str) else (extracted_fields or {})
+                    invoice['extracted_fields'] = json.loads(row['extracted_fields']) if row['extracted_fields'] else {}
                 except Exception:
-                    parsed_fields = {}
-
-                # Helper to get a simple summary value from extracted fields structure
-                def get_selected(fields: dict, key: str):
-                    try:
-                        value_obj = fields.get(key)
-                        if isinstance(value_obj, dict):
-                            selected = value_obj.get('selected')
-                            # If candidates only and no selected, fallback to first candidate value
-                            if not selected and isinstance(value_obj.get('candidates'), list) and value_obj['candidates']:
-                                return value_obj['candidates'][0].get('value')
-                            return selected
-                        return None
-                    except Exception:
-                        return None
-
-                invoices.append({
-                    'id': invoice_id,
-                    'image_path': image_path,
-                    'image_exists': image_exists,
-                    'extracted_fields': parsed_fields,
-                    'method': method,
-                    'status': status,
-                    'created_at': created_at,
-                    # Flatten common fields for easier frontend use
-                    'invoice_number': get_selected(parsed_fields, 'invoice_number'),
-                    'supplier_name': get_selected(parsed_fields, 'supplier_name'),
-                    'customer_name': get_selected(parsed_fields, 'customer_name'),
-                    'invoice_total': get_selected(parsed_fields, 'invoice_total')
-                })
-            except Exception:
-                # Skip malformed rows rather than failing the entire response
-                continue
-        
-        conn.close()
-        
-        return jsonify({'invoices': invoices}), 200
+                    invoice['extracted_fields'] = {}
+            invoices.append(invoice)
+        
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+        return jsonify({'invoices': invoices, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -257,22 +366,16 @@ def get_invoice(invoice_id):
     try:
         user_id = session['user_id']
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, image_path, extracted_fields, method, status, created_at
+        row = get_connection().execute('''
+            SELECT id, image_path, extracted_fields, method, status, created_at, image_hash
             FROM invoices 
             WHERE id = ? AND user_id = ?
-        ''', (invoice_id, user_id))
-        
-        row = cursor.fetchone()
-        conn.close()
+        ''', (invoice_id, user_id)).fetchone()
         
         if not row:
             return jsonify({'error': 'Invoice not found'}), 404
         
-        invoice_id, image_path, extracted_fields, method, status, created_at = row
+        invoice_id, image_path, extracted_fields, method, status, created_at, image_hash = row
 
         # Safely check if image file exists
         try:
@@ -287,30 +390,19 @@ def get_invoice(invoice_id):
         except Exception:
             parsed_fields = {}
 
-        def get_selected(fields: dict, key: str):
-            try:
-                value_obj = fields.get(key)
-                if isinstance(value_obj, dict):
-                    selected = value_obj.get('selected')
-                    if not selected and isinstance(value_obj.get('candidates'), list) and value_obj['candidates']:
-                        return value_obj['candidates'][0].get('value')
-                    return selected
-                return None
-            except Exception:
-                return None
-
         return jsonify({
             'id': invoice_id,
             'image_path': image_path,
             'image_exists': image_exists,
+            'image_hash': image_hash,
             'extracted_fields': parsed_fields,
             'method': method,
             'status': status,
             'created_at': created_at,
-            'invoice_number': get_selected(parsed_fields, 'invoice_number'),
-            'supplier_name': get_selected(parsed_fields, 'supplier_name'),
-            'customer_name': get_selected(parsed_fields, 'customer_name'),
-            'invoice_total': get_selected(parsed_fields, 'invoice_total')
+            'invoice_number': selected_value(parsed_fields, 'invoice_number'),
+            'supplier_name': selected_value(parsed_fields, 'supplier_name'),
+            'customer_name': selected_value(parsed_fields, 'customer_name'),
+            'invoice_total': selected_value(parsed_fields, 'invoice_total')
         }), 200
         
     except Exception as e:
@@ -334,26 +426,16 @@ def update_invoice(invoice_id):
         except json.JSONDecodeError:
             return jsonify({'error': 'Invalid JSON in extracted_fields'}), 400
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        # Check if invoice exists and belongs to user
-        cursor.execute('SELECT id FROM invoices WHERE id = ? AND user_id = ?', 
-                      (invoice_id, user_id))
-        
-        if not cursor.fetchone():
-            conn.close()
-            return jsonify({'error': 'Invoice not found'}), 404
-        
-        # Update the invoice
-        cursor.execute('''
+        # Update the invoice if it exists and belongs to user
+        cursor = get_connection().execute('''
             UPDATE invoices 
-            SET extracted_fields = ?, status = ?
+            SET extracted_fields = ?, status = ?,
+                invoice_number = ?, supplier_name = ?, customer_name = ?, invoice_total = ?
             WHERE id = ? AND user_id = ?
-        ''', (json.dumps(fields_data), data.get('status', 'Draft'), invoice_id, user_id))
+        ''', (json.dumps(fields_data), data.get('status', 'Draft'), *summary_values(fields_data), invoice_id, user_id))
         
-        conn.commit()
-        conn.close()
+        if cursor.rowcount == 0:
+            return jsonify({'error': 'Invoice not found'}), 404
         
         return jsonify({'message': 'Invoice updated successfully'}), 200
         
@@ -367,29 +449,39 @@ def delete_invoice(invoice_id):
     try:
         user_id = session['user_id']
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        # Get image path before deleting
-        cursor.execute('SELECT image_path FROM invoices WHERE id = ? AND user_id = ?', 
-                      (invoice_id, user_id))
-        
-        row = cursor.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({'error': 'Invoice not found'}), 404
-        
-        image_path = row[0]
-        
-        # Delete from database
-        cursor.execute('DELETE FROM invoices WHERE id = ? AND user_id = ?', 
-                      (invoice_id, user_id))
-        
-        conn.commit()
-        conn.close()
+        blobs = get_blob_store()
+        with transaction(immediate=True) as conn:
+            # Get image path before deleting
+            row = conn.execute('SELECT image_path, image_hash FROM invoices WHERE id = ? AND user_id = ?', 
+                               (invoice_id, user_id)).fetchone()
+            if not row:
+                return jsonify({'error': 'Invoice not found'}), 404
+            
+            image_path, image_hash = row
+            
+            # Delete from database, dropping the invoice's reference to its blob
+            in_store = bool(image_hash) and blobs.is_blob(image_path)
+            delete_blob = blobs.release(conn, image_hash) if in_store else None
+            conn.execute('DELETE FROM invoices WHERE id = ? AND user_id = ?', 
+                         (invoice_id, user_id))
+            
+            # Thumbnails are shared by invoices with the same image
+            shared = bool(image_hash) and conn.execute(
+                'SELECT 1 FROM invoices WHERE image_hash = ? LIMIT 1', (image_hash,)
+            ).fetchone() is not None
+        
+        if delete_blob is not None:
+            delete_blob()
+        
+        if image_hash and not shared:
+            for size in THUMBNAIL_WIDTHS:
+                try:
+                    os.remove(thumbnail_path(image_hash, size))
+                except OSError:
+                    pass
         
-        # Delete image file if it exists
-        if os.path.exists(image_path):
+        # Files saved before the blob store belong to their invoice alone
+        if not in_store and os.path.exists(image_path):
             try:
                 os.remove(image_path)
             except Exception as e:
@@ -400,26 +492,35 @@ def delete_invoice(invoice_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+IMAGE_SIZES = ('full',) + tuple(THUMBNAIL_WIDTHS)
+# Image URLs carry the content hash (?v=), so a response never changes
+IMAGE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
 @invoice_bp.route('/invoices/<int:invoice_id>/image', methods=['GET'])
 @require_auth
 def get_invoice_image(invoice_id):
-    """Get the image file for an invoice"""
+    """Get the image file for an invoice (?size=thumb|preview for a WebP thumbnail)"""
     try:
         user_id = session['user_id']
+        size = request.args.get('size', 'full')
+        if size not in IMAGE_SIZES:
+            return jsonify({'error': f"Invalid size, expected one of {', '.join(IMAGE_SIZES)}"}), 400
         
-        conn = sqlite3.connect('invoices.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT image_path FROM invoices WHERE id = ? AND user_id = ?', 
-                      (invoice_id, user_id))
-        
-        row = cursor.fetchone()
-        conn.close()
+        row = get_connection().execute('SELECT image_path, image_hash FROM invoices WHERE id = ? AND user_id = ?', 
+                                       (invoice_id, user_id)).fetchone()
         
         if not row:
             return jsonify({'error': 'Invoice not found'}), 404
         
-        image_path = row[0]
+        image_path, image_hash = row
+
+        # Revalidation of a known image is answered without touching the file
+        if image_hash and request.if_none_match.contains(f"{image_hash}-{size}"):
+            response = current_app.response_class(status=304)
+            response.set_etag(f"{image_hash}-{size}")
+            response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+            return response
 
         # Resolve absolute path and verify existence
         try:
@@ -430,19 +531,44 @@ def get_invoice_image(invoice_id):
         if not (abs_path and os.path.exists(abs_path)):
             return jsonify({'error': 'Image file not found'}), 404
 
-        # Guess mimetype from extension
-        import mimetypes
-        mime, _ = mimetypes.guess_type(abs_path)
-        if not mime:
-            mime = 'application/octet-stream'
+        # Invoices saved before thumbnails existed get their hash on first view
+        if not image_hash:
+            try:
+                image_hash = file_sha256(abs_path)
+                get_connection().execute('UPDATE invoices SET image_hash = ? WHERE id = ?', (image_hash, invoice_id))
+            except Exception as e:
+                print(f"Could not hash image {abs_path}: {str(e)}")
+
+        if size == 'full':
+            # Guess mimetype from extension
+            import mimetypes
+            mime, _ = mimetypes.guess_type(abs_path)
+            if not mime:
+                mime = 'application/octet-stream'
+            file_path = abs_path
+        else:
+            mime = 'image/webp'
+            file_path = thumbnail_path(image_hash, size) if image_hash else None
+            if not (file_path and os.path.exists(file_path)):
+                try:
+                    create_thumbnails(abs_path, image_hash)
+                except Exception as e:
+                    # Thumbnail rendering failed; fall back to the original
+                    print(f"Could not create thumbnails for {abs_path}: {str(e)}")
+                    file_path = None
+            if not (file_path and os.path.exists(file_path)):
+                return redirect(url_for('.get_invoice_image', invoice_id=invoice_id))
 
         # Stream the file; guard against unexpected file IO errors
-        from flask import send_file
         try:
-            return send_file(abs_path, mimetype=mime, conditional=True, as_attachment=False)
+            response = send_file(file_path, mimetype=mime, conditional=True, as_attachment=False,
+                                 etag=f"{image_hash}-{size}" if image_hash else True)
         except Exception as e:
             # Don't 500 on image issues; report as not found to let UI fallback
             return jsonify({'error': f'Unable to read image: {str(e)}'}), 404
+        if image_hash:
+            response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+        return response
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
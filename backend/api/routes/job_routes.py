@@ -0,0 +1,117 @@
+import time
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from backend.services.job_queue import get_job_queue, save_job_file, FINISHED_STATUSES
+from backend.services.extraction_jobs import params_from_form, validate_job_params
+from backend.utils.streaming import format_sse
+from backend.utils.uploads import read_upload, UploadError
+
+jobs_bp = Blueprint('jobs_bp', __name__)
+
+# How often the SSE stream checks the job and how long it follows it
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_TIMEOUT = 900
+
+
+def _job_view(job):
+    """Public representation of a job"""
+    view = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'method': job['method'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'finished_at': job['finished_at'],
+    }
+    if job['status'] == 'succeeded':
+        view['result'] = job['result']
+    return view
+
+
+def _get_visible_job(job_id):
+    """The job, or None if it does not exist or belongs to another user"""
+    job = get_job_queue().get(job_id)
+    if job is None or (job['user_id'] is not None and job['user_id'] != session.get('user_id')):
+        return None
+    return job
+
+
+@jobs_bp.route('/extract', methods=['POST'])
+def submit_extraction_job():
+    """Queue an extraction and return its job id immediately"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    method = request.form.get('method', 'llm')
+    params, error = params_from_form(request.form)
+    error = error or validate_job_params(method, params)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        upload = read_upload(request.files['file'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+    try:
+        with upload:
+            file_path = save_job_file(upload)
+        job_id = get_job_queue().submit(method, file_path, params, user_id=session.get('user_id'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }), 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job's status (and result once it succeeded)"""
+    job = _get_visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_view(job))
+
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: 'status' on every change, then 'done' or 'error'"""
+    if _get_visible_job(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        queue = get_job_queue()
+        last_state = None
+        started = time.monotonic()
+        while time.monotonic() - started < EVENTS_TIMEOUT:
+            job = queue.get(job_id)
+            if job is None:
+                yield format_sse('error', {'error': 'Job not found'})
+                return
+            state = (job['status'], job['attempts'])
+            if state != last_state:
+                last_state = state
+                yield format_sse('status', {'job_id': job_id, 'status': job['status'], 'attempts': job['attempts']})
+            if job['status'] in FINISHED_STATUSES:
+                if job['status'] == 'succeeded':
+                    yield format_sse('done', job['result'])
+                else:
+                    yield format_sse('error', {'error': job['error']})
+                return
+            time.sleep(EVENTS_POLL_INTERVAL)
+        yield format_sse('error', {'error': 'Timed out waiting for the job; poll the status URL'})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@jobs_bp.route('/stats', methods=['GET'])
+def job_stats():
+    """Number of jobs per status"""
+    return jsonify(get_job_queue().counts())
@@ -0,0 +1,80 @@
+import time
+from flask import Blueprint, Response, request, g
+from backend.utils.metrics import (
+    REGISTRY, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, EXTRACTION_DURATION
+)
+from backend.services.job_queue import get_job_queue
+from backend.services.llm_cache import get_llm_cache
+from backend.services.layoutlmv3_service import loaded_model_bytes
+from backend.services.ollama_manager import get_ollama_manager
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+def _job_counts():
+    return {(status,): n for status, n in get_job_queue().counts().items()}
+
+
+def _cache_stats():
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    return cache.hits, cache.misses
+
+
+def _cache_hit_ratio():
+    stats = _cache_stats()
+    if stats is None:
+        return None
+    hits, misses = stats
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def _model_memory():
+    memory = {("layoutlmv3",): loaded_model_bytes()}
+    # Ollama runs out of process; the last /api/ps answer, refreshed in the
+    # background so a slow or stopped Ollama never holds up the scrape
+    memory[("ollama",)] = get_ollama_manager().resident_memory()
+    return memory
+
+
+# Computed when scraped, never on the request path
+REGISTRY.gauge("extraction_jobs", "Extraction jobs per status (queued = queue depth)",
+               ("status",), callback=_job_counts)
+REGISTRY.gauge("llm_cache_hit_ratio", "LLM response cache hit ratio since start",
+               callback=_cache_hit_ratio)
+REGISTRY.gauge("model_memory_bytes", "Memory held by the loaded extraction models",
+               ("model",), callback=_model_memory)
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    labels = {'route': route, 'method': request.method, 'status': response.status_code}
+    extraction_method = g.pop('extraction_method', None)
+
+    def observe():
+        # Called by the server once the body (streamed ones included) is sent
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_DURATION.observe(elapsed, **labels)
+        if extraction_method is not None:
+            EXTRACTION_DURATION.observe(elapsed, method=extraction_method)
+
+    response.call_on_close(observe)
+    return response
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,98 @@
+import itertools
+import os
+import threading
+import uuid
+from datetime import datetime
+from flask import Blueprint, request, jsonify, send_from_directory, g
+from backend.api.routes.auth_routes import is_admin, require_admin
+from backend.utils.profiling import (
+    SamplingProfiler, PROFILE_DIR, PROFILE_FORMATS, prune_profiles
+)
+
+profiling_bp = Blueprint('profiling', __name__)
+
+# Profile one request in N of any user (0 = only on demand)
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+# Requests profiled at once; more would slow everything being measured
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "2"))
+
+_request_counter = itertools.count(1)
+_active = threading.BoundedSemaphore(PROFILE_MAX_ACTIVE)
+
+
+def _profile_requested():
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    return flag not in (None, '', '0', 'false') and is_admin()
+
+
+@profiling_bp.before_app_request
+def start_profiler():
+    # Only a header/query lookup and a counter unless profiling is asked for
+    if request.blueprint == profiling_bp.name or request.path == '/metrics':
+        return
+    requested = _profile_requested()
+    if not requested and not (PROFILE_SAMPLE_EVERY and next(_request_counter) % PROFILE_SAMPLE_EVERY == 0):
+        return
+    if not _active.acquire(blocking=False):
+        return
+    fmt = request.headers.get('X-Profile-Format') or request.args.get('profile_format') or 'speedscope'
+    if fmt not in PROFILE_FORMATS:
+        fmt = 'speedscope'
+    g.profiler = SamplingProfiler(threading.get_ident()).start()
+    g.profile_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{PROFILE_FORMATS[fmt]}"
+    g.profile_format = fmt
+    g.profile_requested = requested
+
+
+@profiling_bp.after_app_request
+def finish_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    name, fmt = g.profile_name, g.profile_format
+    title = f"{request.method} {request.path}"
+    if g.profile_requested or is_admin():
+        response.headers['X-Profile-Url'] = f"/api/profiles/{name}"
+
+    def save():
+        # Called by the server once the body (streamed ones included) is sent
+        try:
+            profiler.stop()
+            profiler.save(os.path.join(PROFILE_DIR, name), f"{title} ({profiler.duration:.2f}s)", fmt)
+            print(f"Profiled {title} in {profiler.duration:.2f}s: {name}")
+            prune_profiles()
+        except Exception as e:
+            print(f"Could not save profile {name}: {str(e)}")
+        finally:
+            _active.release()
+
+    response.call_on_close(save)
+    return response
+
+
+@profiling_bp.teardown_app_request
+def abandon_profiler(exc):
+    # The request ended without a response (the profile is not worth saving)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        _active.release()
+
+
+@profiling_bp.route('', methods=['GET'])
+@require_admin
+def list_profiles():
+    """List captured profiles, newest first"""
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if name.endswith(tuple(PROFILE_FORMATS.values()))]
+    except OSError:
+        names = []
+    names.sort(reverse=True)
+    return jsonify({'profiles': [{'name': name, 'url': f"/api/profiles/{name}"} for name in names]}), 200
+
+
+@profiling_bp.route('/<path:name>', methods=['GET'])
+@require_admin
+def get_profile(name):
+    """Download a profile (open .speedscope.json files in https://www.speedscope.app)"""
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
@@ -0,0 +1,20 @@
+"""
+WSGI entry point for the production server (see backend/gunicorn.conf.py).
+
+Importing this module loads the heavy engines: PaddleOCR when the routes
+import backend.utils.utils, and LayoutLMv3 below. With gunicorn's
+preload_app this happens once in the master, and the forked workers
+share those pages copy-on-write instead of each loading its own copy.
+"""
+import os
+from backend.api.main import app, start_background_tasks
+from backend.services.layoutlmv3_service import get_layoutlmv3_model
+
+if os.getenv('PRELOAD_LAYOUTLMV3', '1') != '0':
+    try:
+        get_layoutlmv3_model()
+        print("LayoutLMv3 model preloaded")
+    except Exception as e:
+        print(f"Warning: Could not preload LayoutLMv3 model: {e}")
+
+__all__ = ['app', 'start_background_tasks']
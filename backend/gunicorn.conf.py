@@ -0,0 +1,73 @@
+"""
+Production server configuration.
+
+    gunicorn -c backend/gunicorn.conf.py backend.api.wsgi:app
+
+The app (PaddleOCR, LayoutLMv3) is loaded once in the master and WEB_WORKERS
+processes are forked from it, each serving WEB_THREADS concurrent requests.
+A worker is replaced after WEB_MAX_REQUESTS requests (plus jitter) to cap
+memory growth.
+
+Graceful restarts: `kill -HUP <master>` starts fresh workers and lets the
+old ones finish their requests (within WEB_GRACEFUL_TIMEOUT). Because the
+app is preloaded, HUP does not re-import the code; to deploy new code send
+USR2 (starts a new master) and then QUIT to the old master.
+"""
+import gc
+import os
+import shutil
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', '2'))
+threads = int(os.getenv('WEB_THREADS', '4'))
+worker_class = 'gthread'
+preload_app = True
+
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '500'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '50'))
+# Extractions can legitimately take minutes (OCR + LLM)
+timeout = int(os.getenv('WEB_TIMEOUT', '300'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '60'))
+keepalive = 5
+
+# Workers share their metrics through this directory so /metrics, whichever
+# worker answers it, reports the whole server (read when the app is imported)
+os.environ.setdefault('METRICS_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'metrics'))
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Counters start from zero with a new master
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's generations so the
+    # garbage collector does not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Metrics recorded by the master while preloading are not this worker's
+    from backend.utils.metrics import REGISTRY
+    REGISTRY.reset()
+
+    # One set of intra-op threads per worker instead of one per core each
+    torch_threads = os.getenv('TORCH_THREADS')
+    if torch_threads:
+        import torch
+        torch.set_num_threads(int(torch_threads))
+
+    from backend.api.wsgi import start_background_tasks
+    start_background_tasks()
+
+
+def worker_exit(server, worker):
+    # Last counts of a worker being replaced, folded into the totals by the next scrape
+    from backend.utils.metrics import REGISTRY, METRICS_DIR
+    if METRICS_DIR:
+        REGISTRY.dump(METRICS_DIR)
@@ -0,0 +1,302 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+
+from flask import jsonify, request, session
+
+from backend.utils.metrics import REGISTRY
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+LANES = ("interactive", "batch")
+# Longest time a request waits for an engine before being turned away;
+# batch work (bulk endpoint, job workers) is happy to wait longer
+ADMISSION_MAX_WAIT = {
+    "interactive": float(os.getenv("ADMISSION_MAX_WAIT", "15")),
+    "batch": float(os.getenv("ADMISSION_BATCH_MAX_WAIT", "300")),
+}
+# Waiters allowed per engine and lane, and per user within a lane
+ADMISSION_QUEUE = {
+    "interactive": int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "16")),
+    "batch": int(os.getenv("ADMISSION_BATCH_QUEUE", "64")),
+}
+ADMISSION_USER_QUEUE = int(os.getenv("ADMISSION_USER_QUEUE", "8"))
+# Engine slots batch work can never take, kept for interactive requests
+ADMISSION_BATCH_RESERVE = int(os.getenv("ADMISSION_BATCH_RESERVE", "1"))
+
+# Concurrent calls per engine; the LLM gates match the clients' in-flight caps
+ENGINE_CONCURRENCY = {
+    "ocr": int(os.getenv("OCR_CONCURRENCY", "2")),
+    "layoutlmv3": int(os.getenv("LAYOUTLMV3_CONCURRENCY", "2")),
+    "groq": int(os.getenv("GROQ_MAX_IN_FLIGHT", "4")),
+    "ollama": int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2")),
+}
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "admission_wait_seconds", "Time spent queued for an engine", ("engine", "lane"))
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total", "Requests turned away by admission control", ("engine", "lane", "reason"))
+
+# (lane, user) of the work running in this thread
+_current = contextvars.ContextVar("admission", default=("interactive", None))
+
+
+class AdmissionRejected(Exception):
+    """An engine is saturated; retry_after is a hint in whole seconds."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+
+class AdmissionGate:
+    """
+    Admission control in front of one engine.
+
+    At most `capacity` calls run at once. Callers beyond that wait in one of
+    two lanes: interactive waiters are always served before batch ones, and
+    batch work never holds the last `batch_reserve` slots. Within a lane,
+    users are served round-robin so one user's bulk run cannot starve the
+    others. Full queues, full per-user queues and waits longer than
+    max_wait are rejected with AdmissionRejected instead of piling up.
+    """
+
+    def __init__(self, name, capacity, queue_limits=None, user_queue=ADMISSION_USER_QUEUE,
+                 batch_reserve=ADMISSION_BATCH_RESERVE):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.queue_limits = dict(queue_limits or ADMISSION_QUEUE)
+        self.user_queue = user_queue
+        self.batch_capacity = max(1, self.capacity - batch_reserve)
+        self._cond = threading.Condition()
+        self._waiting = {lane: OrderedDict() for lane in LANES}
+        self._queued = {lane: 0 for lane in LANES}
+        self._active = {lane: 0 for lane in LANES}
+        # Moving average of how long a call holds its slot
+        self._avg_hold = 1.0
+
+    def _can_start(self, lane):
+        if sum(self._active.values()) >= self.capacity:
+            return False
+        return lane == "interactive" or self._active["batch"] < self.batch_capacity
+
+    def _retry_after(self, lane):
+        ahead = self._queued["interactive"] + (self._queued["batch"] if lane == "batch" else 0)
+        return min(60, max(1, math.ceil(self._avg_hold * (ahead + 1) / self.capacity)))
+
+    def _reject(self, lane, reason, message):
+        ADMISSION_REJECTED.inc(engine=self.name, lane=lane, reason=reason)
+        return AdmissionRejected(f"{self.name} is busy: {message}", self._retry_after(lane))
+
+    def _check_queue(self, user, lane):
+        if self._queued[lane] >= self.queue_limits[lane]:
+            raise self._reject(lane, "queue_full", f"{self._queued[lane]} {lane} requests waiting")
+        waiting = self._waiting[lane].get(user)
+        if waiting is not None and len(waiting) >= self.user_queue:
+            raise self._reject(lane, "user_share", "too many of your requests are waiting")
+
+    def check(self, user=None, lane="interactive"):
+        """Raise AdmissionRejected right away if a call would be turned away."""
+        with self._cond:
+            if self._queued[lane] or not self._can_start(lane):
+                self._check_queue(user, lane)
+
+    def acquire(self, user=None, lane="interactive", max_wait=None):
+        max_wait = ADMISSION_MAX_WAIT[lane] if max_wait is None else max_wait
+        with self._cond:
+            waiting_ahead = self._queued["interactive"] + (self._queued["batch"] if lane == "batch" else 0)
+            if not waiting_ahead and self._can_start(lane):
+                self._active[lane] += 1
+                ADMISSION_WAIT.observe(0.0, engine=self.name, lane=lane)
+                return
+            self._check_queue(user, lane)
+
+            ticket = _Ticket()
+            self._waiting[lane].setdefault(user, deque()).append(ticket)
+            self._queued[lane] += 1
+            start = time.monotonic()
+            while not ticket.granted:
+                remaining = max_wait - (time.monotonic() - start)
+                if remaining <= 0:
+                    queue = self._waiting[lane][user]
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._waiting[lane][user]
+                    self._queued[lane] -= 1
+                    raise self._reject(lane, "timeout", f"no free slot within {max_wait:.0f}s")
+                self._cond.wait(remaining)
+            ADMISSION_WAIT.observe(time.monotonic() - start, engine=self.name, lane=lane)
+
+    def release(self, lane="interactive", held=None):
+        with self._cond:
+            self._active[lane] -= 1
+            if held is not None:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            self._dispatch()
+
+    def _dispatch(self):
+        granted = False
+        for lane in LANES:
+            users = self._waiting[lane]
+            while users and self._can_start(lane):
+                user, queue = next(iter(users.items()))
+                queue.popleft().granted = True
+                if queue:
+                    users.move_to_end(user)
+                else:
+                    del users[user]
+                self._queued[lane] -= 1
+                self._active[lane] += 1
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user=None, lane="interactive", max_wait=None):
+        self.acquire(user, lane, max_wait)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(lane, time.monotonic() - start)
+
+    def stats(self):
+        with self._cond:
+            return {"capacity": self.capacity, "active": dict(self._active), "queued": dict(self._queued)}
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(engine):
+    """
+    Return the process-wide gate of an engine ('ocr', 'layoutlmv3', 'groq'
+    or 'ollama').
+    """
+    with _gates_lock:
+        if engine not in _gates:
+            _gates[engine] = AdmissionGate(engine, ENGINE_CONCURRENCY.get(engine, 2))
+        return _gates[engine]
+
+
+def engine_slot(engine, max_wait=None):
+    """
+    Context manager holding one slot of an engine for the current lane and
+    user (see admission_context); raises AdmissionRejected when saturated.
+    """
+    if not ADMISSION_ENABLED:
+        return nullcontext()
+    lane, user = _current.get()
+    wait = ADMISSION_MAX_WAIT[lane] if max_wait is None else min(max_wait, ADMISSION_MAX_WAIT[lane])
+    return get_gate(engine).slot(user, lane, wait)
+
+
+def check_admission(engines):
+    """Fail fast, before any work, if one of the engines would turn the caller away."""
+    if not ADMISSION_ENABLED:
+        return
+    lane, user = _current.get()
+    for engine in engines:
+        get_gate(engine).check(user, lane)
+
+
+@contextmanager
+def admission_context(lane, user):
+    """Run a block as work of `user` in `lane` ('interactive' or 'batch')."""
+    token = _current.set((lane if lane in LANES else "interactive", user))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def carry_admission(fn):
+    """Wrap fn so worker threads run it in the caller's lane and as its user."""
+    current = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(current)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def engines_for(method, llm_backend="groq", primary="groq", engines=()):
+    """Engines an extraction method runs on, for check_admission."""
+    if method == "layoutlmv3":
+        return ("ocr", "layoutlmv3")
+    if method in ("llm", "ollama"):
+        return ("ocr", "ollama")
+    if method == "groq":
+        return ("ocr", "groq")
+    if method == "cascade":
+        return ("ocr", "layoutlmv3")
+    if method == "hedged":
+        return ("ocr", primary)
+    if method == "compare":
+        return ("ocr",) + tuple(e for e in engines if e in ENGINE_CONCURRENCY)
+    return ("ocr",)
+
+
+def too_busy(error):
+    """429 response for a rejected request."""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+def _request_lane():
+    if request.path.endswith('/batch'):
+        return 'batch'
+    priority = request.headers.get('X-Priority') or request.args.get('priority')
+    return 'batch' if priority == 'batch' else 'interactive'
+
+
+def install_admission(app):
+    """
+    Run every request in its lane (batch for the bulk endpoint or when
+    asked with X-Priority: batch / ?priority=batch) as its user, and answer
+    AdmissionRejected raised out of a view with 429 and Retry-After.
+    """
+    @app.before_request
+    def enter_admission_context():
+        user = session.get('user_id') or request.remote_addr
+        request.environ['admission.token'] = _current.set((_request_lane(), user))
+
+    @app.teardown_request
+    def leave_admission_context(exc):
+        token = request.environ.pop('admission.token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except (ValueError, RuntimeError):
+                _current.set(("interactive", None))
+
+    app.register_error_handler(AdmissionRejected, too_busy)
+
+
+def _queue_depths():
+    with _gates_lock:
+        gates = list(_gates.values())
+    depths = {}
+    for gate in gates:
+        for lane, queued in gate.stats()["queued"].items():
+            depths[(gate.name, lane)] = queued
+    return depths
+
+
+REGISTRY.gauge("admission_queue_depth", "Requests waiting for an engine", ("engine", "lane"),
+               callback=_queue_depths)
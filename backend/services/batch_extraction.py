@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from backend.services.extraction_jobs import run_extraction
+from backend.services.admission import carry_admission
+
+# Documents processed at the same time for one batch
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "500"))
+# Largest single document accepted (uncompressed, for archive members)
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+
+SUPPORTED_EXTS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".pdf"}
+
+
+def _copy_to_temp(stream, name, limit=BATCH_MAX_FILE_BYTES):
+    """
+    Copy a file stream to a temporary file in fixed-size blocks, enforcing
+    the size limit. Returns the temporary path.
+    """
+    ext = os.path.splitext(name)[1].lower()
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
+    size = 0
+    try:
+        with tmp:
+            while True:
+                block = stream.read(64 * 1024)
+                if not block:
+                    break
+                size += len(block)
+                if size > limit:
+                    raise ValueError(f"File larger than {limit} bytes")
+                tmp.write(block)
+    except Exception:
+        os.unlink(tmp.name)
+        raise
+    return tmp.name
+
+
+def iter_batch_documents(files):
+    """
+    Yield (name, stream, error) for every document of the upload, expanding
+    zip archives entry by entry so only the members being processed are
+    ever extracted. Unsupported entries are yielded with an error.
+    """
+    for file in files:
+        name = file.filename or ""
+        ext = os.path.splitext(name)[1].lower()
+        if ext == ".zip":
+            # The upload itself is already spooled by Werkzeug; zipfile only
+            # needs a seekable file, members are read lazily
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                yield name, None, "Invalid zip archive"
+                continue
+            with archive:
+                for info in archive.infolist():
+                    member = info.filename
+                    if info.is_dir() or os.path.basename(member).startswith("."):
+                        continue
+                    if os.path.splitext(member)[1].lower() not in SUPPORTED_EXTS:
+                        yield member, None, "Unsupported file type"
+                    elif info.file_size > BATCH_MAX_FILE_BYTES:
+                        yield member, None, f"File larger than {BATCH_MAX_FILE_BYTES} bytes"
+                    else:
+                        with archive.open(info) as stream:
+                            yield member, stream, None
+        elif ext in SUPPORTED_EXTS:
+            yield name, file.stream, None
+        else:
+            yield name, None, "Unsupported file type"
+
+
+def _process(index, name, path, method, params):
+    start = time.monotonic()
+    try:
+        body = run_extraction(method, path, params)
+        return {"index": index, "filename": name, "status": "ok",
+                "elapsed": round(time.monotonic() - start, 3), **body}
+    except Exception as e:
+        return {"index": index, "filename": name, "status": "error", "error": str(e),
+                "elapsed": round(time.monotonic() - start, 3)}
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def process_batch(files, method, params, workers=None):
+    """
+    Extract every document of a batch upload in parallel and yield one
+    result dict per document as soon as it finishes, then a summary.
+
+    At most `workers` documents are in flight and at most as many more are
+    staged on disk, so memory and temporary storage stay bounded whatever
+    the size of the batch.
+    """
+    workers = max(1, workers or BATCH_WORKERS)
+    documents = iter_batch_documents(files)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    counts = {"ok": 0, "error": 0}
+    index = 0
+    started = time.monotonic()
+    try:
+        exhausted = False
+        while not exhausted or pending:
+            # Stage documents until the window is full
+            while not exhausted and len(pending) < 2 * workers:
+                try:
+                    name, stream, error = next(documents)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if index >= BATCH_MAX_DOCUMENTS:
+                    counts["error"] += 1
+                    yield {"index": index, "filename": name, "status": "error",
+                           "error": f"Batch limited to {BATCH_MAX_DOCUMENTS} documents"}
+                    exhausted = True
+                    break
+                if error is None:
+                    try:
+                        path = _copy_to_temp(stream, name)
+                    except Exception as e:
+                        error = str(e)
+                if error is not None:
+                    counts["error"] += 1
+                    yield {"index": index, "filename": name, "status": "error", "error": error}
+                else:
+                    pending[pool.submit(carry_admission(_process), index, name, path, method, params)] = path
+                index += 1
+
+            if not pending:
+                continue
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                result = future.result()
+                counts[result["status"]] += 1
+                yield result
+    finally:
+        # Client went away: drop the staged documents that never started
+        for future, path in pending.items():
+            if future.cancel():
+                os.unlink(path)
+        pool.shutdown(wait=False)
+
+    yield {"done": True, "total": index, "succeeded": counts["ok"], "failed": counts["error"],
+           "elapsed": round(time.monotonic() - started, 3)}
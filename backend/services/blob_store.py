@@ -0,0 +1,130 @@
+import os
+import shutil
+import threading
+import uuid
+
+from backend.services.thumbnails import file_sha256
+
+# Determine project root (repo root); blobs live next to the legacy uploads
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+BLOBS_DIR = os.getenv("BLOBS_DIR", os.path.join(PROJECT_ROOT, 'uploads', 'blobs'))
+
+
+class BlobStore:
+    """
+    Content-addressed store of uploaded invoices.
+
+    A file is stored once under its SHA-256, sharded in two directory levels
+    (blobs/ab/cd/abcd...ext) so no directory grows large. The `blobs` table
+    of the invoices database counts the invoices referencing each blob; the
+    file is deleted with its last reference.
+
+    add() and release() run inside the caller's transaction(immediate=True):
+    SQLite's write lock then serializes them across threads and worker
+    processes, so a blob is never deleted while another request is adding a
+    reference to it.
+    """
+
+    def __init__(self, directory=BLOBS_DIR):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, blob_hash, ext=""):
+        return os.path.join(self.directory, blob_hash[:2], blob_hash[2:4], f"{blob_hash}{ext}")
+
+    def incoming_path(self, ext=""):
+        """
+        A fresh path to write an upload to before add() (same filesystem as
+        the blobs, so adding it is a rename).
+        """
+        incoming = os.path.join(self.directory, 'incoming')
+        os.makedirs(incoming, exist_ok=True)
+        return os.path.join(incoming, f"{uuid.uuid4().hex}{ext}")
+
+    @staticmethod
+    def _require_transaction(conn):
+        # A transaction begun here would outlive the request on the
+        # thread's connection; the caller owns it
+        if not conn.in_transaction:
+            raise RuntimeError("BlobStore must be used inside transaction(immediate=True)")
+
+    def add(self, conn, file_path, ext="", blob_hash=None):
+        """
+        Take ownership of file_path (moved into the store, or deleted if the
+        content is already there) and add a reference to its blob.
+        Returns (blob_hash, blob_path); the caller commits.
+        """
+        blob_hash = blob_hash or file_sha256(file_path)
+        self._require_transaction(conn)
+        row = conn.execute('SELECT path FROM blobs WHERE hash = ?', (blob_hash,)).fetchone()
+        if row and os.path.exists(row[0]):
+            # Same content stored before: only the reference count changes
+            blob_path = row[0]
+            os.unlink(file_path)
+            conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE hash = ?', (blob_hash,))
+        else:
+            blob_path = self.path_for(blob_hash, ext.lower())
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.replace(file_path, blob_path)
+            except OSError:
+                # Source on another filesystem
+                shutil.move(file_path, blob_path)
+            conn.execute('''
+                INSERT INTO blobs (hash, path, size, refcount) VALUES (?, ?, ?, 1)
+                ON CONFLICT(hash) DO UPDATE SET path = excluded.path, size = excluded.size,
+                                                refcount = refcount + 1
+            ''', (blob_hash, blob_path, os.path.getsize(blob_path)))
+        return blob_hash, blob_path
+
+    def release(self, conn, blob_hash):
+        """
+        Drop a reference to a blob. When it was the last one the row is
+        deleted and the file moved aside; returns a callable to run after
+        the commit (deletes the file), or None if the blob is still used.
+        """
+        self._require_transaction(conn)
+        row = conn.execute('SELECT path, refcount FROM blobs WHERE hash = ?', (blob_hash,)).fetchone()
+        if row is None:
+            return None
+        blob_path, refcount = row
+        if refcount > 1:
+            conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE hash = ?', (blob_hash,))
+            return None
+        conn.execute('DELETE FROM blobs WHERE hash = ?', (blob_hash,))
+        # Renamed under the write lock so a concurrent add() re-creates the
+        # blob instead of referencing a file about to disappear
+        doomed = f"{blob_path}.{uuid.uuid4().hex}.deleted"
+        try:
+            os.replace(blob_path, doomed)
+        except OSError:
+            return None
+
+        def finish():
+            try:
+                os.unlink(doomed)
+            except OSError as e:
+                print(f"Warning: Could not delete blob {doomed}: {e}")
+        return finish
+
+    def is_blob(self, path):
+        """Whether a stored image path points into this store."""
+        try:
+            return os.path.commonpath([os.path.abspath(path), self.directory]) == self.directory
+        except ValueError:
+            return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """
+    Return the process-wide blob store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
@@ -0,0 +1,115 @@
+import os
+from backend.utils.utils import run_paddle_ocr
+from backend.utils.prompts import HEADER_FIELDS, TARGETED_SYSTEM_PROMPT, build_targeted_prompt, build_extraction_schema
+from backend.services.layoutlmv3_service import extract_with_layoutlmv3
+from backend.services.llm_backends import call_llm
+from backend.services.llm_cache import is_cacheable
+from backend.services.ollama_service import _get_empty_result
+
+# Fields whose best LayoutLMv3 candidate is below this confidence go to the LLM
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Vertical band of the page (fraction of its height) where each field is
+# usually printed; only OCR lines from these bands are sent to the LLM.
+FIELD_REGIONS = {
+    "supplier_name": (0.0, 0.4),
+    "supplier_address": (0.0, 0.4),
+    "customer_name": (0.0, 0.5),
+    "customer_address": (0.0, 0.5),
+    "invoice_number": (0.0, 0.4),
+    "invoice_date": (0.0, 0.4),
+    "due_date": (0.0, 0.5),
+    "invoice_subtotal": (0.5, 1.0),
+    "tax_amount": (0.5, 1.0),
+    "tax_rate": (0.5, 1.0),
+    "invoice_total": (0.5, 1.0),
+    "items": (0.2, 0.9),
+}
+
+
+def find_weak_fields(extracted_fields, threshold=CASCADE_CONFIDENCE_THRESHOLD):
+    """
+    Return the header fields that are missing or whose best candidate is
+    below the confidence threshold.
+    """
+    weak = []
+    for field in HEADER_FIELDS:
+        value = extracted_fields.get(field)
+        if not isinstance(value, dict) or not value.get("selected"):
+            weak.append(field)
+            continue
+        candidates = value.get("candidates") or []
+        best = max((c.get("confidence", 0.0) for c in candidates), default=0.0)
+        if best < threshold:
+            weak.append(field)
+    return weak
+
+
+def select_ocr_region(ocr_tokens, fields):
+    """
+    Keep the OCR lines lying in the page bands of the requested fields,
+    in reading order.
+    """
+    if not ocr_tokens:
+        return []
+    page_height = max(t["bbox"][3] for t in ocr_tokens) or 1
+    bands = [FIELD_REGIONS.get(field, (0.0, 1.0)) for field in fields]
+
+    selected = []
+    for token in sorted(ocr_tokens, key=lambda t: (t["bbox"][1], t["bbox"][0])):
+        center = (token["bbox"][1] + token["bbox"][3]) / 2 / page_height
+        if any(top <= center <= bottom for top, bottom in bands):
+            selected.append(token["text"])
+    return selected
+
+
+def extract_with_cascade(image_path, llm_backend="groq", threshold=None, use_cache=True, ocr_tokens=None):
+    """
+    Run LayoutLMv3 first, then ask the LLM only for the fields LayoutLMv3 was
+    not confident about, plus the line items if the table extractor found
+    none, using the OCR lines of the relevant page region. Each field of the merged result records the
+    engine that produced it under "source".
+    """
+    threshold = CASCADE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    if ocr_tokens is None:
+        ocr_tokens = run_paddle_ocr(image_path)
+    result = _get_empty_result()
+    if not ocr_tokens:
+        return result
+
+    layoutlm_fields = extract_with_layoutlmv3(image_path, ocr_result=ocr_tokens)
+    for field, value in layoutlm_fields.items():
+        if isinstance(value, dict):
+            result[field] = value
+    for value in result.values():
+        value["source"] = "layoutlmv3"
+
+    weak = find_weak_fields(result, threshold)
+    include_items = not result["items"].get("selected")
+    if not weak and not include_items:
+        return result
+
+    region_fields = weak + (["items"] if include_items else [])
+    print(f"Cascade: sending {region_fields} to {llm_backend}")
+    prompt = build_targeted_prompt(select_ocr_region(ocr_tokens, region_fields), weak, include_items)
+    try:
+        llm_fields = call_llm(
+            llm_backend, prompt,
+            schema=build_extraction_schema(weak, include_items),
+            use_cache=use_cache,
+            system=TARGETED_SYSTEM_PROMPT
+        )
+    except ValueError as e:
+        # Backend unavailable or unknown; AdmissionRejected (overload) still becomes a 429
+        print(f"Cascade LLM step failed, keeping LayoutLMv3 result: {str(e)}")
+        return result
+    # call_llm reports failed or unparseable calls as an empty result
+    if not is_cacheable(llm_fields):
+        print(f"Cascade LLM step returned nothing from {llm_backend}, keeping LayoutLMv3 result")
+        return result
+
+    for field in region_fields:
+        value = llm_fields.get(field)
+        if isinstance(value, dict) and value.get("selected"):
+            result[field] = {**value, "source": llm_backend}
+    return result
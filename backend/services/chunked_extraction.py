@@ -0,0 +1,168 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.llm_backends import call_llm
+from backend.services.ollama_service import _get_empty_result
+from backend.services.rate_limiter import estimate_tokens
+from backend.services.admission import AdmissionRejected, carry_admission
+from backend.utils.llm_output import LLM_CONFIDENCE
+from backend.utils.prompts import (
+    HEADER_FIELDS, ITEM_FIELDS, EXTRACTION_SYSTEM_PROMPT, TARGETED_SYSTEM_PROMPT,
+    build_llm_prompt, build_chunk_prompt, build_targeted_prompt, build_extraction_schema
+)
+
+# Context window of the extraction models (llama3-8b-8192, OLLAMA_NUM_CTX) and
+# the completion budget reserved in it (Groq max_tokens, OLLAMA_NUM_PREDICT)
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "1024"))
+# Size (estimated tokens of OCR text) of the chunks of a document too long for one prompt
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "2000"))
+# OCR lines repeated at the start of the next chunk so no line is cut off from its context
+LLM_CHUNK_OVERLAP_LINES = int(os.getenv("LLM_CHUNK_OVERLAP_LINES", "2"))
+LLM_CHUNK_WORKERS = int(os.getenv("LLM_CHUNK_WORKERS", "4"))
+
+# Fields printed at the end of an invoice: on an unresolved conflict the
+# value from the last chunk wins, for the other fields the first one.
+TAIL_FIELDS = {"invoice_subtotal", "tax_amount", "tax_rate", "invoice_total"}
+
+
+def ocr_lines(ocr_tokens):
+    """Text of the OCR boxes (run_paddle_ocr output), one per line."""
+    return [t["text"] for t in ocr_tokens if (t.get("text") or "").strip()]
+
+
+def needs_chunking(ocr_tokens, context_tokens=None):
+    """
+    Whether the single-prompt extraction would overflow the model's context:
+    measured on what that path actually sends (system prompt and OCR boxes
+    with their bboxes) plus the completion budget.
+    """
+    needed = estimate_tokens(EXTRACTION_SYSTEM_PROMPT + build_llm_prompt(ocr_tokens)) + LLM_COMPLETION_TOKENS
+    return needed > (context_tokens or LLM_CONTEXT_TOKENS)
+
+
+def split_into_chunks(lines, max_tokens=None, overlap=None):
+    """
+    Split OCR lines into consecutive chunks of at most max_tokens (estimated),
+    each starting with the last `overlap` lines of the previous one.
+    """
+    max_tokens = max_tokens or LLM_CHUNK_TOKENS
+    overlap = LLM_CHUNK_OVERLAP_LINES if overlap is None else overlap
+    chunks, current, size = [], [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if current and size + cost > max_tokens:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else []
+            size = sum(estimate_tokens(l) for l in current)
+        current.append(line)
+        size += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _normalize(value):
+    return re.sub(r"[^0-9a-z]", "", str(value).lower())
+
+
+def merge_chunk_results(results):
+    """
+    Combine per-chunk extractions. A header field found with one value (up to
+    case and punctuation) takes it; fields with differing values are
+    reported as conflicts. Items are concatenated in chunk order, dropping
+    the duplicates produced by overlapping lines.
+
+    Returns (merged extracted_fields, {field: [values in chunk order]}).
+    """
+    merged = _get_empty_result()
+    conflicts = {}
+    for field in HEADER_FIELDS:
+        values, seen = [], set()
+        for result in results:
+            value = (result.get(field) or {}).get("selected")
+            if isinstance(value, str) and value.strip() and _normalize(value) not in seen:
+                seen.add(_normalize(value))
+                values.append(value.strip())
+        if not values:
+            continue
+        merged[field] = {
+            "candidates": [{"value": value, "confidence": LLM_CONFIDENCE} for value in values],
+            "selected": values[-1] if field in TAIL_FIELDS else values[0]
+        }
+        if len(values) > 1:
+            conflicts[field] = values
+
+    items, seen = [], set()
+    for result in results:
+        for item in (result.get("items") or {}).get("selected") or []:
+            key = tuple(_normalize(item.get(f, "")) for f in ITEM_FIELDS)
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+    merged["items"] = {
+        "candidates": [{"value": item, "confidence": LLM_CONFIDENCE} for item in items],
+        "selected": items
+    }
+    return merged, conflicts
+
+
+def _conflict_context(lines, conflicts):
+    """OCR lines mentioning one of the conflicting values, with their neighbours."""
+    needles = {_normalize(v) for values in conflicts.values() for v in values} - {""}
+    keep = set()
+    for i, line in enumerate(lines):
+        text = _normalize(line)
+        if any(needle in text for needle in needles):
+            keep.update(range(max(0, i - 1), min(len(lines), i + 2)))
+    return [lines[i] for i in sorted(keep)]
+
+
+def extract_chunked(ocr_tokens, backend="ollama", max_tokens=None, use_cache=True, deadline=None,
+                    resolve_conflicts=True):
+    """
+    Map-reduce extraction for long documents: split the OCR lines into
+    context-sized chunks, extract each chunk in parallel and merge the
+    results. Only fields on which chunks disagree cost one more (targeted)
+    LLM call, over the OCR lines that mention the competing values.
+    """
+    lines = ocr_lines(ocr_tokens)
+    chunks = split_into_chunks(lines, max_tokens)
+    if not chunks:
+        return _get_empty_result()
+    prompts = [build_chunk_prompt(chunk, i, len(chunks)) for i, chunk in enumerate(chunks)]
+    print(f"Chunked extraction: {len(lines)} OCR lines in {len(chunks)} chunks on {backend}")
+
+    def run(prompt):
+        try:
+            return call_llm(backend, prompt, use_cache=use_cache, deadline=deadline)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"Chunk extraction failed: {str(e)}")
+            return _get_empty_result()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(LLM_CHUNK_WORKERS, len(prompts)))) as pool:
+        results = list(pool.map(carry_admission(run), prompts))
+
+    merged, conflicts = merge_chunk_results(results)
+    if not conflicts or not resolve_conflicts:
+        return merged
+
+    fields = [field for field in HEADER_FIELDS if field in conflicts]
+    print(f"Chunked extraction: resolving conflicting values for {fields}")
+    try:
+        resolved = call_llm(
+            backend, build_targeted_prompt(_conflict_context(lines, conflicts), fields),
+            schema=build_extraction_schema(fields, include_items=False),
+            use_cache=use_cache, deadline=deadline, system=TARGETED_SYSTEM_PROMPT
+        )
+    except Exception as e:
+        print(f"Conflict resolution failed, keeping positional choice: {str(e)}")
+        return merged
+    for field in fields:
+        value = (resolved.get(field) or {}).get("selected")
+        if isinstance(value, str) and value.strip():
+            merged[field]["selected"] = value.strip()
+    return merged
@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from backend.utils.utils import run_paddle_ocr
+from backend.utils.prompts import build_llm_prompt
+from backend.services.layoutlmv3_service import extract_with_layoutlmv3
+from backend.services.cascade_service import extract_with_cascade
+from backend.services.chunked_extraction import needs_chunking, extract_chunked
+from backend.services.llm_backends import call_llm
+from backend.services.llm_client import deadline_after
+from backend.services.admission import carry_admission
+
+COMPARE_ENGINES = ("layoutlmv3", "groq", "ollama", "cascade")
+DEFAULT_COMPARE_ENGINES = ("layoutlmv3", "groq", "ollama")
+# Overall time budget of a comparison; engines still running are reported as timed out
+COMPARE_DEADLINE = float(os.getenv("COMPARE_DEADLINE", "120"))
+
+
+def parse_engines(value):
+    """
+    Engines selected by a comma-separated form value (all defaults if empty).
+    Returns (engines, error).
+    """
+    if not value:
+        return list(DEFAULT_COMPARE_ENGINES), None
+    engines = []
+    for name in value.split(","):
+        name = name.strip().lower()
+        if name and name not in engines:
+            engines.append(name)
+    unknown = [name for name in engines if name not in COMPARE_ENGINES]
+    if unknown or not engines:
+        return engines, f"Invalid engines, expected some of {', '.join(COMPARE_ENGINES)}"
+    return engines, None
+
+
+def _run_engine(engine, image, ocr_tokens, prompt, chunked, use_cache, deadline, llm_backend):
+    if engine == "layoutlmv3":
+        return extract_with_layoutlmv3(image, ocr_result=ocr_tokens)
+    if engine == "cascade":
+        return extract_with_cascade(image, llm_backend=llm_backend, use_cache=use_cache, ocr_tokens=ocr_tokens)
+    if chunked:
+        return extract_chunked(ocr_tokens, backend=engine, use_cache=use_cache, deadline=deadline)
+    return call_llm(engine, prompt, use_cache=use_cache, deadline=deadline)
+
+
+def _timed(engine, *args):
+    start = time.monotonic()
+    try:
+        result = {"status": "ok", "extracted_fields": _run_engine(engine, *args)}
+    except Exception as e:
+        result = {"status": "error", "error": str(e)}
+    result["latency"] = round(time.monotonic() - start, 3)
+    return result
+
+
+def compare_extract(image, engines, use_cache=True, timeout=None, llm_backend="groq"):
+    """
+    Run OCR once on the document and hand the same tokens to every selected
+    engine concurrently, so the total time is about OCR plus the slowest
+    engine instead of the sum of full runs.
+
+    Returns {"engines": {name: {"status", "extracted_fields" | "error",
+    "latency"}}, "ocr_latency", "latency"}. An engine failing or missing the
+    deadline does not affect the others.
+    """
+    timeout = COMPARE_DEADLINE if timeout is None else timeout
+    start = time.monotonic()
+    deadline = deadline_after(timeout)
+
+    ocr_tokens = run_paddle_ocr(image)
+    if not ocr_tokens:
+        raise ValueError("No text found in image")
+    ocr_latency = time.monotonic() - start
+
+    # The prompt (and the chunking decision) is shared by the LLM engines
+    prompt = build_llm_prompt(ocr_tokens)
+    chunked = needs_chunking(ocr_tokens)
+
+    pool = ThreadPoolExecutor(max_workers=len(engines))
+    try:
+        run = carry_admission(_timed)
+        futures = {
+            pool.submit(run, engine, image, ocr_tokens, prompt, chunked, use_cache, deadline, llm_backend): engine
+            for engine in engines
+        }
+        wait(futures, timeout=max(0.0, timeout - ocr_latency))
+    finally:
+        # Do not hold the response for engines that overran the deadline
+        pool.shutdown(wait=False)
+
+    results = {}
+    for future, engine in futures.items():
+        if future.done():
+            results[engine] = future.result()
+        else:
+            results[engine] = {"status": "timeout", "error": "Engine did not finish before the deadline",
+                               "latency": round(time.monotonic() - start - ocr_latency, 3)}
+    print(f"Compared {', '.join(engines)} in {time.monotonic() - start:.2f}s (OCR {ocr_latency:.2f}s)")
+
+    return {
+        "engines": {engine: results[engine] for engine in engines},
+        "ocr_latency": round(ocr_latency, 3),
+        "latency": round(time.monotonic() - start, 3),
+        "chunked": chunked,
+    }
@@ -0,0 +1,130 @@
+from backend.utils.utils import run_paddle_ocr
+from backend.utils.prompts import build_llm_prompt
+from backend.services.ollama_service import call_ollama
+from backend.services.groq_service import get_groq_service
+from backend.services.layoutlmv3_service import extract_with_layoutlmv3
+from backend.services.cascade_service import extract_with_cascade
+from backend.services.chunked_extraction import needs_chunking, extract_chunked
+from backend.services.hedging import hedged_extract
+from backend.services.llm_backends import LLM_BACKENDS
+from backend.services.job_queue import JobWorkerPool, get_job_queue, JOB_WORKERS
+from backend.utils.metrics import EXTRACTION_DURATION
+from backend.services.admission import admission_context
+from backend.services.single_flight import coalesce_extraction, extraction_key
+from backend.services.thumbnails import file_sha256
+
+# Methods accepted by the job API; "llm" is Ollama, as on /extraction/extract
+JOB_METHODS = ("llm", "ollama", "groq", "layoutlmv3", "cascade", "hedged")
+
+
+def params_from_form(form):
+    """
+    Extraction options from a submitted form. Returns (params, error).
+    """
+    params = {key: form[key] for key in ("llm_backend", "primary", "secondary") if form.get(key)}
+    try:
+        for key in ("hedge_delay", "deadline"):
+            if form.get(key):
+                params[key] = float(form[key])
+    except ValueError:
+        return params, "hedge_delay and deadline must be numbers of seconds"
+    if form.get("no_cache") in ("1", "true"):
+        params["no_cache"] = True
+    return params, None
+
+
+def validate_job_params(method, params):
+    """
+    Return an error message for an invalid job submission, or None.
+    """
+    if method not in JOB_METHODS:
+        return f"Invalid method, expected one of {', '.join(JOB_METHODS)}"
+    if method == "cascade" and params.get("llm_backend", "groq") not in LLM_BACKENDS:
+        return "Invalid llm_backend"
+    if method == "hedged":
+        primary = params.get("primary", "groq")
+        secondary = params.get("secondary", "ollama")
+        if primary not in LLM_BACKENDS or secondary not in LLM_BACKENDS or primary == secondary:
+            return "primary and secondary must be two different LLM backends"
+    if method == "groq" and get_groq_service() is None:
+        return "Groq service not available. Please set GROQ_API_KEY environment variable."
+    return None
+
+
+def _llm_extract(backend, file_path, use_cache):
+    ocr_tokens = run_paddle_ocr(file_path)
+    if not ocr_tokens:
+        raise ValueError("No text found in image")
+    prompt = build_llm_prompt(ocr_tokens)
+    if needs_chunking(ocr_tokens):
+        return extract_chunked(ocr_tokens, backend=backend, use_cache=use_cache)
+    if backend == "groq":
+        return get_groq_service().call_groq(prompt, use_cache=use_cache)
+    return call_ollama(prompt, use_cache=use_cache)
+
+
+def run_extraction_job(job):
+    """
+    Job handler: run the job's extraction method on its file and return the
+    same body the synchronous endpoint would. Raising makes the queue retry.
+    """
+    # Background work: batch lane, fair share between the submitting users
+    with admission_context("batch", job["user_id"]):
+        return run_extraction(job["method"], job["file_path"], job["params"])
+
+
+def run_extraction(method, file_path, params):
+    """
+    Run one extraction method on a file and return the response body
+    ({"method", "extracted_fields", ...}); raises on failure. Jobs and bulk
+    documents with the same content, method and options running at the
+    same time share one extraction.
+    """
+    with EXTRACTION_DURATION.time(method=method if method in JOB_METHODS else "unknown"):
+        return coalesce_extraction(
+            extraction_key("job", file_sha256(file_path), method, params),
+            lambda: _run_extraction(method, file_path, params)
+        )
+
+
+def _run_extraction(method, file_path, params):
+    use_cache = not params.get("no_cache")
+
+    if method in ("llm", "ollama"):
+        extracted_fields = _llm_extract("ollama", file_path, use_cache)
+    elif method == "groq":
+        extracted_fields = _llm_extract("groq", file_path, use_cache)
+    elif method == "layoutlmv3":
+        extracted_fields = extract_with_layoutlmv3(file_path)
+    elif method == "cascade":
+        extracted_fields = extract_with_cascade(
+            file_path, llm_backend=params.get("llm_backend", "groq"), use_cache=use_cache
+        )
+    elif method == "hedged":
+        ocr_tokens = run_paddle_ocr(file_path)
+        if not ocr_tokens:
+            raise ValueError("No text found in image")
+        outcome = hedged_extract(
+            build_llm_prompt(ocr_tokens), params.get("primary", "groq"), params.get("secondary", "ollama"),
+            hedge_delay=params.get("hedge_delay"), timeout=params.get("deadline"), use_cache=use_cache
+        )
+        if outcome["extracted_fields"] is None:
+            raise TimeoutError("No LLM backend returned a valid result before the deadline")
+        return {"method": method, **outcome}
+    else:
+        raise ValueError(f"Unknown extraction method: {method}")
+
+    return {"method": method, "extracted_fields": extracted_fields}
+
+
+_workers = None
+
+
+def start_job_workers(num_workers=JOB_WORKERS):
+    """
+    Start the background workers of this process (once).
+    """
+    global _workers
+    if _workers is None and num_workers > 0:
+        _workers = JobWorkerPool(get_job_queue(), run_extraction_job, num_workers=num_workers).start()
+    return _workers
@@ -1,72 +1,115 @@
 import os
 import json
-import time
-from groq import Groq
 from dotenv import load_dotenv
-from backend.utils.prompts import build_llm_prompt
+from backend.utils.prompts import build_llm_prompt, EXTRACTION_SYSTEM_PROMPT
+from backend.utils.llm_output import parse_llm_json, expand_compact_result
+from backend.utils.metrics import stage
+from backend.services.llm_client import get_llm_client
+from backend.services.admission import AdmissionRejected
+from backend.services.llm_cache import get_llm_cache, make_cache_key
 
 load_dotenv()
 
+# Generation parameters sent with every request (part of the cache key).
+# JSON mode guarantees a syntactically valid object; the compact schema
+# needs far fewer output tokens than the old candidates structure. The
+# static instructions go first as the system message so every request
+# shares the same prompt prefix.
+GROQ_PARAMS = {
+    "temperature": 0.1,
+    "max_tokens": 1024,
+    "response_format": {"type": "json_object"},
+    "system": EXTRACTION_SYSTEM_PROMPT
+}
+
+# Groq's JSON mode does not support streaming: streamed responses go without
+# it and are validated by parse_llm_json's strict parse once complete
+GROQ_STREAM_PARAMS = {key: value for key, value in GROQ_PARAMS.items() if key != "response_format"}
+
+def _groq_params(system=None):
+    """Generation parameters, with other system instructions if given."""
+    return GROQ_PARAMS if system is None else {**GROQ_PARAMS, "system": system}
+
 class GroqService:
     def __init__(self, api_key=None):
-        print("GROQ_API_KEY from env:", os.getenv("GROQ_API_KEY"))
         api_key = api_key or os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable is required for Groq service")
-        self.client = Groq(api_key=api_key)
-        self.last_request_time = 0
-        self.request_interval = 2.0
+        # Pooled client shared by every GroqService using the same key
+        self.client = get_llm_client("groq", api_key=api_key)
 
-    def call_groq(self, prompt):
+    def call_groq(self, prompt, model=None, deadline=None, use_cache=True, system=None):
         """
-        Call Groq API and return standardized format.
+        Call Groq API and return standardized format. Results are served from
+        and stored in the LLM response cache unless use_cache is False.
+        `system` overrides the instructions for prompts asking for a subset
+        of fields.
         """
+        if use_cache:
+            cached = self.get_cached_result(prompt, model, system)
+            if cached is not None:
+                return cached
         try:
-            # Rate limiting
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.request_interval:
-                time.sleep(self.request_interval - time_since_last)
-            
-            # Call Groq API
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            self.last_request_time = time.time()
-            llm_response = response.choices[0].message.content.strip()
-            
-            # Try to parse JSON from the response
-            try:
-                # Extract JSON from the response (in case there's extra text)
-                start_idx = llm_response.find('{')
-                end_idx = llm_response.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = llm_response[start_idx:end_idx]
-                    parsed_data = json.loads(json_str)
-                    
-                    # Ensure it has the expected structure
-                    if "extracted_fields" in parsed_data:
-                        return parsed_data["extracted_fields"]
-                    else:
-                        # If it doesn't have the right structure, create empty result
-                        return self._get_empty_result()
-                else:
-                    return self._get_empty_result()
-                    
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse JSON from Groq response: {e}")
-                print(f"Raw response: {llm_response}")
-                return self._get_empty_result()
-                
+            llm_response = self.client.generate(prompt, deadline=deadline, model=model, **_groq_params(system))
+            result = self._parse_groq_response(llm_response)
+        except AdmissionRejected:
+            raise
         except Exception as e:
             print(f"Error calling Groq: {str(e)}")
             return self._get_empty_result()
+        if use_cache:
+            self.cache_result(prompt, result, model, system)
+        return result
+
+    def get_cached_result(self, prompt, model=None, system=None):
+        """
+        Return the cached extraction for this prompt, or None.
+        """
+        cache = get_llm_cache()
+        if cache is None:
+            return None
+        return cache.get(self._cache_key(prompt, model, system))
+
+    def cache_result(self, prompt, result, model=None, system=None):
+        """
+        Store a parsed extraction in the response cache (empty results are skipped).
+        """
+        cache = get_llm_cache()
+        if cache is not None:
+            cache.put(self._cache_key(prompt, model, system), "groq", model or self.client.model, result)
+
+    def _cache_key(self, prompt, model=None, system=None):
+        return make_cache_key("groq", model or self.client.model, _groq_params(system), prompt)
+
+    def call_groq_many(self, prompts, model=None, deadline=None):
+        """
+        Call Groq for several prompts concurrently, bounded by the client's
+        in-flight limit, and return the standardized results in order.
+        """
+        responses = self.client.generate_many(prompts, deadline=deadline, model=model, **GROQ_PARAMS)
+        return [self._parse_groq_response(r) if r else self._get_empty_result() for r in responses]
+
+    def stream_groq(self, prompt, model=None, deadline=None, cancel_event=None):
+        """
+        Call Groq with streaming enabled and yield response text chunks as
+        they are generated.
+        """
+        yield from self.client.stream(
+            prompt, deadline=deadline, cancel_event=cancel_event, model=model, **GROQ_STREAM_PARAMS
+        )
+
+    def _parse_groq_response(self, llm_response):
+        """
+        Parse the compact JSON object returned by Groq and expand it into the
+        standardized format.
+        """
+        try:
+            with stage("normalize"):
+                return expand_compact_result(parse_llm_json(llm_response))
+        except ValueError as e:
+            print(f"Failed to parse JSON from Groq response: {e}")
+            print(f"Raw response: {llm_response}")
+            return self._get_empty_result()
 
     def build_llm_prompt2(self, ocr_tokens):
         """
@@ -93,6 +136,21 @@ class GroqService:
             "items": {"candidates": [], "selected": []}
         }
 
+_groq_service = None
+def get_groq_service():
+    """
+    Return the shared GroqService, or None when it cannot be created
+    (e.g. GROQ_API_KEY is not set).
+    """
+    global _groq_service
+    if _groq_service is None:
+        try:
+            _groq_service = GroqService()
+        except Exception as e:
+            print(f"Warning: Could not initialize Groq service: {e}")
+            return None
+    return _groq_service
+
 # Example usage
 if __name__ == "__main__":
     # Set your API key
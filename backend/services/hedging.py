@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from backend.services.llm_backends import stream_llm, parse_llm_response, get_cached_llm_result, cache_llm_result
+from backend.services.llm_cache import is_cacheable
+from backend.services.llm_client import CancelEvent, deadline_after
+from backend.services.admission import carry_admission
+
+# Seconds to wait for the primary backend before also asking the secondary
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "3"))
+# Overall time budget of a hedged extraction
+LLM_HEDGE_DEADLINE = float(os.getenv("LLM_HEDGE_DEADLINE", "90"))
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "hedged": 0, "wins": {}}
+
+
+def get_hedge_stats():
+    """
+    Return the number of hedged extractions, how many sent a second request,
+    the resulting hedge rate and the wins per backend.
+    """
+    with _stats_lock:
+        requests = _stats["requests"]
+        return {
+            "requests": requests,
+            "hedged": _stats["hedged"],
+            "hedge_rate": _stats["hedged"] / requests if requests else 0.0,
+            "wins": dict(_stats["wins"]),
+        }
+
+
+def _record(hedged, backend):
+    with _stats_lock:
+        _stats["requests"] += 1
+        if hedged:
+            _stats["hedged"] += 1
+        if backend:
+            _stats["wins"][backend] = _stats["wins"].get(backend, 0) + 1
+
+
+def _run_backend(backend, prompt, deadline, cancel_event):
+    """
+    Stream the prompt on one backend and return its parsed result, or None
+    if it was cancelled or produced nothing usable.
+    """
+    text = "".join(stream_llm(backend, prompt, deadline=deadline, cancel_event=cancel_event))
+    if cancel_event.is_set():
+        return None
+    result = parse_llm_response(backend, text)
+    return result if is_cacheable(result) else None
+
+
+def hedged_extract(prompt, primary="groq", secondary="ollama", hedge_delay=None, timeout=None, use_cache=True):
+    """
+    Send the prompt to the primary backend and, if it has not produced a
+    valid result after hedge_delay seconds (or failed earlier), to the
+    secondary as well. The first valid result wins and the other request is
+    cancelled; everything is bounded by timeout seconds.
+
+    Returns a dict with extracted_fields (None if no backend answered in
+    time), the winning backend, whether a hedge request was sent, the
+    latency and the running hedge rate.
+    """
+    hedge_delay = LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    timeout = LLM_HEDGE_DEADLINE if timeout is None else timeout
+    deadline = deadline_after(timeout)
+    start = time.monotonic()
+
+    if use_cache:
+        for backend in (primary, secondary):
+            cached = get_cached_llm_result(backend, prompt)
+            if cached is not None:
+                _record(False, backend)
+                return {
+                    "extracted_fields": cached, "backend": backend, "hedged": False, "cached": True,
+                    "latency": time.monotonic() - start, "hedge_rate": get_hedge_stats()["hedge_rate"],
+                }
+
+    cancel_events = {primary: CancelEvent(), secondary: CancelEvent()}
+    pool = ThreadPoolExecutor(max_workers=2)
+    futures = {pool.submit(carry_admission(_run_backend), primary, prompt, deadline, cancel_events[primary]): primary}
+    hedged = False
+    winner, result = None, None
+    try:
+        while futures and winner is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, max(0.0, start + hedge_delay - time.monotonic()))
+            done, _ = wait(list(futures), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                backend = futures.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    print(f"Hedged request to {backend} failed: {str(e)}")
+                    value = None
+                if value is not None:
+                    winner, result = backend, value
+                    break
+
+            # Hedge once the delay has passed or the primary already failed
+            if winner is None and not hedged and (not futures or time.monotonic() - start >= hedge_delay):
+                hedged = True
+                print(f"Hedging: sending request to {secondary} as well")
+                futures[pool.submit(carry_admission(_run_backend), secondary, prompt, deadline, cancel_events[secondary])] = secondary
+    finally:
+        # Cancel whatever is still running; this closes the losers' connections
+        for event in cancel_events.values():
+            event.set()
+        pool.shutdown(wait=False)
+
+    _record(hedged, winner)
+    if winner is not None and use_cache:
+        cache_llm_result(winner, prompt, result)
+    return {
+        "extracted_fields": result, "backend": winner, "hedged": hedged, "cached": False,
+        "latency": time.monotonic() - start, "hedge_rate": get_hedge_stats()["hedge_rate"],
+    }
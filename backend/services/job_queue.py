@@ -0,0 +1,337 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from backend.utils.db import DB_PATH, get_connection, transaction
+from backend.services.admission import AdmissionRejected
+
+# Determine project root (repo root); uploaded files wait here for a worker
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", os.path.join(PROJECT_ROOT, 'cache', 'jobs'))
+JOBS_DB = DB_PATH
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A claimed job not completed or extended within this many seconds is
+# handed to another worker (the first one is assumed dead)
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retry n waits JOB_RETRY_BACKOFF * 2**(n-1) seconds
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+# Finished jobs (and their results) are deleted after this many seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def init_job_db():
+    """Initialize the extraction job table"""
+    conn = get_connection(JOBS_DB)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            method TEXT NOT NULL,
+            params TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            locked_by TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_extraction_jobs_claim
+        ON extraction_jobs (status, available_at)
+    ''')
+
+
+class JobQueue:
+    """
+    Extraction jobs persisted in SQLite so they survive restarts and can be
+    shared by several worker processes.
+
+    A worker claims a queued job by making it invisible for
+    visibility_timeout seconds; if it neither finishes nor extends the job
+    in time (crash, kill) the job becomes claimable again. Failed attempts
+    are retried with exponential backoff up to max_attempts.
+    """
+
+    def __init__(self, db_path=JOBS_DB, visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+                 max_attempts=JOB_MAX_ATTEMPTS, retry_backoff=JOB_RETRY_BACKOFF):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def _connect(self):
+        # This thread's connection, in autocommit mode outside transaction()
+        return get_connection(self.db_path)
+
+    def submit(self, method, file_path, params=None, user_id=None):
+        """Queue a job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute('''
+            INSERT INTO extraction_jobs
+                (id, user_id, method, params, file_path, status, max_attempts, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+        ''', (job_id, user_id, method, json.dumps(params or {}), file_path,
+              self.max_attempts, now, now, now))
+        return job_id
+
+    def claim(self, worker_id):
+        """
+        Take the oldest available job (queued, or running with an expired
+        visibility timeout) and return it as a dict, or None.
+        """
+        with transaction(immediate=True, path=self.db_path) as conn:
+            now = time.time()
+            # Jobs whose worker vanished on their last attempt are given up
+            expired = conn.execute('''
+                SELECT id, file_path FROM extraction_jobs
+                WHERE status = 'running' AND available_at <= ? AND attempts >= max_attempts
+            ''', (now,)).fetchall()
+            for row in expired:
+                conn.execute('''
+                    UPDATE extraction_jobs
+                    SET status = 'failed', error = 'Visibility timeout exceeded', locked_by = NULL,
+                        updated_at = ?, finished_at = ?
+                    WHERE id = ?
+                ''', (now, now, row['id']))
+            row = conn.execute('''
+                SELECT * FROM extraction_jobs
+                WHERE status IN ('queued', 'running') AND available_at <= ?
+                ORDER BY created_at
+                LIMIT 1
+            ''', (now,)).fetchone()
+            if row is not None:
+                conn.execute('''
+                    UPDATE extraction_jobs
+                    SET status = 'running', attempts = attempts + 1, locked_by = ?,
+                        available_at = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (worker_id, now + self.visibility_timeout, now, row['id']))
+
+        for expired_row in expired:
+            _remove_file(expired_row['file_path'])
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        job.update({"status": "running", "attempts": job["attempts"] + 1, "locked_by": worker_id})
+        return job
+
+    def extend(self, job_id, worker_id):
+        """Push back the visibility timeout of a job this worker still holds."""
+        return self._update_locked(job_id, worker_id, '''
+            UPDATE extraction_jobs SET available_at = ?, updated_at = ?
+            WHERE id = ? AND locked_by = ? AND status = 'running'
+        ''', lambda now: (now + self.visibility_timeout, now))
+
+    def complete(self, job_id, worker_id, result):
+        """Store the result of a job this worker holds."""
+        return self._update_locked(job_id, worker_id, '''
+            UPDATE extraction_jobs
+            SET status = 'succeeded', result = ?, error = NULL, locked_by = NULL, updated_at = ?, finished_at = ?
+            WHERE id = ? AND locked_by = ? AND status = 'running'
+        ''', lambda now: (json.dumps(result), now, now))
+
+    def fail(self, job_id, worker_id, error, attempts):
+        """
+        Record a failed attempt: requeue with backoff, or mark the job failed
+        once it has used all its attempts. Returns True if it will be retried.
+        """
+        retry = attempts < self.max_attempts
+        if retry:
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            self._update_locked(job_id, worker_id, '''
+                UPDATE extraction_jobs
+                SET status = 'queued', error = ?, locked_by = NULL, available_at = ?, updated_at = ?
+                WHERE id = ? AND locked_by = ? AND status = 'running'
+            ''', lambda now: (error, now + delay, now))
+        else:
+            self._update_locked(job_id, worker_id, '''
+                UPDATE extraction_jobs
+                SET status = 'failed', error = ?, locked_by = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ? AND locked_by = ? AND status = 'running'
+            ''', lambda now: (error, now, now))
+        return retry
+
+    def defer(self, job_id, worker_id, delay, reason):
+        """
+        Requeue a job this worker holds for delay seconds without counting
+        the attempt (it never ran, e.g. its engine was saturated).
+        """
+        return self._update_locked(job_id, worker_id, '''
+            UPDATE extraction_jobs
+            SET status = 'queued', attempts = MAX(attempts - 1, 0), error = ?, locked_by = NULL,
+                available_at = ?, updated_at = ?
+            WHERE id = ? AND locked_by = ? AND status = 'running'
+        ''', lambda now: (reason, now + delay, now))
+
+    def _update_locked(self, job_id, worker_id, sql, values):
+        now = time.time()
+        cursor = self._connect().execute(sql, (*values(now), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        """Return the job as a dict (result decoded), or None."""
+        row = self._connect().execute('SELECT * FROM extraction_jobs WHERE id = ?', (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def counts(self):
+        """Number of jobs per status."""
+        rows = self._connect().execute('SELECT status, COUNT(*) AS n FROM extraction_jobs GROUP BY status').fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def cleanup(self, retention=JOB_RETENTION):
+        """
+        Delete finished jobs older than retention seconds, and upload files
+        no job refers to any more. Returns the number of jobs deleted.
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            'DELETE FROM extraction_jobs WHERE status IN (?, ?) AND finished_at < ?',
+            (*FINISHED_STATUSES, time.time() - retention)
+        )
+        deleted = cursor.rowcount
+        pending = {row['file_path'] for row in conn.execute(
+            'SELECT file_path FROM extraction_jobs WHERE status NOT IN (?, ?)', FINISHED_STATUSES
+        )}
+
+        if os.path.isdir(JOB_FILES_DIR):
+            for name in os.listdir(JOB_FILES_DIR):
+                path = os.path.join(JOB_FILES_DIR, name)
+                # Files younger than a minute may belong to a job being submitted
+                if path not in pending and time.time() - os.path.getmtime(path) > 60:
+                    _remove_file(path)
+        return deleted
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def _remove_file(path):
+    try:
+        if path and os.path.exists(path):
+            os.unlink(path)
+    except Exception as e:
+        print(f"Warning: Could not delete job file {path}: {e}")
+
+
+def save_job_file(upload):
+    """
+    Write a validated upload (backend.utils.uploads.Upload) where workers
+    can read it after the request ends, named with its sniffed extension.
+    """
+    os.makedirs(JOB_FILES_DIR, exist_ok=True)
+    path = os.path.join(JOB_FILES_DIR, f"{uuid.uuid4().hex}{upload.ext}")
+    return upload.save(path)
+
+
+class JobWorkerPool:
+    """
+    Background threads running queued jobs through handler(job) -> result.
+
+    While a handler runs, its job's visibility timeout is extended so long
+    extractions are not picked up twice; the upload file is deleted once the
+    job succeeds or runs out of attempts.
+    """
+
+    def __init__(self, queue, handler, num_workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.handler = handler
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.num_workers):
+            worker_id = f"{os.getpid()}-{i}-{uuid.uuid4().hex[:6]}"
+            thread = threading.Thread(target=self._run, args=(worker_id,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Started {self.num_workers} extraction job workers")
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, worker_id):
+        last_cleanup = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.time() - last_cleanup > 600:
+                    last_cleanup = time.time()
+                    self.queue.cleanup()
+                job = self.queue.claim(worker_id)
+            except Exception as e:
+                print(f"Job worker {worker_id}: queue error: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._process(job, worker_id)
+
+    def _process(self, job, worker_id):
+        done = threading.Event()
+
+        def keep_visible():
+            while not done.wait(self.queue.visibility_timeout / 3):
+                self.queue.extend(job["id"], worker_id)
+
+        heartbeat = threading.Thread(target=keep_visible, daemon=True)
+        heartbeat.start()
+        start = time.monotonic()
+        try:
+            result = self.handler(job)
+        except AdmissionRejected as e:
+            # Interactive traffic has the engine: try again later, attempt not used
+            done.set()
+            self.queue.defer(job["id"], worker_id, e.retry_after, str(e))
+            print(f"Job {job['id']} deferred {e.retry_after}s: {e}")
+            return
+        except Exception as e:
+            done.set()
+            retry = self.queue.fail(job["id"], worker_id, str(e), job["attempts"])
+            print(f"Job {job['id']} attempt {job['attempts']} failed ({'retrying' if retry else 'giving up'}): {e}")
+            if not retry:
+                _remove_file(job["file_path"])
+            return
+        done.set()
+        if self.queue.complete(job["id"], worker_id, result):
+            print(f"Job {job['id']} ({job['method']}) done in {time.monotonic() - start:.1f}s")
+            _remove_file(job["file_path"])
+        else:
+            # Another worker holds the job now and still needs the file
+            print(f"Job {job['id']} finished after it was reassigned; result discarded")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Return the process-wide job queue.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
@@ -5,7 +5,12 @@ from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
 import json
 import os
 from backend.utils.utils import run_paddle_ocr, preprocess_image_for_ocr, pdf_to_image
+from backend.utils.table_extractor import line_items_field
+from backend.utils.metrics import stage
+from backend.services.admission import engine_slot, AdmissionRejected
 import re
+import itertools
+import threading
 import cv2
 
 HEADER_WORDS = {
@@ -19,23 +24,58 @@ HEADER_WORDS = {
     "DATE", "LOGO"  # Added these two specific problematic words
 }
 
-def extract_with_layoutlmv3(image_path):
+MODEL_DIR = "backend/models/layoutlmv3-invoice"
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_layoutlmv3_model():
     """
-    Extract invoice fields using LayoutLMv3 model.
-    Returns a JSON structure with extracted fields (excluding items).
+    Return the (processor, model, device) triple, loading it on first use.
+    Loaded once per process; under the production server this happens in
+    the master before forking so workers share the weights.
     """
-    # Load the trained model
-    model_dir = "backend/models/layoutlmv3-invoice" 
-    if not os.path.exists(model_dir):
-        raise FileNotFoundError(f"Model directory not found: {model_dir}")
-    
-    processor = LayoutLMv3Processor.from_pretrained(model_dir)
-    model = LayoutLMv3ForTokenClassification.from_pretrained(model_dir)
-    model.eval()
+    global _model
+    with _model_lock:
+        if _model is None:
+            if not os.path.exists(MODEL_DIR):
+                raise FileNotFoundError(f"Model directory not found: {MODEL_DIR}")
+            processor = LayoutLMv3Processor.from_pretrained(MODEL_DIR)
+            model = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_DIR)
+            model.eval()
+            # Detect device
+            device = torch.device("cpu")#torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            model.to(device)
+            _model = (processor, model, device)
+        return _model
+
+
+def loaded_model_bytes():
+    """
+    Memory held by the LayoutLMv3 weights, or 0 before they are loaded.
+    """
+    if _model is None:
+        return 0
+    model = _model[1]
+    return sum(t.numel() * t.element_size() for t in itertools.chain(model.parameters(), model.buffers()))
+
+
+def extract_with_layoutlmv3(image_path, ocr_result=None):
+    """
+    Extract invoice fields using LayoutLMv3 model. image_path may also be a
+    decoded PIL image (see backend.utils.uploads).
+    Returns a JSON structure with extracted fields; line items are read from
+    the OCR box geometry by the table extractor.
+    Pass ocr_result (output of run_paddle_ocr) to reuse an OCR pass the
+    caller already made.
+    """
+    # Load the trained model (cached after the first call)
+    processor, model, device = get_layoutlmv3_model()
     
-    # Detect device
-    device = torch.device("cpu")#torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
+    # Already decoded upload: nothing to load
+    if isinstance(image_path, Image.Image):
+        return _extract_from_image(image_path.convert("RGB"), image_path, ocr_result, processor, model, device)
     
     # Check if it's a PDF file
     file_ext = os.path.splitext(image_path)[1].lower()
@@ -107,13 +147,25 @@ def extract_with_layoutlmv3(image_path):
     if image is None:
         raise ValueError(f"All image loading methods failed for {image_path}")
     
-    # Run OCR using the utility function
-    try:
-        ocr_result = run_paddle_ocr(image_path)
-        print(f"OCR completed, found {len(ocr_result)} text elements")
-    except Exception as e:
-        print(f"Error during OCR: {str(e)}")
-        return _get_empty_result()
+    return _extract_from_image(image, image_path, ocr_result, processor, model, device)
+
+
+def _extract_from_image(image, image_path, ocr_result, processor, model, device):
+    """
+    Run OCR (unless given) and the model on a loaded RGB image.
+    """
+    width, height = image.size
+    
+    # Run OCR using the utility function (unless the caller already did)
+    if ocr_result is None:
+        try:
+            ocr_result = run_paddle_ocr(image_path)
+            print(f"OCR completed, found {len(ocr_result)} text elements")
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"Error during OCR: {str(e)}")
+            return _get_empty_result()
     
     # Extract words and bounding boxes
     ocr_words = []
@@ -158,7 +210,7 @@ def extract_with_layoutlmv3(image_path):
             encoding[k] = encoding[k].to(device)
         
         # Run inference
-        with torch.no_grad():
+        with engine_slot("layoutlmv3"), stage("model"), torch.no_grad():
             outputs = model(**encoding)
             logits = outputs.logits.cpu().numpy()[0]
             pred_ids = np.argmax(logits, axis=-1)
@@ -172,10 +224,14 @@ def extract_with_layoutlmv3(image_path):
         pred_labels = pred_labels[:actual_len]
         
         # Extract fields (excluding item-related fields), with candidates and confidence
-        extracted_fields = _extract_fields_with_confidence(ocr_words, pred_labels, logits[:actual_len])
+        with stage("normalize"):
+            extracted_fields = _extract_fields_with_confidence(ocr_words, pred_labels, logits[:actual_len])
+            extracted_fields["items"] = line_items_field(ocr_result)
         
         return extracted_fields
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"Error during model inference: {str(e)}")
         return _get_empty_result()
@@ -356,7 +412,7 @@ def _extract_fields_with_confidence(tokens, labels, logits):
             "candidates": candidates,
             "selected": selected
         }
-    # Always return items as empty list
+    # Items are not token-classified (see line_items_field)
     results["items"] = {"candidates": [], "selected": []}
     return results
 
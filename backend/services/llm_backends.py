@@ -0,0 +1,70 @@
+from backend.services.groq_service import get_groq_service
+from backend.services.ollama_service import (
+    call_ollama, stream_ollama, get_cached_ollama_result, cache_ollama_result, _parse_ollama_response
+)
+
+LLM_BACKENDS = ("groq", "ollama")
+
+
+def call_llm(backend, prompt, schema=None, use_cache=True, deadline=None, system=None):
+    """
+    Run an extraction prompt on the named backend ('groq' or 'ollama') and
+    return the standardized extracted_fields. `schema` narrows Ollama's
+    constrained output (Groq's JSON mode does not need it) and `system`
+    replaces the default extraction instructions.
+    """
+    if backend == "groq":
+        groq_service = get_groq_service()
+        if groq_service is None:
+            raise ValueError("Groq service not available. Please set GROQ_API_KEY environment variable.")
+        return groq_service.call_groq(prompt, deadline=deadline, use_cache=use_cache, system=system)
+    if backend == "ollama":
+        return call_ollama(prompt, deadline=deadline, use_cache=use_cache, schema=schema, system=system)
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+def stream_llm(backend, prompt, deadline=None, cancel_event=None):
+    """
+    Stream the raw response text chunks of an extraction prompt from the
+    named backend. Setting cancel_event aborts the request.
+    """
+    if backend == "groq":
+        groq_service = get_groq_service()
+        if groq_service is None:
+            raise ValueError("Groq service not available. Please set GROQ_API_KEY environment variable.")
+        return groq_service.stream_groq(prompt, deadline=deadline, cancel_event=cancel_event)
+    if backend == "ollama":
+        return stream_ollama(prompt, deadline=deadline, cancel_event=cancel_event)
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+def parse_llm_response(backend, llm_response):
+    """
+    Parse a complete raw response from the named backend into the
+    standardized extracted_fields.
+    """
+    if backend == "groq":
+        return get_groq_service()._parse_groq_response(llm_response)
+    return _parse_ollama_response(llm_response)
+
+
+def get_cached_llm_result(backend, prompt):
+    """
+    Return the cached extraction of this prompt on the named backend, or None.
+    """
+    if backend == "groq":
+        groq_service = get_groq_service()
+        return groq_service.get_cached_result(prompt) if groq_service is not None else None
+    return get_cached_ollama_result(prompt)
+
+
+def cache_llm_result(backend, prompt, result):
+    """
+    Store an extraction obtained outside call_llm (e.g. streamed) in the cache.
+    """
+    if backend == "groq":
+        groq_service = get_groq_service()
+        if groq_service is not None:
+            groq_service.cache_result(prompt, result)
+    else:
+        cache_ollama_result(prompt, result)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from backend.utils.metrics import REGISTRY
+
+# Determine project root (repo root) and the cache location
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join(PROJECT_ROOT, 'cache', 'llm_cache.db'))
+
+LLM_CACHE_HITS = REGISTRY.counter("llm_cache_hits_total", "LLM response cache hits")
+LLM_CACHE_MISSES = REGISTRY.counter("llm_cache_misses_total", "LLM response cache misses")
+
+
+def normalize_prompt(prompt):
+    """
+    Collapse whitespace so prompts that differ only in formatting share a
+    cache entry.
+    """
+    return " ".join((prompt or "").split())
+
+
+def make_cache_key(backend, model, params, prompt):
+    """
+    Build the cache key from backend, model name, generation parameters and
+    a hash of the normalized prompt.
+    """
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    material = json.dumps([backend, model, params or {}, prompt_hash], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(extracted_fields):
+    """
+    Only results where at least one field was actually extracted are worth
+    caching; empty results usually mean a failed or unparseable call.
+    """
+    if not isinstance(extracted_fields, dict):
+        return False
+    for value in extracted_fields.values():
+        if isinstance(value, dict) and value.get("selected"):
+            return True
+    return False
+
+
+def cache_bypassed(req):
+    """
+    Whether the client asked to skip the response cache with ?no_cache=1
+    or a 'no_cache' form field.
+    """
+    flag = req.args.get('no_cache') or req.form.get('no_cache')
+    return bool(flag) and flag.lower() in ('1', 'true', 'yes')
+
+
+class LLMResponseCache:
+    """
+    Persistent SQLite cache of parsed LLM extraction results with a TTL and
+    a bound on the number of entries (least recently used are evicted).
+    """
+
+    def __init__(self, db_path=LLM_CACHE_DB, ttl=7 * 24 * 3600, max_entries=5000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    backend TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get(self, key):
+        """
+        Return the cached result for key, or None when missing or expired.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT result, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                with self._lock:
+                    self.misses += 1
+                LLM_CACHE_MISSES.inc()
+                return None
+            conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.hits += 1
+        LLM_CACHE_HITS.inc()
+        return json.loads(row[0])
+
+    def put(self, key, backend, model, result):
+        """
+        Store a parsed result, then drop expired entries and trim the cache
+        back to max_entries.
+        """
+        if not is_cacheable(result):
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, backend, model, result, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, backend, model, json.dumps(result), now, now)
+            )
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+            conn.execute('''
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not store LLM response in cache: {e}")
+        finally:
+            conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Return the process-wide response cache configured from LLM_CACHE_TTL
+    (seconds) and LLM_CACHE_MAX_ENTRIES, or None when LLM_CACHE_ENABLED=0.
+    """
+    global _cache
+    if os.getenv("LLM_CACHE_ENABLED", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+            )
+        return _cache
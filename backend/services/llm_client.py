@@ -0,0 +1,482 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from backend.services.rate_limiter import RateLimitTimeout, estimate_tokens, get_rate_limiter
+from backend.utils.metrics import stage, record_llm_tokens, LLM_REQUESTS_IN_FLIGHT
+from backend.services.admission import engine_slot, carry_admission
+
+load_dotenv()
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when an LLM backend returns an error or cannot be reached."""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMDeadlineExceeded(LLMError):
+    """Raised when a request cannot complete before its deadline."""
+
+
+class CancelEvent(threading.Event):
+    """
+    Event that also runs callbacks when set, from the setting thread: a
+    stream registers its response's close() so cancelling it interrupts a
+    read stalled on the connection instead of waiting for the next chunk.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_callback(self, fn):
+        """Run fn() when the event is set (now if it already is)."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def remove_callback(self, fn):
+        with self._callbacks_lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Cancel callback failed: {str(e)}")
+
+
+def deadline_after(seconds):
+    """
+    Convert a relative timeout in seconds to an absolute deadline usable by
+    the client methods (None means no deadline).
+    """
+    return None if seconds is None else time.monotonic() + seconds
+
+
+def _remaining(deadline):
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    Pooled HTTP client for one LLM backend.
+
+    A single keep-alive requests.Session is shared by all callers, a bounded
+    semaphore caps the number of in-flight requests, and transient failures
+    (connection errors, 429, 5xx) are retried with exponential backoff as
+    long as the caller's deadline allows it. An optional rate limiter is
+    consulted before every attempt and told about 429 responses.
+    """
+
+    backend = None
+
+    def __init__(self, url, model, max_in_flight=4, max_retries=3,
+                 connect_timeout=10, read_timeout=300, backoff=1.0, rate_limiter=None):
+        self.url = url
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # --- backend specific hooks -------------------------------------------
+
+    def _headers(self):
+        return {}
+
+    def _payload(self, prompt, stream, **options):
+        raise NotImplementedError
+
+    def _text_from_response(self, data):
+        raise NotImplementedError
+
+    def _iter_stream_text(self, response, usage):
+        """Yield the text chunks of a streamed response, storing the token
+        count reported at its end (if any) as usage["total_tokens"]."""
+        raise NotImplementedError
+
+    def _estimate_cost(self, payload):
+        """Estimated tokens (prompt + completion) charged to the rate limiter."""
+        return None
+
+    def _estimate_usage(self, payload, text):
+        """Estimated tokens used by a request that produced text (when none are reported)."""
+        return None
+
+    def _usage_from_response(self, data):
+        """Actual tokens used as reported by the provider, if any."""
+        return None
+
+    def _token_counts(self, data):
+        """(prompt, completion) tokens reported in a response, if any."""
+        return None, None
+
+    # --- public API --------------------------------------------------------
+
+    def generate(self, prompt, deadline=None, **options):
+        """
+        Send a prompt and return the complete response text.
+        """
+        payload = self._payload(prompt, False, **options)
+        cost = self._estimate_cost(payload)
+        with self._slot(deadline), stage("llm"):
+            response = self._post(payload, False, deadline, cost)
+            try:
+                data = response.json()
+            finally:
+                response.close()
+        record_llm_tokens(self.backend, *self._token_counts(data))
+        text = self._text_from_response(data)
+        if self.rate_limiter is not None and cost:
+            actual = self._usage_from_response(data) or self._estimate_usage(payload, text)
+            if actual:
+                self.rate_limiter.record_usage(cost, actual)
+        return text.strip()
+
+    def stream(self, prompt, deadline=None, cancel_event=None, **options):
+        """
+        Send a prompt with streaming enabled and yield text chunks. The
+        in-flight slot is held until the stream is exhausted or closed.
+        Setting cancel_event stops the stream and closes the connection: at
+        once for a CancelEvent, otherwise when the next chunk arrives.
+        """
+        payload = self._payload(prompt, True, **options)
+        cost = self._estimate_cost(payload)
+        usage, generated = {}, []
+        with self._slot(deadline), stage("llm"):
+            response = self._post(payload, True, deadline, cost)
+            if isinstance(cancel_event, CancelEvent):
+                cancel_event.add_callback(response.close)
+            try:
+                for text in self._iter_stream_text(response, usage):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    remaining = _remaining(deadline)
+                    if remaining is not None and remaining <= 0:
+                        raise LLMDeadlineExceeded(f"{self.backend} stream exceeded its deadline")
+                    if text:
+                        generated.append(text)
+                        yield text
+            except Exception:
+                # The connection was closed under the read by the cancel
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                raise
+            finally:
+                if isinstance(cancel_event, CancelEvent):
+                    cancel_event.remove_callback(response.close)
+                response.close()
+                # Refund the completion budget not used, also for cancelled streams
+                if self.rate_limiter is not None and cost:
+                    actual = usage.get("total_tokens") or self._estimate_usage(payload, "".join(generated))
+                    if actual:
+                        self.rate_limiter.record_usage(cost, actual)
+
+    def generate_many(self, prompts, deadline=None, **options):
+        """
+        Run several prompts concurrently (bounded by max_in_flight) and
+        return the response texts in order. Failed prompts yield None.
+        """
+        def run(prompt):
+            try:
+                return self.generate(prompt, deadline=deadline, **options)
+            except LLMError as e:
+                print(f"Error calling {self.backend}: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            return list(pool.map(carry_admission(run), prompts))
+
+    async def agenerate(self, prompt, deadline=None, **options):
+        """
+        Async variant of generate(); the blocking call runs in a worker
+        thread so the event loop is never blocked.
+        """
+        return await asyncio.to_thread(self.generate, prompt, deadline, **options)
+
+    async def agenerate_many(self, prompts, deadline=None, **options):
+        """
+        Async variant of generate_many(); exceptions are returned in place
+        of the failed results.
+        """
+        tasks = [self.agenerate(p, deadline=deadline, **options) for p in prompts]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- internals ---------------------------------------------------------
+
+    @contextmanager
+    def _slot(self, deadline):
+        remaining = _remaining(deadline)
+        if remaining is not None and remaining <= 0:
+            raise LLMDeadlineExceeded(f"{self.backend} deadline already passed")
+        # Admission control: priority lanes and per-user fair share in
+        # front of the in-flight cap (rejects instead of queueing forever)
+        with engine_slot(self.backend, max_wait=remaining):
+            with self._in_flight(deadline):
+                yield
+
+    @contextmanager
+    def _in_flight(self, deadline):
+        remaining = _remaining(deadline)
+        acquired = self._slots.acquire(timeout=remaining) if remaining is not None else self._slots.acquire()
+        if not acquired:
+            raise LLMDeadlineExceeded(f"No free {self.backend} slot before deadline")
+        LLM_REQUESTS_IN_FLIGHT.inc(backend=self.backend)
+        try:
+            yield
+        finally:
+            LLM_REQUESTS_IN_FLIGHT.dec(backend=self.backend)
+            self._slots.release()
+
+    def _refund(self, cost):
+        """Give back the tokens charged for an attempt the provider did not process."""
+        if self.rate_limiter is not None and cost:
+            try:
+                self.rate_limiter.record_usage(cost, 0)
+            except Exception as e:
+                print(f"Could not refund {self.backend} rate limit tokens: {str(e)}")
+
+    def _post(self, payload, stream, deadline, cost=None):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None and cost:
+                try:
+                    self.rate_limiter.acquire(cost, deadline)
+                except RateLimitTimeout as e:
+                    raise LLMDeadlineExceeded(str(e), status_code=429, retry_after=e.wait_seconds)
+
+            remaining = _remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                raise LLMDeadlineExceeded(f"{self.backend} request exceeded its deadline")
+            read_timeout = self.read_timeout if remaining is None else min(self.read_timeout, remaining)
+
+            retry_after = None
+            try:
+                response = self.session.post(
+                    self.url,
+                    json=payload,
+                    headers=self._headers(),
+                    stream=stream,
+                    timeout=(self.connect_timeout, read_timeout)
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMError(f"{self.backend} request failed: {str(e)}")
+                self._refund(cost)
+            else:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.update_from_headers(response.headers)
+                if response.status_code == 200:
+                    return response
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                error = LLMError(
+                    f"{self.backend} API error: {response.status_code} {response.text[:200]}",
+                    status_code=response.status_code,
+                    retry_after=retry_after
+                )
+                if response.status_code == 429 and self.rate_limiter is not None:
+                    # The limiter now holds every caller until Retry-After
+                    self.rate_limiter.penalize(retry_after)
+                    retry_after = 0.0
+                else:
+                    self._refund(cost)
+                response.close()
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise error
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            delay = retry_after if retry_after is not None else self.backoff * (2 ** (attempt - 1))
+            delay += random.uniform(0, self.backoff / 2)
+            remaining = _remaining(deadline)
+            if remaining is not None and delay >= remaining:
+                raise error
+            print(f"{self.backend} attempt {attempt} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class OllamaClient(LLMClient):
+    """Client for a local Ollama server (/api/generate)."""
+
+    backend = "ollama"
+
+    def _payload(self, prompt, stream, **options):
+        payload = {
+            "model": options.pop("model", None) or self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        # Structured-output schema and residency are top-level fields, not model options
+        for field in ("format", "keep_alive", "system"):
+            value = options.pop(field, None)
+            if value is not None:
+                payload[field] = value
+        payload["options"] = {"temperature": options.pop("temperature", 0.1), **options}
+        return payload
+
+    def _text_from_response(self, data):
+        return data.get("response", "")
+
+    def _token_counts(self, data):
+        return data.get("prompt_eval_count"), data.get("eval_count")
+
+    def _iter_stream_text(self, response, usage):
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise LLMError(f"Ollama API error: {chunk['error']}")
+            yield chunk.get("response", "")
+            if chunk.get("done"):
+                # The final chunk carries the token counts
+                prompt_tokens, completion_tokens = self._token_counts(chunk)
+                record_llm_tokens(self.backend, prompt_tokens, completion_tokens)
+                if prompt_tokens is not None and completion_tokens is not None:
+                    usage["total_tokens"] = prompt_tokens + completion_tokens
+                break
+
+
+class GroqClient(LLMClient):
+    """Client for Groq's OpenAI-compatible chat completions endpoint."""
+
+    backend = "groq"
+
+    def __init__(self, api_key, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_key = api_key
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _payload(self, prompt, stream, **options):
+        # Static instructions first so requests share a cacheable prefix
+        messages = []
+        system = options.pop("system", None)
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        return {
+            "model": options.pop("model", None) or self.model,
+            "messages": messages,
+            "temperature": options.pop("temperature", 0.1),
+            "max_tokens": options.pop("max_tokens", 2000),
+            "stream": stream,
+            **options
+        }
+
+    def _text_from_response(self, data):
+        return data["choices"][0]["message"]["content"] or ""
+
+    def _estimate_cost(self, payload):
+        prompt_text = "".join(m.get("content", "") for m in payload.get("messages", []))
+        return estimate_tokens(prompt_text) + payload.get("max_tokens", 0)
+
+    def _estimate_usage(self, payload, text):
+        prompt_text = "".join(m.get("content", "") for m in payload.get("messages", []))
+        return estimate_tokens(prompt_text) + estimate_tokens(text)
+
+    def _usage_from_response(self, data):
+        return (data.get("usage") or {}).get("total_tokens")
+
+    def _token_counts(self, data):
+        usage = data.get("usage") or {}
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+    def _iter_stream_text(self, response, usage):
+        for line in response.iter_lines():
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                break
+            chunk = json.loads(data)
+            # The last chunk reports the usage (under x_groq, or OpenAI-style)
+            chunk_usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+            if chunk_usage:
+                record_llm_tokens(self.backend, *self._token_counts({"usage": chunk_usage}))
+                usage["total_tokens"] = chunk_usage.get("total_tokens")
+            if chunk.get("choices"):
+                yield chunk["choices"][0].get("delta", {}).get("content") or ""
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(backend, api_key=None):
+    """
+    Return the process-wide client for 'ollama' or 'groq', creating it from
+    environment configuration on first use. An explicit Groq api_key gets
+    its own client.
+    """
+    cache_key = (backend, api_key)
+    with _clients_lock:
+        if cache_key in _clients:
+            return _clients[cache_key]
+
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        if backend == "ollama":
+            client = OllamaClient(
+                url=os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate"),
+                model=os.getenv("OLLAMA_MODEL", "llama2"),
+                max_in_flight=int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2")),
+                max_retries=max_retries,
+                read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+            )
+        elif backend == "groq":
+            api_key = api_key or os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY environment variable is required for Groq service")
+            client = GroqClient(
+                api_key,
+                url=os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions"),
+                model=os.getenv("GROQ_MODEL", "llama3-8b-8192"),
+                max_in_flight=int(os.getenv("GROQ_MAX_IN_FLIGHT", "4")),
+                max_retries=max_retries,
+                read_timeout=float(os.getenv("GROQ_READ_TIMEOUT", "120")),
+                rate_limiter=get_rate_limiter("groq")
+            )
+        else:
+            raise ValueError(f"Unknown LLM backend: {backend}")
+
+        _clients[cache_key] = client
+        return client
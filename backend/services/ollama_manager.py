@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from backend.services.rate_limiter import estimate_tokens
+from backend.utils.prompts import EXTRACTION_SYSTEM_PROMPT
+
+load_dotenv()
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+# How long Ollama keeps the model in memory after the last request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Context window of every request. Fixed: Ollama reloads the model whenever
+# num_ctx changes, so the preload, the prefix prime and requests all use it
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", os.getenv("OLLAMA_MAX_CTX", "8192")))
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "1024"))
+# Evaluate the static extraction instructions once after loading so the
+# first real request finds them in the KV cache
+OLLAMA_PRIME_PREFIX = os.getenv("OLLAMA_PRIME_PREFIX", "1") != "0"
+# Seconds the model memory reported by /api/ps is reused before being refreshed
+OLLAMA_PS_MAX_AGE = float(os.getenv("OLLAMA_PS_MAX_AGE", "15"))
+
+
+class OllamaManager:
+    """
+    Keeps the configured Ollama model warm and sizes its context window.
+
+    preload() loads the model once at startup with a long keep_alive so the
+    first user request does not pay the load; request_options() gives every
+    request the same keep_alive and num_ctx as the preload, so the loaded
+    model is reused as is and long OCR dumps are not silently truncated by
+    the default window.
+    """
+
+    def __init__(self, base_url, model, keep_alive=OLLAMA_KEEP_ALIVE,
+                 num_ctx=OLLAMA_NUM_CTX, num_predict=OLLAMA_NUM_PREDICT):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+        self._lock = threading.Lock()
+        self._state = {
+            "loaded": False,
+            "loading": False,
+            "load_seconds": None,
+            "loaded_at": None,
+            "last_error": None,
+        }
+        # Last /api/ps answer for the model: (monotonic time, size_vram or None)
+        self._ps = (None, None)
+        self._ps_refreshing = False
+
+    def num_ctx_for(self, prompt):
+        """
+        Context window for a prompt: always num_ctx (a per-prompt size would
+        reload the model), with a warning if the prompt does not fit.
+        """
+        needed = estimate_tokens(prompt) + self.num_predict
+        if needed > self.num_ctx:
+            print(f"Warning: prompt needs ~{needed} tokens, above OLLAMA_NUM_CTX={self.num_ctx}; it will be truncated")
+        return self.num_ctx
+
+    def request_options(self, prompt):
+        """
+        Per-request Ollama options: keep the model resident and size num_ctx.
+        """
+        return {
+            "keep_alive": self.keep_alive,
+            "num_ctx": self.num_ctx_for(prompt),
+            "num_predict": self.num_predict,
+        }
+
+    def preload(self, timeout=600):
+        """
+        Load the model into memory (an empty prompt only loads it) and
+        record how long it took. Returns True on success.
+        """
+        with self._lock:
+            self._state["loading"] = True
+        start = time.monotonic()
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "prompt": "", "keep_alive": self.keep_alive,
+                      "options": {"num_ctx": self.num_ctx}},
+                timeout=(10, timeout)
+            )
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code} {response.text[:200]}")
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._state.update({
+                    "loaded": True,
+                    "load_seconds": round(elapsed, 3),
+                    "loaded_at": time.time(),
+                    "last_error": None,
+                })
+            print(f"Ollama model {self.model} loaded in {elapsed:.1f}s (keep_alive={self.keep_alive})")
+            if OLLAMA_PRIME_PREFIX:
+                self.prime_prefix(timeout=timeout)
+            return True
+        except Exception as e:
+            print(f"Warning: Could not preload Ollama model {self.model}: {e}")
+            with self._lock:
+                self._state.update({"loaded": False, "last_error": str(e)})
+            return False
+        finally:
+            with self._lock:
+                self._state["loading"] = False
+
+    def prime_prefix(self, system=EXTRACTION_SYSTEM_PROMPT, timeout=600):
+        """
+        Evaluate the static system prompt with a one-token generation so
+        Ollama caches it. Sent with the keep_alive and num_ctx of
+        request_options(), so the runner holding the cached prefix is the one
+        real requests use. Failure only costs the first request its prefix.
+        """
+        prompt = "OCR Text:\n"
+        options = self.request_options(system + prompt)
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={
+                    "model": self.model,
+                    "system": system,
+                    "prompt": prompt,
+                    "stream": False,
+                    "keep_alive": options["keep_alive"],
+                    "options": {"num_ctx": options["num_ctx"], "num_predict": 1},
+                },
+                timeout=(10, timeout)
+            )
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            print(f"Warning: Could not prime the Ollama prompt prefix: {e}")
+            return False
+
+    def preload_async(self):
+        """
+        Preload in a daemon thread so application startup is not blocked.
+        """
+        thread = threading.Thread(target=self.preload, name="ollama-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        """
+        Current load state and timing, completed with what Ollama reports in
+        /api/ps (resident models, memory and expiry).
+        """
+        with self._lock:
+            status = {"model": self.model, "keep_alive": self.keep_alive, **self._state}
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            running = response.json().get("models", [])
+            resident = next((m for m in running if m.get("name") == self.model or m.get("model") == self.model), None)
+            status["resident"] = resident is not None
+            if resident is not None:
+                status["size_vram"] = resident.get("size_vram")
+                status["expires_at"] = resident.get("expires_at")
+            status["reachable"] = True
+        except Exception as e:
+            status["reachable"] = False
+            status["resident"] = False
+            status["last_error"] = status["last_error"] or str(e)
+        with self._lock:
+            self._ps = (time.monotonic(), status.get("size_vram"))
+        return status
+
+    def resident_memory(self, max_age=OLLAMA_PS_MAX_AGE):
+        """
+        Memory Ollama holds for the model (None if not resident), as last
+        seen by status(). Never waits on Ollama: an answer older than
+        max_age is refreshed in a daemon thread for the next caller.
+        """
+        with self._lock:
+            fetched_at, size_vram = self._ps
+            stale = fetched_at is None or time.monotonic() - fetched_at > max_age
+            if stale and not self._ps_refreshing:
+                self._ps_refreshing = True
+                threading.Thread(target=self._refresh_ps, name="ollama-ps", daemon=True).start()
+        return size_vram
+
+    def _refresh_ps(self):
+        try:
+            self.status()
+        finally:
+            with self._lock:
+                self._ps_refreshing = False
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_ollama_manager():
+    """
+    Return the process-wide Ollama manager for OLLAMA_URL / OLLAMA_MODEL.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            base_url = OLLAMA_URL.split("/api/")[0]
+            _manager = OllamaManager(base_url, OLLAMA_MODEL)
+        return _manager
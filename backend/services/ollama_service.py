@@ -1,56 +1,113 @@
-import json
-import time
-import requests
-from backend.utils.prompts import build_llm_prompt
+from backend.utils.prompts import build_llm_prompt, EXTRACTION_SCHEMA, EXTRACTION_SYSTEM_PROMPT
+from backend.utils.llm_output import parse_llm_json, expand_compact_result
+from backend.utils.metrics import stage
+from backend.services.llm_client import get_llm_client
+from backend.services.admission import AdmissionRejected
+from backend.services.llm_cache import get_llm_cache, make_cache_key
+from backend.services.ollama_manager import get_ollama_manager
 
-def call_ollama(prompt):
+# Generation parameters sent with every request (part of the cache key).
+# `format` constrains decoding to the compact extraction schema and the
+# static `system` instructions form a prefix shared by every request, which
+# Ollama keeps in its KV cache while the model stays resident.
+OLLAMA_PARAMS = {"temperature": 0.1, "format": EXTRACTION_SCHEMA, "system": EXTRACTION_SYSTEM_PROMPT}
+
+def _ollama_params(schema=None, system=None):
+    """Generation parameters, with a narrower schema / other instructions if given."""
+    params = dict(OLLAMA_PARAMS)
+    if schema is not None:
+        params["format"] = schema
+    if system is not None:
+        params["system"] = system
+    return params
+
+def _request_options(prompt, params):
+    # Context window sized for the system prefix plus the invoice content
+    return get_ollama_manager().request_options(params["system"] + prompt)
+
+def call_ollama(prompt, model=None, deadline=None, use_cache=True, schema=None, system=None):
     """
-    Call Ollama API and return standardized format.
+    Call Ollama API and return standardized format. Results are served from
+    and stored in the LLM response cache unless use_cache is False. `schema`
+    and `system` override the output schema and instructions for prompts
+    asking for a subset of fields.
     """
+    if use_cache:
+        cached = get_cached_ollama_result(prompt, model, schema, system)
+        if cached is not None:
+            return cached
+    params = _ollama_params(schema, system)
     try:
-        # Call Ollama API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama2",
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=30
+        llm_response = get_llm_client("ollama").generate(
+            prompt, deadline=deadline, model=model, **params, **_request_options(prompt, params)
         )
-        
-        if response.status_code != 200:
-            raise Exception(f"Ollama API error: {response.status_code}")
-        
-        result = response.json()
-        llm_response = result.get("response", "").strip()
-        
-        # Try to parse JSON from the response
-        try:
-            # Extract JSON from the response (in case there's extra text)
-            start_idx = llm_response.find('{')
-            end_idx = llm_response.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = llm_response[start_idx:end_idx]
-                parsed_data = json.loads(json_str)
-                
-                # Ensure it has the expected structure
-                if "extracted_fields" in parsed_data:
-                    return parsed_data["extracted_fields"]
-                else:
-                    # If it doesn't have the right structure, create empty result
-                    return _get_empty_result()
-            else:
-                return _get_empty_result()
-                
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON from Ollama response: {e}")
-            print(f"Raw response: {llm_response}")
-            return _get_empty_result()
-            
+        result = _parse_ollama_response(llm_response)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"Error calling Ollama: {str(e)}")
         return _get_empty_result()
+    if use_cache:
+        cache_ollama_result(prompt, result, model, schema, system)
+    return result
+
+def get_cached_ollama_result(prompt, model=None, schema=None, system=None):
+    """
+    Return the cached extraction for this prompt, or None.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None
+    return cache.get(_cache_key(prompt, model, schema, system))
+
+def cache_ollama_result(prompt, result, model=None, schema=None, system=None):
+    """
+    Store a parsed extraction in the response cache (empty results are skipped).
+    """
+    cache = get_llm_cache()
+    if cache is not None:
+        model = model or get_llm_client("ollama").model
+        cache.put(_cache_key(prompt, model, schema, system), "ollama", model, result)
+
+def _cache_key(prompt, model=None, schema=None, system=None):
+    return make_cache_key(
+        "ollama", model or get_llm_client("ollama").model, _ollama_params(schema, system), prompt
+    )
+
+def call_ollama_many(prompts, model=None, deadline=None):
+    """
+    Call Ollama for several prompts concurrently, bounded by the client's
+    in-flight limit, and return the standardized results in order.
+    """
+    # Same options as single requests (checked against the longest prompt)
+    options = _request_options(max(prompts, key=len), OLLAMA_PARAMS) if prompts else {}
+    responses = get_llm_client("ollama").generate_many(
+        prompts, deadline=deadline, model=model, **OLLAMA_PARAMS, **options
+    )
+    return [_parse_ollama_response(r) if r else _get_empty_result() for r in responses]
+
+def stream_ollama(prompt, model=None, deadline=None, cancel_event=None):
+    """
+    Call Ollama with streaming enabled and yield response text chunks as
+    they are generated.
+    """
+    yield from get_llm_client("ollama").stream(
+        prompt, deadline=deadline, cancel_event=cancel_event, model=model,
+        **OLLAMA_PARAMS, **_request_options(prompt, OLLAMA_PARAMS)
+    )
+
+def _parse_ollama_response(llm_response):
+    """
+    Parse the compact JSON object returned by Ollama and expand it into the
+    standardized format.
+    """
+    try:
+        with stage("normalize"):
+            return expand_compact_result(parse_llm_json(llm_response))
+    except ValueError as e:
+        print(f"Failed to parse JSON from Ollama response: {e}")
+        print(f"Raw response: {llm_response}")
+        return _get_empty_result()
 
 def _get_empty_result():
     """
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Determine project root (repo root) and the local store shared by workers
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(PROJECT_ROOT, 'cache', 'rate_limits.db'))
+
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity will not be available before the caller's deadline."""
+
+    def __init__(self, message, wait_seconds):
+        super().__init__(message)
+        self.wait_seconds = wait_seconds
+
+
+def estimate_tokens(text):
+    """
+    Rough token estimate (about 4 characters per token for English/French
+    text), good enough to budget tokens-per-minute before the call.
+    """
+    return len(text or "") // 4 + 1
+
+
+class TokenBucketLimiter:
+    """
+    Token-bucket limiter tracking both requests/min and tokens/min.
+
+    Bucket levels live in a small SQLite file so every worker process on the
+    host draws from the same budget. A caller short of capacity sleeps
+    (without holding any lock) until the bucket has refilled enough; one
+    whose deadline would pass first is rejected immediately instead.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute,
+                 db_path=RATE_LIMIT_DB, max_wait=60.0):
+        self.name = name
+        self.rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self.db_path = db_path
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._init_store()
+
+    def _connect(self):
+        # Autocommit mode so transactions are controlled explicitly below
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def _init_store(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute(
+                'INSERT OR IGNORE INTO buckets (name, requests, tokens, updated_at) VALUES (?, ?, ?, ?)',
+                (self.name, self.rpm, self.tpm, time.time())
+            )
+        finally:
+            conn.close()
+
+    def _update(self, fn):
+        """
+        Refill the bucket, apply fn(requests, tokens, blocked_until, now)
+        -> (requests, tokens, blocked_until, result) atomically across
+        processes, and return result.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT requests, tokens, updated_at, blocked_until FROM buckets WHERE name = ?',
+                (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                requests, tokens, updated_at, blocked_until = self.rpm, self.tpm, now, 0.0
+            else:
+                requests, tokens, updated_at, blocked_until = row
+            elapsed = max(0.0, now - updated_at)
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60.0)
+
+            requests, tokens, blocked_until, result = fn(requests, tokens, blocked_until, now)
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (name, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)',
+                (self.name, requests, tokens, now, blocked_until)
+            )
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            # Nothing to roll back if BEGIN IMMEDIATE itself failed (locked)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _try_take(self, cost):
+        def take(requests, tokens, blocked_until, now):
+            if now < blocked_until:
+                return requests, tokens, blocked_until, blocked_until - now
+            if requests >= 1 and tokens >= cost:
+                return requests - 1, tokens - cost, blocked_until, 0.0
+            wait = max(
+                (1 - requests) * 60.0 / self.rpm if requests < 1 else 0.0,
+                (cost - tokens) * 60.0 / self.tpm if tokens < cost else 0.0
+            )
+            return requests, tokens, blocked_until, wait
+        return self._update(take)
+
+    def acquire(self, cost, deadline=None):
+        """
+        Take one request and `cost` tokens from the bucket, waiting until
+        they are available. `deadline` is a time.monotonic() value; without
+        one the wait is capped at max_wait seconds.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.max_wait
+        cost = min(float(cost), self.tpm)
+
+        while True:
+            # The lock only covers the bucket update; waits happen outside it
+            if not self._lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise RateLimitTimeout(f"{self.name} rate limiter busy past the deadline", deadline - time.monotonic())
+            try:
+                wait = self._try_take(cost)
+            finally:
+                self._lock.release()
+            if wait <= 0:
+                return
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                raise RateLimitTimeout(
+                    f"{self.name} rate limit: capacity available in {wait:.1f}s, after the deadline",
+                    wait
+                )
+            time.sleep(wait)
+
+    def record_usage(self, estimated, actual):
+        """
+        Reconcile an estimate with the token count reported by the provider,
+        refunding over-estimates and charging under-estimates.
+        """
+        def adjust(requests, tokens, blocked_until, now):
+            return requests, min(self.tpm, tokens + estimated - actual), blocked_until, None
+        self._update(adjust)
+
+    def penalize(self, retry_after):
+        """
+        React to a 429: block every caller until Retry-After has passed and
+        drain the buckets so traffic ramps back up gradually.
+        """
+        retry_after = retry_after if retry_after is not None else 60.0 / self.rpm
+
+        def block(requests, tokens, blocked_until, now):
+            return 0.0, min(tokens, 0.0), max(blocked_until, now + retry_after), None
+        self._update(block)
+
+    def update_from_headers(self, headers):
+        """
+        Clamp bucket levels to the remaining quota reported by the provider
+        (x-ratelimit-remaining-requests / x-ratelimit-remaining-tokens).
+        """
+        try:
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            remaining_requests = float(remaining_requests) if remaining_requests is not None else None
+            remaining_tokens = float(remaining_tokens) if remaining_tokens is not None else None
+        except (TypeError, ValueError):
+            return
+        if remaining_requests is None and remaining_tokens is None:
+            return
+
+        def clamp(requests, tokens, blocked_until, now):
+            if remaining_requests is not None:
+                requests = min(requests, remaining_requests)
+            if remaining_tokens is not None:
+                tokens = min(tokens, remaining_tokens)
+            return requests, tokens, blocked_until, None
+        self._update(clamp)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name):
+    """
+    Return the process-wide limiter for a provider, configured from
+    <NAME>_RPM, <NAME>_TPM and <NAME>_MAX_QUEUE_WAIT.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            prefix = name.upper()
+            _limiters[name] = TokenBucketLimiter(
+                name,
+                requests_per_minute=float(os.getenv(f"{prefix}_RPM", "30")),
+                tokens_per_minute=float(os.getenv(f"{prefix}_TPM", "6000")),
+                max_wait=float(os.getenv(f"{prefix}_MAX_QUEUE_WAIT", "60"))
+            )
+        return _limiters[name]
@@ -0,0 +1,91 @@
+import json
+import threading
+
+from backend.utils.metrics import REGISTRY
+
+EXTRACTION_COALESCED = REGISTRY.counter(
+    "extraction_coalesced_total", "Extractions answered by joining an identical one in progress", ("method",))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller of a key runs the
+    function, callers arriving while it runs wait and receive the same
+    result (or exception). Nothing is kept once the call returns, so this
+    deduplicates double submissions without caching results.
+
+    on_join(key) is called for each caller that joins a call in progress.
+    """
+
+    def __init__(self, on_join=None):
+        self.on_join = on_join
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the call of key already in progress."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if self.on_join is not None:
+                self.on_join(key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def _joined_extraction(key):
+    EXTRACTION_COALESCED.inc(method=key[1])
+    print(f"Joined the {key[1]} extraction already running for this document")
+
+
+_extractions = SingleFlight(on_join=_joined_extraction)
+
+REGISTRY.gauge("extraction_single_flight_calls", "Distinct extractions running under single-flight",
+               callback=_extractions.in_flight)
+
+
+def extraction_key(scope, content_hash, method, options=None):
+    """
+    Key of an extraction: the document content, the method and every option
+    changing its result. scope separates callers whose results differ in
+    shape (route responses, job bodies).
+    """
+    return (scope, method, content_hash, json.dumps(options or {}, sort_keys=True, default=str))
+
+
+def coalesce_extraction(key, fn):
+    """
+    Run an extraction once for all identical concurrent requests (see
+    extraction_key); every caller gets the result.
+    """
+    return _extractions.do(key, fn)
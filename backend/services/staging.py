@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+# Determine project root (repo root); extracted uploads wait here to be saved
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+STAGING_DIR = os.getenv("STAGING_DIR", os.path.join(PROJECT_ROOT, 'cache', 'staging'))
+# Seconds a staged upload stays available for saving
+STAGING_TTL = int(os.getenv("STAGING_TTL", "1800"))
+# Total size of the staging area; the oldest uploads are evicted beyond it
+STAGING_MAX_BYTES = int(os.getenv("STAGING_MAX_BYTES", str(512 * 1024 * 1024)))
+# Seconds between two scans of the staging area for uploads to evict
+STAGING_EVICT_INTERVAL = float(os.getenv("STAGING_EVICT_INTERVAL", "60"))
+
+STAGING_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class StagingError(Exception):
+    """A staged upload cannot be used; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=404):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StagingStore:
+    """
+    Short-lived store of extracted uploads, so saving an invoice promotes
+    the file already on the server instead of uploading it again.
+
+    Each upload is a file plus a JSON sidecar (owner, original name, time),
+    kept on disk so every worker process sees it. Expired uploads and, when
+    the store is over max_bytes, the oldest ones are evicted by a scan run at
+    most every evict_interval seconds (on a write).
+    """
+
+    def __init__(self, directory=STAGING_DIR, ttl=STAGING_TTL, max_bytes=STAGING_MAX_BYTES,
+                 evict_interval=STAGING_EVICT_INTERVAL):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, staging_id):
+        return os.path.join(self.directory, staging_id), os.path.join(self.directory, f"{staging_id}.json")
+
+    def _remove(self, staging_id):
+        for path in self._paths(staging_id):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stage(self, upload, user_id):
+        """
+        Keep a validated upload (backend.utils.uploads.Upload) for user_id.
+        Returns the staging id, or None if the upload is larger than the store.
+        """
+        if upload.size > self.max_bytes:
+            return None
+        staging_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(staging_id)
+        upload.save(data_path)
+        meta = {"user_id": user_id, "filename": upload.filename, "ext": upload.ext,
+                "size": upload.size, "created_at": time.time()}
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        if time.monotonic() - self._last_evict >= self.evict_interval:
+            self.evict()
+        return staging_id
+
+    def get(self, staging_id, user_id):
+        """
+        Metadata of a staged upload owned by user_id; raises StagingError
+        (404 unknown, 410 expired) otherwise.
+        """
+        if not staging_id or not STAGING_ID_PATTERN.match(staging_id):
+            raise StagingError("Invalid staging id", 400)
+        data_path, meta_path = self._paths(staging_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise StagingError("Staged upload not found", 404)
+        if meta.get("user_id") != user_id:
+            raise StagingError("Staged upload not found", 404)
+        if meta["created_at"] + self.ttl < time.time() or not os.path.exists(data_path):
+            self._remove(staging_id)
+            raise StagingError("Staged upload expired", 410)
+        return meta
+
+    def promote(self, staging_id, user_id, destination):
+        """
+        Move a staged upload to destination (a rename on the same
+        filesystem) and forget it. Returns the metadata.
+        """
+        meta = self.get(staging_id, user_id)
+        data_path, meta_path = self._paths(staging_id)
+        try:
+            os.replace(data_path, destination)
+        except FileNotFoundError:
+            # Evicted (or promoted by a concurrent request) in the meantime
+            raise StagingError("Staged upload not found or expired", 410)
+        except OSError:
+            # Staging and uploads on different filesystems
+            shutil.move(data_path, destination)
+        try:
+            os.unlink(meta_path)
+        except OSError:
+            pass
+        return meta
+
+    def evict(self):
+        """
+        Delete expired uploads, then the oldest ones until the store fits in
+        max_bytes.
+        """
+        with self._lock:
+            self._last_evict = time.monotonic()
+            now = time.time()
+            entries = []
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            for name in names:
+                if not STAGING_ID_PATTERN.match(name):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                if stat.st_mtime + self.ttl < now:
+                    self._remove(name)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(name)
+                total -= size
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_staging_store():
+    """
+    Return the process-wide staging store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StagingStore()
+        return _store
+
+
+def staging_fields(upload, user_id):
+    """
+    Stage an extracted upload for a signed-in user and return the fields to
+    add to the extraction response ({} for anonymous users or on failure,
+    in which case saving falls back to uploading the image).
+    """
+    if user_id is None:
+        return {}
+    try:
+        staging_id = get_staging_store().stage(upload, user_id)
+    except Exception as e:
+        print(f"Could not stage upload: {str(e)}")
+        return {}
+    if staging_id is None:
+        return {}
+    return {'staging_id': staging_id, 'staging_expires_in': STAGING_TTL}
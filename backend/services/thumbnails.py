@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from PIL import Image
+
+# Determine project root (repo root); thumbnails live next to the uploads
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+THUMBNAILS_DIR = os.getenv("THUMBNAILS_DIR", os.path.join(PROJECT_ROOT, 'uploads', 'thumbnails'))
+
+# Fixed widths served by ?size= on the image route ("full" is the upload itself)
+THUMBNAIL_WIDTHS = {"thumb": 400, "preview": 1600}
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def thumbnail_path(image_hash, size):
+    """Where the WebP rendition of an image (by content hash) is stored."""
+    return os.path.join(THUMBNAILS_DIR, f"{image_hash}_{size}.webp")
+
+
+def _open_first_page(image_path):
+    if image_path.lower().endswith(".pdf"):
+        from backend.utils.utils import pdf_to_image
+        return pdf_to_image(image_path, dpi=150)
+    image = Image.open(image_path)
+    image.seek(0)
+    return image
+
+
+def create_thumbnails(image_path, image_hash=None, sizes=None):
+    """
+    Render the WebP renditions of an uploaded invoice (first page for PDFs)
+    at the fixed THUMBNAIL_WIDTHS, never upscaling. Renditions named after
+    the content hash are shared by identical uploads and never rewritten.
+
+    Returns the image's content hash.
+    """
+    image_hash = image_hash or file_sha256(image_path)
+    sizes = sizes or list(THUMBNAIL_WIDTHS)
+    missing = [size for size in sizes if not os.path.exists(thumbnail_path(image_hash, size))]
+    if not missing:
+        return image_hash
+
+    os.makedirs(THUMBNAILS_DIR, exist_ok=True)
+    source = _open_first_page(image_path)
+    try:
+        # JPEG decoding can downscale directly, far cheaper than a full decode
+        widest = max(THUMBNAIL_WIDTHS[s] for s in missing)
+        if widest < source.width:
+            source.draft("RGB", (widest, max(1, source.height * widest // source.width)))
+        source = source.convert("RGB")
+        for size in sorted(missing, key=lambda s: -THUMBNAIL_WIDTHS[s]):
+            width = min(THUMBNAIL_WIDTHS[size], source.width)
+            height = max(1, round(source.height * width / source.width))
+            rendition = source.resize((width, height), Image.LANCZOS) if width != source.width else source
+            path = thumbnail_path(image_hash, size)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            rendition.save(tmp_path, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+            os.replace(tmp_path, path)
+    finally:
+        source.close()
+    return image_hash
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from backend.utils.metrics import TimedConnection
+
+# Determine project root (repo root); the database no longer depends on the working directory
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+DB_PATH = os.path.abspath(os.getenv("DB_PATH", os.path.join(PROJECT_ROOT, 'invoices.db')))
+
+# Milliseconds a statement waits for another writer before "database is locked"
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+# Page cache per connection (KiB) and memory-mapped I/O (bytes)
+DB_CACHE_KIB = int(os.getenv("DB_CACHE_KIB", "16384"))
+DB_MMAP_BYTES = int(os.getenv("DB_MMAP_BYTES", str(128 * 1024 * 1024)))
+# Prepared statements kept per connection
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+_local = threading.local()
+
+
+def _open(path):
+    # Autocommit: statements outside transaction() commit on their own
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT / 1000, isolation_level=None,
+                           cached_statements=DB_STATEMENT_CACHE, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers run while one connection writes; it is persistent,
+    # the other settings are per connection
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT}')
+    # Durable at checkpoints rather than at each commit, safe with WAL
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_KIB}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_BYTES}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def get_connection(path=DB_PATH):
+    """
+    Return this thread's connection to the database at path, opened and
+    tuned on first use and kept for the life of the thread (no open/close
+    or schema parsing per request). Rows are sqlite3.Row: they unpack like
+    tuples and index by column name. Never close it.
+    """
+    connections = getattr(_local, 'connections', None)
+    pid = os.getpid()
+    if connections is None or _local.pid != pid:
+        # Connections inherited through fork() belong to the parent process
+        connections = _local.connections = {}
+        _local.depths = {}
+        _local.pid = pid
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _open(path)
+    return conn
+
+
+@contextmanager
+def transaction(immediate=False, path=DB_PATH):
+    """
+    Run a block in a transaction on this thread's connection: committed when
+    the block ends, rolled back if it raises. immediate=True takes the write
+    lock up front (read-then-write blocks), so two writers never deadlock
+    upgrading their locks. Nested use joins the outer transaction.
+
+    Nesting is tracked per thread rather than read from in_transaction: a
+    transaction left open on the connection by an earlier request (the
+    connection outlives it) is rolled back, never joined and committed.
+    """
+    conn = get_connection(path)
+    depths = _local.depths
+    if depths.get(path, 0):
+        depths[path] += 1
+        try:
+            yield conn
+        finally:
+            depths[path] -= 1
+        return
+    if conn.in_transaction:
+        print(f"Warning: rolling back a transaction left open on {path}")
+        conn.rollback()
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    depths[path] = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        depths[path] = 0
+
+
+def close_connections():
+    """Close this thread's connections (scripts, tests, thread shutdown)."""
+    connections = getattr(_local, 'connections', None) or {}
+    if getattr(_local, 'pid', None) == os.getpid():
+        for conn in connections.values():
+            conn.close()
+    _local.connections = {}
+    _local.depths = {}
+    _local.pid = os.getpid()
@@ -0,0 +1,76 @@
+import json
+from backend.utils.prompts import HEADER_FIELDS, ITEM_FIELDS
+
+# Confidence attached to values synthesized from the compact LLM output
+LLM_CONFIDENCE = 0.9
+
+
+def parse_llm_json(llm_response):
+    """
+    Strictly parse a JSON object returned by an LLM in JSON mode.
+
+    Only a surrounding markdown code fence is tolerated; anything else that is
+    not a JSON object raises ValueError.
+    """
+    text = (llm_response or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM response is not valid JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise ValueError("LLM response is not a JSON object")
+    return parsed
+
+
+def _as_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return str(value)
+    if not isinstance(value, str):
+        return ""
+    return value.strip()
+
+
+def expand_field(field, value):
+    """
+    Expand one compact field value into the {"candidates", "selected"}
+    structure used throughout the app.
+    """
+    if field == "items":
+        items = []
+        for item in value if isinstance(value, list) else []:
+            if not isinstance(item, dict):
+                continue
+            row = {key: _as_text(item.get(key)) for key in ITEM_FIELDS}
+            if any(row.values()):
+                items.append(row)
+        return {
+            "candidates": [{"confidence": LLM_CONFIDENCE, "value": item} for item in items],
+            "selected": items
+        }
+
+    # Already expanded (older prompt format)
+    if isinstance(value, dict) and "selected" in value:
+        return value
+
+    text = _as_text(value)
+    return {
+        "candidates": [{"confidence": LLM_CONFIDENCE, "value": text}] if text else [],
+        "selected": text
+    }
+
+
+def expand_compact_result(compact):
+    """
+    Turn the flat object produced by the compact prompt into the full
+    extracted_fields structure. Results in the legacy
+    {"extracted_fields": {...}} shape are passed through.
+    """
+    if "extracted_fields" in compact and isinstance(compact["extracted_fields"], dict):
+        compact = compact["extracted_fields"]
+    return {field: expand_field(field, compact.get(field)) for field in HEADER_FIELDS + ["items"]}
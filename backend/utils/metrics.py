@@ -0,0 +1,416 @@
+import bisect
+import fcntl
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Latency buckets in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Directory shared by the worker processes of one server (set by the gunicorn
+# config): each worker writes its metrics there and a scrape of any worker
+# renders all of them. Unset (development server): this process only.
+METRICS_DIR = os.getenv("METRICS_DIR")
+# Seconds between two writes of a worker's metrics to METRICS_DIR
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        """(suffix, label values, extra label, value) tuples to render."""
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        return _render_family(self.name, self.type_name, self.documentation, self.labelnames, self._samples())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+def _render_family(name, type_name, documentation, labelnames, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {type_name}"]
+    for suffix, key, extra, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labelnames, key, extra)} {_format_value(value)}")
+    return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. A gauge given a callback is computed when
+    scraped instead: the callback returns a number, or a dict of label
+    value tuples to numbers for labelled gauges.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.callback is None:
+            return super()._samples()
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Metric {self.name} unavailable: {str(e)}")
+            return []
+        if isinstance(value, dict):
+            return [("", tuple(str(v) for v in key), None, v) for key, v in value.items() if v is not None]
+        return [] if value is None else [("", (), None, value)]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) over fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            snapshot = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(("_sum", key, None, total))
+            samples.append(("_count", key, None, count))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """
+    Process-wide collection of metrics rendered in the Prometheus text
+    exposition format. Each gunicorn worker has its own registry.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        if METRICS_DIR:
+            return self.render_all(METRICS_DIR)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def reset(self):
+        """Forget the values inherited from the parent process (call after fork)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def snapshot(self):
+        """This process's metrics as JSON-serializable families."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [{"name": m.name, "type": m.type_name, "doc": m.documentation,
+                 "labelnames": list(m.labelnames), "samples": [list(sample) for sample in m._samples()]}
+                for m in metrics]
+
+    def dump(self, directory=METRICS_DIR):
+        """Write this process's snapshot to <directory>/<pid>.json."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def render_all(self, directory=METRICS_DIR):
+        """
+        Metrics of every worker writing to directory. Counters and histograms
+        are summed over all of them, exited workers included (merged into
+        exited.json) so they never go down; gauges describe the running
+        workers, one series per worker with a pid label.
+        """
+        self.dump(directory)
+        with open(os.path.join(directory, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                _archive_exited(directory)
+                snapshots = _read_snapshots(directory)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        families = {}
+        for pid, snapshot in snapshots:
+            for family in snapshot:
+                gauge = family["type"] == "gauge"
+                if gauge and pid is None:
+                    continue
+                merged = families.setdefault(family["name"], {
+                    **family, "labelnames": family["labelnames"] + (["pid"] if gauge else []), "samples": {}
+                })
+                for suffix, key, extra, value in family["samples"]:
+                    key = tuple(key) + ((str(pid),) if gauge else ())
+                    merged["samples"][(suffix, key, extra)] = merged["samples"].get((suffix, key, extra), 0) + value
+        return "\n".join(
+            _render_family(f["name"], f["type"], f["doc"], f["labelnames"],
+                           [(suffix, key, extra, value) for (suffix, key, extra), value in f["samples"].items()])
+            for f in families.values()
+        ) + "\n"
+
+    def start_flusher(self, directory=METRICS_DIR, interval=METRICS_FLUSH_SECONDS):
+        """Write this worker's metrics every interval seconds (no-op without a directory)."""
+        if not directory:
+            return None
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(directory)
+                except Exception as e:
+                    print(f"Could not write metrics: {str(e)}")
+
+        thread = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        thread.start()
+        return thread
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots(directory):
+    """(pid, or None for exited workers, snapshot) of every file in directory."""
+    snapshots = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        pid = name[:-len(".json")]
+        snapshots.append((int(pid) if pid.isdigit() else None, snapshot))
+    return snapshots
+
+
+def _archive_exited(directory):
+    """Fold the counters and histograms of exited workers into exited.json."""
+    exited = [name for name in os.listdir(directory)
+              if name.endswith(".json") and name[:-5].isdigit() and not _pid_alive(int(name[:-5]))]
+    if not exited:
+        return
+    archive_path = os.path.join(directory, "exited.json")
+    families = {}
+    for name in ["exited.json"] + exited:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for family in snapshot:
+            if family["type"] == "gauge":
+                continue
+            merged = families.setdefault(family["name"], {**family, "samples": {}})
+            for suffix, key, extra, value in family["samples"]:
+                sample = (suffix, tuple(key), extra)
+                merged["samples"][sample] = merged["samples"].get(sample, 0) + value
+    snapshot = [{**f, "samples": [[suffix, list(key), extra, value] for (suffix, key, extra), value in f["samples"].items()]}
+                for f in families.values()]
+    with open(f"{archive_path}.tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(f"{archive_path}.tmp", archive_path)
+    for name in exited:
+        os.unlink(os.path.join(directory, name))
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency (streamed bodies included)",
+    ("route", "method", "status"))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests being served")
+EXTRACTION_DURATION = REGISTRY.histogram(
+    "extraction_duration_seconds", "Extraction latency per extraction method", ("method",))
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds",
+    "Latency of a pipeline stage (decode, preprocess, ocr, model, llm, normalize, db)", ("stage",))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the LLM backends", ("backend", "kind"))
+LLM_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "llm_requests_in_flight", "LLM requests holding a client slot", ("backend",))
+
+
+def stage(name):
+    """Context manager timing one pipeline stage."""
+    return _Timer(STAGE_DURATION, {"stage": name})
+
+
+def record_llm_tokens(backend, prompt_tokens=None, completion_tokens=None):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, backend=backend, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, backend=backend, kind="completion")
+
+
+class _TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        with stage("db"):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with stage("db"):
+            return super().executemany(*args)
+
+    def fetchall(self):
+        with stage("db"):
+            return super().fetchall()
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection factory (sqlite3.connect(..., factory=TimedConnection))
+    whose queries are timed as the "db" stage.
+    """
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def commit(self):
+        with stage("db"):
+            return super().commit()
+
+
+def process_memory():
+    """Resident set size of this process in bytes (Linux), else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+REGISTRY.gauge("process_resident_memory_bytes", "Resident memory of this worker process",
+               callback=process_memory)
@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Determine project root (repo root); captured profiles are written here
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(PROJECT_ROOT, 'cache', 'profiles'))
+# Seconds between two stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# A profile stops sampling after this long even if the request goes on
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+# Profiles kept on disk; the oldest are deleted beyond it
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+PROFILE_FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed.txt"}
+
+# Top frames of a thread with nothing to do (pool workers, server loops)
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "socketserver.py", "socket.py")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of one request.
+
+    A background thread records the Python stack of every thread each
+    `interval` seconds until stop(). The request's own thread is always
+    kept; other threads (engine pools the request fanned out to, but also
+    concurrent requests) only for the samples where they were busy. Each
+    thread becomes its own profile of the speedscope file.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL, max_seconds=PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._frames = {}
+        self._samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.duration = 0.0
+
+    def _frame_index(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_index(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident != self.thread_id and frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                if ident not in names:
+                    thread = threading._active.get(ident)
+                    names[ident] = thread.name if thread is not None else str(ident)
+                samples = self._samples.setdefault((ident, names[ident]), {})
+                stack = self._stack(frame)
+                samples[stack] = samples.get(stack, 0.0) + weight
+            if now - self.started > self.max_seconds:
+                break
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _threads(self):
+        # The request thread first, then the busiest
+        return sorted(self._samples.items(),
+                      key=lambda item: (item[0][0] != self.thread_id, -sum(item[1].values())))
+
+    def to_speedscope(self, name):
+        """Profile in the speedscope file format (https://www.speedscope.app)."""
+        frames = [None] * len(self._frames)
+        for (func, filename, line), index in self._frames.items():
+            frames[index] = {"name": func, "file": filename, "line": line}
+        profiles = []
+        for (ident, thread_name), samples in self._threads():
+            total = sum(samples.values())
+            profiles.append({
+                "type": "sampled",
+                "name": "request" if ident == self.thread_id else thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [list(stack) for stack in samples],
+                "weights": list(samples.values()),
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "extracteur_de_factures",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def to_collapsed(self):
+        """
+        Collapsed stacks (flamegraph.pl / inferno input), one line per stack
+        with its time in microseconds, threads as the root frame.
+        """
+        names = [None] * len(self._frames)
+        for (func, filename, line), index in self._frames.items():
+            names[index] = f"{func} ({os.path.basename(filename)}:{line})".replace(";", ":")
+        lines = []
+        for (ident, thread_name), samples in self._threads():
+            root = "request" if ident == self.thread_id else thread_name
+            for stack, seconds in samples.items():
+                lines.append(f"{';'.join([root] + [names[i] for i in stack])} {round(seconds * 1e6)}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path, name, fmt="speedscope"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            if fmt == "collapsed":
+                f.write(self.to_collapsed())
+            else:
+                json.dump(self.to_speedscope(name), f)
+        os.replace(tmp_path, path)
+
+
+def prune_profiles(directory=PROFILE_DIR, keep=PROFILE_KEEP):
+    """Delete the oldest profiles beyond `keep`."""
+    try:
+        entries = [os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.endswith(tuple(PROFILE_FORMATS.values()))]
+        entries.sort(key=os.path.getmtime)
+    except OSError:
+        return
+    for path in entries[:-keep] if keep else entries:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
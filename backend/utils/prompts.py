@@ -1,117 +1,125 @@
-def build_llm_prompt(ocr_tokens):
+import json
+
+HEADER_FIELDS = [
+    "supplier_name", "supplier_address", "customer_name", "customer_address",
+    "invoice_number", "invoice_date", "due_date", "invoice_subtotal",
+    "tax_amount", "tax_rate", "invoice_total"
+]
+
+ITEM_FIELDS = ["description", "quantity", "unit_price", "total_price"]
+
+def build_extraction_schema(fields=HEADER_FIELDS, include_items=True):
     """
-    Build a prompt for LLM-based invoice extraction that returns standardized format.
+    JSON schema of the compact model output: one flat string per header field
+    plus (optionally) a list of line items. Passed to Ollama's `format` to
+    constrain decoding.
     """
-    prompt = f"""You are an expert invoice data extraction system. Extract information from the following OCR text and return it in a specific JSON format.
+    properties = {field: {"type": "string"} for field in fields}
+    required = list(fields)
+    if include_items:
+        properties["items"] = {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in ITEM_FIELDS},
+                "required": ITEM_FIELDS
+            }
+        }
+        required.append("items")
+    return {"type": "object", "properties": properties, "required": required}
 
-OCR Text:
-{ocr_tokens}
 
-Please extract the following fields and return them in this exact JSON format:
-
-{{
-    "extracted_fields": {{
-        "supplier_name": {{
-            "candidates": [
-                {{"confidence": 0.95, "value": "Company Name"}}
-            ],
-            "selected": "Company Name"
-        }},
-        "supplier_address": {{
-            "candidates": [
-                {{"confidence": 0.92, "value": "Company Address"}}
-            ],
-            "selected": "Company Address"
-        }},
-        "customer_name": {{
-            "candidates": [
-                {{"confidence": 0.88, "value": "Customer Name"}}
-            ],
-            "selected": "Customer Name"
-        }},
-        "customer_address": {{
-            "candidates": [
-                {{"confidence": 0.90, "value": "Customer Address"}}
-            ],
-            "selected": "Customer Address"
-        }},
-        "invoice_number": {{
-            "candidates": [
-                {{"confidence": 0.95, "value": "INV-2024-001"}}
-            ],
-            "selected": "INV-2024-001"
-        }},
-        "invoice_date": {{
-            "candidates": [
-                {{"confidence": 0.92, "value": "15/01/2024"}}
-            ],
-            "selected": "15/01/2024"
-        }},
-        "due_date": {{
-            "candidates": [
-                {{"confidence": 0.89, "value": "15/02/2024"}}
-            ],
-            "selected": "15/02/2024"
-        }},
-        "invoice_subtotal": {{
-            "candidates": [
-                {{"confidence": 0.94, "value": "150.00"}}
-            ],
-            "selected": "150.00"
-        }},
-        "tax_amount": {{
-            "candidates": [
-                {{"confidence": 0.91, "value": "15.00"}}
-            ],
-            "selected": "15.00"
-        }},
-        "tax_rate": {{
-            "candidates": [
-                {{"confidence": 0.93, "value": "10%"}}
-            ],
-            "selected": "10%"
-        }},
-        "invoice_total": {{
-            "candidates": [
-                {{"confidence": 0.96, "value": "165.00"}}
-            ],
-            "selected": "165.00"
-        }},
-        "items": {{
-            "candidates": [
-                {{
-                    "confidence": 0.90,
-                    "value": {{
-                        "description": "Item Description",
-                        "quantity": "1",
-                        "unit_price": "150.00",
-                        "total_price": "150.00"
-                    }}
-                }}
-            ],
-            "selected": [
-                {{
-                    "description": "Item Description",
-                    "quantity": "1",
-                    "unit_price": "150.00", 
-                    "total_price": "150.00"
-                }}
-            ]
-        }}
-    }}
-}}
+EXTRACTION_SCHEMA = build_extraction_schema()
+
+
+# Static instructions sent ahead of every invoice. Keeping them identical
+# and first lets Ollama reuse the cached prefix (KV cache) and lets hosted
+# providers apply prompt caching; only the OCR text after it varies.
+EXTRACTION_SYSTEM_PROMPT = """You are an expert invoice data extraction system. Extract information from the OCR text of an invoice and return it as a single flat JSON object.
+
+Return exactly this JSON structure:
+
+{
+    "supplier_name": "Company Name",
+    "supplier_address": "Company Address",
+    "customer_name": "Customer Name",
+    "customer_address": "Customer Address",
+    "invoice_number": "INV-2024-001",
+    "invoice_date": "15/01/2024",
+    "due_date": "15/02/2024",
+    "invoice_subtotal": "150.00",
+    "tax_amount": "15.00",
+    "tax_rate": "10%",
+    "invoice_total": "165.00",
+    "items": [
+        {"description": "Item Description", "quantity": "1", "unit_price": "150.00", "total_price": "150.00"}
+    ]
+}
 
 IMPORTANT RULES:
 1. Return ONLY valid JSON - no explanations or extra text
-2. Use realistic confidence scores between 0.8-0.96
-3. For each field, provide 1-3 candidates with different confidence scores
-4. The "selected" value should be the candidate with highest confidence
-5. If a field is not found, use empty candidates array and empty selected value
-6. For items, extract all line items found in the invoice
-7. Use proper date formats (DD/MM/YYYY or MM/DD/YYYY)
-8. Use proper currency formats (numbers with decimal points)
-9. Invoice numbers should be alphanumeric or # followed by numbers
-10. Names should be actual person/company names, not header words like "DATE", "LOGO", "FROM", etc.
+2. If a field is not found, use an empty string
+3. For items, extract all line items found in the invoice (empty list if none)
+4. Use proper date formats (DD/MM/YYYY or MM/DD/YYYY)
+5. Use proper currency formats (numbers with decimal points)
+6. Invoice numbers should be alphanumeric or # followed by numbers
+7. Names should be actual person/company names, not header words like "DATE", "LOGO", "FROM", etc."""
+
+# Static instructions for targeted prompts (subset of fields, see the cascade)
+TARGETED_SYSTEM_PROMPT = """You are an expert invoice data extraction system. You receive part of the OCR text of an invoice and the list of keys to extract.
+
+Return ONLY a flat JSON object with exactly the requested keys. Use an empty string for any field that is not present and an empty list if there are no line items. Dates as DD/MM/YYYY or MM/DD/YYYY, amounts as numbers with decimal points."""
+
+
+def build_llm_prompt(ocr_tokens):
+    """
+    Build the per-invoice part of the extraction prompt. It is sent after
+    EXTRACTION_SYSTEM_PROMPT (as the system message / Ollama system field);
+    the model answers with a flat JSON object whose candidates/selected
+    structure is rebuilt server-side (see backend.utils.llm_output).
+    """
+    prompt = f"""OCR Text:
+{ocr_tokens}
+
+Extract the data now:"""
+
+    return prompt
+
+
+def build_targeted_prompt(ocr_lines, fields, include_items=False):
+    """
+    Build the per-invoice part of a prompt asking only for the given fields
+    (and optionally the line items) from a subset of the OCR text. Sent
+    after TARGETED_SYSTEM_PROMPT; used by the cascade to fill fields
+    LayoutLMv3 was not confident about.
+    """
+    example = {field: "" for field in fields}
+    if include_items:
+        example["items"] = [{field: "" for field in ITEM_FIELDS}]
+    ocr_text = "\n".join(ocr_lines)
+
+    prompt = f"""Keys to extract:
+{json.dumps(example)}
+
+OCR Text:
+{ocr_text}
+
+Extract the data now:"""
+
+    return prompt
+
+
+def build_chunk_prompt(ocr_lines, index, count):
+    """
+    Build the per-invoice part of the extraction prompt for one chunk of a
+    long document (sent after EXTRACTION_SYSTEM_PROMPT like build_llm_prompt).
+    Fields that are not in this part of the text come back empty and are
+    filled from the other chunks when the results are merged.
+    """
+    ocr_text = "\n".join(ocr_lines)
+
+    prompt = f"""OCR Text (part {index + 1} of {count} of the invoice):
+{ocr_text}
 
 Extract the data now:"""
 
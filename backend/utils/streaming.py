@@ -0,0 +1,194 @@
+import json
+from backend.utils.llm_output import expand_field, parse_llm_json
+
+
+class IncrementalFieldParser:
+    """
+    Incrementally parse a JSON object streamed by an LLM and report each
+    member of the target object as soon as its value is complete.
+
+    With root_key="extracted_fields" the members of
+    {"extracted_fields": {...}} are reported; with root_key=None the members
+    of the top-level object are reported. Any text before the first '{'
+    (explanations, markdown fences) is ignored.
+    """
+
+    def __init__(self, root_key="extracted_fields"):
+        self.root_key = root_key
+        self.target_depth = 1 if root_key is None else 2
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._stack = []
+        self._keys = {}
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._string_end = None
+        self._in_target = False
+        self._pending_key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        """
+        Append a chunk of model output and return the list of (key, value)
+        pairs completed by it.
+        """
+        completed = []
+        if not chunk:
+            return completed
+        self.buffer += chunk
+        buf = self.buffer
+
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+
+            if not self._started:
+                if c != '{':
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_end = i + 1
+                continue
+
+            depth = len(self._stack)
+            at_target = self._in_target and depth == self.target_depth
+
+            if c == '"':
+                if at_target and self._pending_key is not None and self._value_start is None:
+                    self._value_start = i
+                self._in_string = True
+                self._string_start = i
+            elif c in '{[':
+                if at_target and self._pending_key is not None and self._value_start is None:
+                    self._value_start = i
+                self._stack.append(c)
+                new_depth = len(self._stack)
+                if c == '{' and not self._in_target:
+                    if self.root_key is None and new_depth == 1:
+                        self._in_target = True
+                    elif (self.root_key is not None and new_depth == 2
+                          and self._stack[0] == '{' and self._keys.get(1) == self.root_key):
+                        self._in_target = True
+            elif c in '}]':
+                if at_target and c == '}':
+                    # Closing the target object: flush a trailing scalar value
+                    self._emit(buf[self._value_start:i] if self._value_start is not None else None, completed)
+                    self._in_target = False
+                if self._stack:
+                    self._stack.pop()
+                self._keys.pop(depth, None)
+                if (self._in_target and len(self._stack) == self.target_depth
+                        and self._pending_key is not None and self._value_start is not None):
+                    self._emit(buf[self._value_start:i + 1], completed)
+            elif c == ':':
+                if self._stack and self._stack[-1] == '{' and self._string_start is not None:
+                    try:
+                        key = json.loads(buf[self._string_start:self._string_end])
+                    except json.JSONDecodeError:
+                        key = None
+                    self._keys[depth] = key
+                    if at_target:
+                        self._pending_key = key
+                        self._value_start = None
+            elif c == ',':
+                if at_target and self._pending_key is not None and self._value_start is not None:
+                    self._emit(buf[self._value_start:i], completed)
+            elif not c.isspace():
+                if at_target and self._pending_key is not None and self._value_start is None:
+                    self._value_start = i
+
+        self._pos = len(buf)
+        return completed
+
+    def _emit(self, text, completed):
+        key = self._pending_key
+        self._pending_key = None
+        self._value_start = None
+        if key is None or text is None:
+            return
+        try:
+            completed.append((key, json.loads(text.strip())))
+        except json.JSONDecodeError:
+            print(f"Skipping unparseable streamed value for field {key}")
+
+
+def format_sse(event, data):
+    """
+    Format a server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def wants_event_stream(req):
+    """
+    Whether the client asked for a server-sent event stream, either with
+    ?stream=1 / a 'stream' form field or an Accept: text/event-stream header.
+    """
+    flag = req.args.get('stream') or req.form.get('stream')
+    if flag and flag.lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in req.headers.get('Accept', '')
+
+
+def stream_extraction_events(chunks, empty_result, root_key=None, on_complete=None, done_fields=None):
+    """
+    Turn an iterator of LLM text chunks into server-sent events.
+
+    Emits one 'field' event per extracted field as soon as its JSON value
+    closes (expanded to the candidates/selected structure), then a final 'done' event carrying the complete extracted_fields
+    (missing fields filled from empty_result). Errors are reported as an
+    'error' event followed by 'done' with whatever was recovered.
+    Once complete the whole text must parse as a JSON object (streams are
+    not in JSON mode); otherwise an 'error' event is sent as well.
+    on_complete(result) is called after a stream that finished without error.
+    done_fields are added to the 'done' event (e.g. the staging id).
+    """
+    parser = IncrementalFieldParser(root_key=root_key)
+    fields = {}
+    text = []
+    failed = False
+    try:
+        for chunk in chunks:
+            text.append(chunk)
+            for key, value in parser.feed(chunk):
+                if key not in empty_result:
+                    continue
+                value = expand_field(key, value)
+                fields[key] = value
+                yield format_sse('field', {'field': key, 'value': value})
+    except Exception as e:
+        print(f"Error while streaming LLM response: {str(e)}")
+        failed = True
+        yield format_sse('error', {'error': str(e)})
+    else:
+        try:
+            parse_llm_json("".join(text))
+        except ValueError as e:
+            print(f"Rejecting streamed LLM response: {str(e)}")
+            failed = True
+            yield format_sse('error', {'error': str(e)})
+
+    result = dict(empty_result)
+    result.update(fields)
+    if on_complete is not None and not failed:
+        on_complete(result)
+    yield format_sse('done', {'method': 'llm', 'extracted_fields': result, **(done_fields or {})})
+
+
+def replay_extraction_events(extracted_fields, cached=True, done_fields=None):
+    """
+    Emit an already available result (e.g. a cache hit) with the same event
+    sequence as stream_extraction_events.
+    """
+    for key, value in extracted_fields.items():
+        yield format_sse('field', {'field': key, 'value': value})
+    yield format_sse('done', {'method': 'llm', 'extracted_fields': extracted_fields, 'cached': cached,
+                              **(done_fields or {})})
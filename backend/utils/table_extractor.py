@@ -0,0 +1,289 @@
+import re
+import statistics
+import unicodedata
+
+from backend.utils.prompts import ITEM_FIELDS
+
+# Confidence attached to line items read from the table geometry
+TABLE_CONFIDENCE = 0.85
+
+# Header words (normalized: lowercase, no accents, punctuation as spaces)
+# naming each item column, French and English. Longer phrases win.
+COLUMN_KEYWORDS = {
+    "description": ["designation", "description", "libelle", "article", "produit", "product",
+                    "items", "item", "prestation", "details"],
+    "quantity": ["quantite", "quantity", "qte", "qty", "nbre", "hours", "hrs"],
+    "unit_price": ["prix unitaire", "prix unit", "unit price", "unit cost", "p u", "pu", "prix",
+                   "price", "rate", "tarif"],
+    "total_price": ["prix total", "line total", "montant", "amount", "total"],
+    # Known columns that are not part of the item schema
+    "other": ["tva", "vat", "tax", "taux", "remise", "discount", "ref", "reference", "code", "unite", "um"],
+}
+NUMERIC_ROLES = ("quantity", "unit_price", "total_price")
+
+# Rows starting with these words close the table (totals block)
+STOP_PATTERN = re.compile(r"^(sous ?total|sub ?total|total|net a payer|amount due|balance|tva|tax|vat)")
+
+# Numbers with optional currency / unit around them: "R1320.00", "3150,00", "15.00%", "$701.72"
+NUMBER_PATTERN = re.compile(r"[^\w\s]?\s*[A-Za-z]{0,3}\s*[-+]?\d[\d\s.,']*%?\s*(?:[A-Za-z]{0,3}|[€$£])\.?")
+
+# Rows further below the previous one than this many line heights end the table
+MAX_ROW_GAP = 4.0
+# Steepest page skew (dy/dx) corrected from the header row
+MAX_SKEW = 0.1
+
+_KEYWORDS = sorted(
+    ((kw, role) for role, kws in COLUMN_KEYWORDS.items() for kw in kws),
+    key=lambda pair: len(pair[0]), reverse=True
+)
+
+
+def normalize_text(text):
+    """Lowercase, strip accents and replace punctuation by spaces."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9%]+", " ", text).split())
+
+
+def is_number(text):
+    return bool(NUMBER_PATTERN.fullmatch((text or "").strip()))
+
+
+def _header_cells(token):
+    """
+    Column roles named in one OCR box, with the x-range of each. A box may
+    hold several headers ("Description Qty Price"); their x-ranges are
+    interpolated from the character positions.
+    """
+    text = normalize_text(token["text"])
+    x0, _, x1, _ = token["bbox"]
+    taken, cells = [], []
+    for keyword, role in _KEYWORDS:
+        for match in re.finditer(r"(?<![a-z0-9])" + re.escape(keyword) + r"(?![a-z0-9])", text):
+            start, end = match.span()
+            if any(start < t_end and end > t_start for t_start, t_end in taken):
+                continue
+            taken.append((start, end))
+            scale = (x1 - x0) / max(len(text), 1)
+            cells.append((role, x0 + start * scale, x0 + end * scale))
+    return sorted(cells, key=lambda cell: cell[1])
+
+
+def _center(token):
+    x0, y0, x1, y1 = token["bbox"]
+    return (x0 + x1) / 2, (y0 + y1) / 2
+
+
+def _find_header(tokens, line_height):
+    """
+    Return the keyword boxes of the header row: the topmost group of boxes on
+    one line naming at least two item columns, one of them numeric.
+    """
+    keyword_tokens = [t for t in tokens if any(role != "other" for role, _, _ in _header_cells(t))]
+    best = None
+    for seed in sorted(keyword_tokens, key=lambda t: _center(t)[1]):
+        seed_y = _center(seed)[1]
+        group = [t for t in keyword_tokens if abs(_center(t)[1] - seed_y) <= 1.5 * line_height]
+        roles = {role for t in group for role, _, _ in _header_cells(t)} - {"other"}
+        if len(roles) >= 2 and roles & set(NUMERIC_ROLES):
+            if best is None or len(roles) > best[0]:
+                best = (len(roles), group)
+            if len(roles) == 4:
+                break
+    return best[1] if best else None
+
+
+def _estimate_skew(header_tokens):
+    """Slope of the header row's box centers (least squares), clamped."""
+    points = [_center(t) for t in header_tokens]
+    if len(points) < 2:
+        return 0.0
+    mean_x = statistics.mean(x for x, _ in points)
+    mean_y = statistics.mean(y for _, y in points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return max(-MAX_SKEW, min(MAX_SKEW, slope))
+
+
+def _group_rows(tokens, line_height, skew):
+    """
+    Group boxes into rows by their deskewed vertical center. Returns rows as
+    dicts with the tokens (left to right) and the deskewed top/bottom.
+    """
+    def deskew(token):
+        x, _ = _center(token)
+        offset = skew * x
+        return token["bbox"][1] - offset, token["bbox"][3] - offset
+
+    rows = []
+    for token in sorted(tokens, key=lambda t: sum(deskew(t)) / 2):
+        top, bottom = deskew(token)
+        middle = (top + bottom) / 2
+        if rows and abs(middle - rows[-1]["middle"]) <= 0.5 * line_height:
+            row = rows[-1]
+            row["tokens"].append(token)
+            row["top"], row["bottom"] = min(row["top"], top), max(row["bottom"], bottom)
+            row["middle"] = statistics.mean((r["bbox"][1] + r["bbox"][3]) / 2 - skew * _center(r)[0]
+                                            for r in row["tokens"])
+        else:
+            rows.append({"tokens": [token], "top": top, "bottom": bottom, "middle": middle})
+    for row in rows:
+        row["tokens"].sort(key=lambda t: t["bbox"][0])
+    return rows
+
+
+def _column_anchors(header_rows):
+    """
+    Column anchors (role, x0, x1) from the header row. Boxes that name no
+    known column become "other" so values below them are ignored. For a
+    repeated role the leftmost (rightmost for total_price) is kept.
+    """
+    anchors = []
+    for row in header_rows:
+        for token in row["tokens"]:
+            cells = _header_cells(token)
+            if not cells:
+                cells = [("other", token["bbox"][0], token["bbox"][2])]
+            anchors.extend(cells)
+    anchors.sort(key=lambda a: a[1])
+
+    kept = {}
+    for index, (role, _, _) in enumerate(anchors):
+        if role == "other":
+            continue
+        if role not in kept or role == "total_price":
+            kept[role] = index
+    return [(role if kept.get(role) == i else "other", x0, x1) for i, (role, x0, x1) in enumerate(anchors)]
+
+
+def _overlap(a0, a1, b0, b1):
+    return max(0.0, min(a1, b1) - max(a0, b0))
+
+
+def _match_anchor(x0, x1, anchors):
+    """The anchor overlapping [x0, x1] most, else the one with the nearest center."""
+    best = max(anchors, key=lambda a: _overlap(x0, x1, a[1], a[2]))
+    if _overlap(x0, x1, best[1], best[2]) > 0:
+        return best[0]
+    center = (x0 + x1) / 2
+    return min(anchors, key=lambda a: abs((a[1] + a[2]) / 2 - center))[0]
+
+
+def _numeric_columns(rows, anchors):
+    """
+    Cluster the numeric boxes of the table into columns by x-overlap and map
+    each column to a header anchor. Returns the (x0, x1, role) columns.
+    """
+    spans = sorted(
+        (t["bbox"][0], t["bbox"][2]) for row in rows for t in row["tokens"] if is_number(t["text"])
+    )
+    clusters = []
+    for x0, x1 in spans:
+        if clusters and x0 <= clusters[-1][1]:
+            clusters[-1][1] = max(clusters[-1][1], x1)
+        else:
+            clusters.append([x0, x1])
+    return [(x0, x1, _match_anchor(x0, x1, anchors)) for x0, x1 in clusters]
+
+
+def _row_cells(row, anchors, numeric_columns):
+    """Text of each item column in one row."""
+    cells = {}
+    for token in row["tokens"]:
+        x0, _, x1, _ = token["bbox"]
+        if is_number(token["text"]):
+            column = next((c for c in numeric_columns if c[0] <= x0 and x1 <= c[1]), None)
+            role = column[2] if column else _match_anchor(x0, x1, anchors)
+        else:
+            # Text belongs to the description unless it sits under another column
+            role = "description"
+            best = max(anchors, key=lambda a: _overlap(x0, x1, a[1], a[2]))
+            if _overlap(x0, x1, best[1], best[2]) > 0 and best[0] != "description":
+                desc = [a for a in anchors if a[0] == "description"]
+                if not desc or _overlap(x0, x1, desc[0][1], desc[0][2]) == 0:
+                    role = best[0]
+        if role != "other":
+            cells.setdefault(role, []).append(token["text"].strip())
+    return {role: " ".join(parts) for role, parts in cells.items()}
+
+
+def extract_line_items(ocr_tokens):
+    """
+    Read the line items of an invoice from the geometry of its OCR boxes
+    (run_paddle_ocr output): find the header row (DESIGNATION / QTE /
+    PRIX UNIT / MONTANT or English equivalents), group the boxes below it
+    into rows by y and into columns by x, and stop at the totals block.
+
+    Returns a list of {description, quantity, unit_price, total_price}
+    dicts, empty if no item table was recognized.
+    """
+    tokens = [t for t in ocr_tokens or [] if (t.get("text") or "").strip()]
+    if not tokens:
+        return []
+    line_height = statistics.median(t["bbox"][3] - t["bbox"][1] for t in tokens) or 1
+
+    header = _find_header(tokens, line_height)
+    if not header:
+        return []
+    skew = _estimate_skew(header)
+    rows = _group_rows(tokens, line_height, skew)
+    header_ids = {id(t) for t in header}
+    header_index = max(i for i, row in enumerate(rows) if any(id(t) in header_ids for t in row["tokens"]))
+    anchors = _column_anchors([row for row in rows[:header_index + 1]
+                               if any(id(t) in header_ids for t in row["tokens"])])
+
+    # Candidate table rows: everything below the header up to a large gap
+    body = []
+    previous = rows[header_index]
+    for row in rows[header_index + 1:]:
+        if row["top"] - previous["bottom"] > MAX_ROW_GAP * line_height:
+            break
+        body.append(row)
+        previous = row
+    # Totals below the table can bridge two numeric columns, so the columns
+    # are clustered again on the rows above the totals block
+    items, end = _read_rows(body, anchors, _numeric_columns(body, anchors), line_height)
+    if end < len(body):
+        items, _ = _read_rows(body[:end], anchors, _numeric_columns(body[:end], anchors), line_height)
+    return items
+
+
+def _read_rows(body, anchors, numeric_columns, line_height):
+    """
+    Turn table rows into items until the totals block. Returns the items and
+    the index of the row that ended the table (len(body) if none did).
+    """
+    items = []
+    previous = None
+    for index, row in enumerate(body):
+        cells = _row_cells(row, anchors, numeric_columns)
+        labels = [normalize_text(t["text"]) for t in row["tokens"] if not is_number(t["text"])]
+        numbers = [role for role in NUMERIC_ROLES if re.search(r"\d", cells.get(role, ""))]
+        if "quantity" not in numbers and any(STOP_PATTERN.match(label) for label in labels):
+            return items, index
+        if numbers == ["total_price"] and not cells.get("description"):
+            # A lone amount under the total column is the table total
+            return items, index
+
+        if numbers and (cells.get("description") or "quantity" in numbers):
+            items.append({field: cells.get(field, "") for field in ITEM_FIELDS})
+            previous = row
+        elif cells.get("description") and not numbers and items and row["top"] - previous["bottom"] < line_height:
+            # Wrapped description line of the item above
+            items[-1]["description"] = f"{items[-1]['description']} {cells['description']}".strip()
+            previous = row
+    return items, len(body)
+
+
+def line_items_field(ocr_tokens):
+    """
+    Line items in the {"candidates", "selected"} structure used for every
+    extracted field.
+    """
+    items = extract_line_items(ocr_tokens)
+    return {
+        "candidates": [{"confidence": TABLE_CONFIDENCE, "value": item} for item in items],
+        "selected": items
+    }
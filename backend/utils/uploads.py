@@ -0,0 +1,189 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from PIL import Image
+
+from backend.utils.metrics import stage
+
+# Uploads up to this size stay in memory, larger ones are spooled to disk
+UPLOAD_MEMORY_LIMIT = int(os.getenv("UPLOAD_MEMORY_LIMIT", str(8 * 1024 * 1024)))
+# Largest single document accepted
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+# Largest request body (batch uploads included), set as MAX_CONTENT_LENGTH;
+# Werkzeug enforces it while the body is read, before it is buffered
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Magic bytes of the accepted document types -> (type, file extension)
+SIGNATURES = [
+    (b"%PDF-", ("pdf", ".pdf")),
+    (b"\x89PNG\r\n\x1a\n", ("png", ".png")),
+    (b"\xff\xd8\xff", ("jpeg", ".jpg")),
+    (b"II*\x00", ("tiff", ".tif")),
+    (b"MM\x00*", ("tiff", ".tif")),
+    (b"BM", ("bmp", ".bmp")),
+]
+
+
+class UploadError(ValueError):
+    """Rejected upload; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CappedSpooledFile(tempfile.SpooledTemporaryFile):
+    """SpooledTemporaryFile refusing to grow past max_bytes (RequestEntityTooLarge)."""
+
+    def __init__(self, max_bytes, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            raise RequestEntityTooLarge(f"File larger than {self.max_bytes} bytes")
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """
+    Request class whose multipart file parts are buffered in memory up to
+    UPLOAD_MEMORY_LIMIT and only spooled to disk above it (Werkzeug's
+    default spools anything over 500 KB).
+
+    Each file part is capped at upload_max_bytes while it is parsed, so an
+    oversized document is refused before it is spooled. Views accepting
+    archives (batch) raise it for the request before reading its files.
+    """
+
+    upload_max_bytes = UPLOAD_MAX_BYTES
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return CappedSpooledFile(self.upload_max_bytes, max_size=UPLOAD_MEMORY_LIMIT, mode="rb+")
+
+
+def sniff_type(head):
+    """Return (type, extension) from a file's first bytes, or (None, None)."""
+    for magic, kind in SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", ".webp"
+    return None, None
+
+
+class Upload:
+    """
+    An uploaded document held by its (memory or spooled) stream, with its
+    real type sniffed from the content rather than the file name.
+    """
+
+    def __init__(self, stream, filename, kind, ext, size):
+        self.stream = stream
+        self.filename = filename
+        self.kind = kind
+        self.ext = ext
+        self.size = size
+        self._image = None
+        self._sha256 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._image = None
+        try:
+            self.stream.close()
+        except Exception:
+            pass
+
+    def read(self):
+        """The whole document as bytes."""
+        self.stream.seek(0)
+        return self.stream.read()
+
+    def sha256(self):
+        """Hex SHA-256 of the document, telling identical submissions apart."""
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            self.stream.seek(0)
+            for block in iter(lambda: self.stream.read(1024 * 1024), b""):
+                digest.update(block)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def image(self):
+        """
+        The document decoded as an RGB PIL image (first page of a PDF),
+        decoded once and shared by every engine of the request.
+        """
+        if self._image is None:
+            with stage("decode"):
+                if self.kind == "pdf":
+                    from backend.utils.utils import pdf_bytes_to_image
+                    self._image = pdf_bytes_to_image(self.read())
+                else:
+                    self.stream.seek(0)
+                    with Image.open(self.stream) as img:
+                        img.seek(0)
+                        self._image = img.convert("RGB")
+        return self._image
+
+    def save(self, path):
+        """Write the document to path (for work that outlives the request)."""
+        self.stream.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.stream, f, 64 * 1024)
+        return path
+
+
+def read_upload(file_storage, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Validate an uploaded werkzeug FileStorage without copying it: check its
+    size against max_bytes and sniff its type from the magic bytes.
+    Raises UploadError for empty, oversized or unsupported files.
+    """
+    if file_storage is None or file_storage.filename == "":
+        raise UploadError("No file selected")
+    stream = file_storage.stream
+
+    try:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    except (AttributeError, OSError):
+        # Not seekable: buffer it, enforcing the limit while reading
+        buffer = tempfile.SpooledTemporaryFile(max_size=UPLOAD_MEMORY_LIMIT, mode="rb+")
+        size = 0
+        while True:
+            block = stream.read(64 * 1024)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                buffer.close()
+                raise UploadError(f"File larger than {max_bytes} bytes", 413)
+            buffer.write(block)
+        stream = buffer
+        stream.seek(0)
+
+    if size == 0:
+        raise UploadError("Uploaded file is empty")
+    if size > max_bytes:
+        raise UploadError(f"File larger than {max_bytes} bytes", 413)
+
+    kind, ext = sniff_type(stream.read(16))
+    stream.seek(0)
+    if kind is None:
+        raise UploadError("Unsupported file type (expected PDF, PNG, JPEG, TIFF, BMP or WebP)", 415)
+    return Upload(stream, file_storage.filename, kind, ext, size)
@@ -4,10 +4,12 @@ import numpy as np
 from PIL import Image
 from paddleocr import PaddleOCR
 import paddle
+from backend.utils.metrics import stage
+from backend.services.admission import engine_slot, AdmissionRejected
 
 # Try to import pdf2image, but handle the case where it's not available
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, convert_from_bytes
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
@@ -36,11 +38,30 @@ def pdf_to_image(pdf_path, dpi=200):
         print("Or download from: https://github.com/oschwartz10612/poppler-windows/releases/")
         raise ValueError(f"Failed to convert PDF to image: {str(e)}")
 
+def pdf_bytes_to_image(pdf_bytes, dpi=200):
+    """
+    Convert the first page of an in-memory PDF to a PIL image.
+    """
+    if not PDF2IMAGE_AVAILABLE:
+        raise ValueError("pdf2image is not available. Please install it with: pip install pdf2image")
+    try:
+        images = convert_from_bytes(pdf_bytes, dpi=dpi, first_page=1, last_page=1)
+        if not images:
+            raise ValueError("No pages found in PDF.")
+        return images[0]
+    except Exception as e:
+        print(f"Error converting PDF to image: {str(e)}")
+        raise ValueError(f"Failed to convert PDF to image: {str(e)}")
+
 def preprocess_image_for_ocr(img_path_or_pil, return_scale=False, binarize=True):
     """
     Preprocess the image for OCR: denoise, sharpen, enhance contrast, binarize (optional), and resize if necessary.
     Accepts a file path or a PIL.Image.Image.
     """
+    with stage("preprocess"):
+        return _preprocess_image_for_ocr(img_path_or_pil, return_scale, binarize)
+
+def _preprocess_image_for_ocr(img_path_or_pil, return_scale, binarize):
     if isinstance(img_path_or_pil, Image.Image):
         cv_img = cv2.cvtColor(np.array(img_path_or_pil), cv2.COLOR_RGB2BGR)
     else:
@@ -89,10 +110,11 @@ def preprocess_image_for_ocr(img_path_or_pil, return_scale=False, binarize=True)
 
 def run_paddle_ocr(file_path):
     """
-    Accepts an image or PDF file path.
+    Accepts an image or PDF file path, or an already decoded PIL image
+    (see backend.utils.uploads).
     Returns a list of dicts: [{"text": ..., "bbox": [...]}, ...]
     """
-    ext = os.path.splitext(file_path)[-1].lower()
+    ext = "" if isinstance(file_path, Image.Image) else os.path.splitext(file_path)[-1].lower()
     
     try:
         if ext == ".pdf":
@@ -111,7 +133,7 @@ def run_paddle_ocr(file_path):
             
             img = np.array(preprocessed_img.convert("RGB"))
         else:
-            # Process regular image file
+            # Process regular image file (or decoded upload)
             preprocessed_img = preprocess_image_for_ocr(file_path, return_scale=False, binarize=False)
             if preprocessed_img is None:
                 raise ValueError("Failed to preprocess image file")
@@ -119,7 +141,8 @@ def run_paddle_ocr(file_path):
             img = np.array(preprocessed_img.convert("RGB"))
         
         height, width = img.shape[:2]
-        result = ocr_engine.ocr(img, cls=True)
+        with engine_slot("ocr"), stage("ocr"):
+            result = ocr_engine.ocr(img, cls=True)
         
         if not result or not result[0]:
             return []
@@ -136,6 +159,8 @@ def run_paddle_ocr(file_path):
             ocr_output.append({"text": text, "bbox": bbox_rect})
         return ocr_output
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"Error processing file {file_path}: {str(e)}")
         return []
@@ -170,7 +195,8 @@ def ocr_tokens_and_bboxes(image, granularity="word"):
     else:
         raise ValueError("Input must be a file path or PIL.Image.Image")
     width, height = img.shape[1], img.shape[0]
-    result = ocr_engine.ocr(img, cls=True)
+    with stage("ocr"):
+        result = ocr_engine.ocr(img, cls=True)
     tokens = []
     # PaddleOCR returns [ [ [box, (text, conf)], ... ] ]
     for line in result[0]:
@@ -36,6 +36,9 @@ import {
 import { useAuth } from '../contexts/AuthContext';
 import api from '../services/api';
 
+// Invoices fetched per page (the dashboard loads more on demand)
+const INVOICE_PAGE_SIZE = 50;
+
 const Dashboard = () => {
   const [invoices, setInvoices] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -44,6 +47,8 @@ const Dashboard = () => {
   const [anchorEl, setAnchorEl] = useState(null);
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
   const [error, setError] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   const { user, loading: authLoading, logout } = useAuth();
   const navigate = useNavigate();
@@ -54,11 +59,20 @@ const Dashboard = () => {
     }
   }, [user]);
 
-  const fetchInvoices = async () => {
+  const fetchInvoices = async (cursor = null) => {
     try {
-      setLoading(true);
-      const response = await api.get('/invoice/invoices');
-      setInvoices(response.data.invoices || []); // Handle the nested structure
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
+      // Only the fields the cards show, one page at a time
+      const response = await api.get('/invoice/invoices', {
+        params: { fields: 'summary', limit: INVOICE_PAGE_SIZE, ...(cursor && { cursor }) },
+      });
+      const page = response.data.invoices || []; // Handle the nested structure
+      setInvoices(cursor ? (previous) => [...previous, ...page] : page);
+      setNextCursor(response.data.next_cursor || null);
       setError(''); // Clear any previous errors
     } catch (error) {
       console.error('Error fetching invoices:', error);
@@ -67,10 +81,15 @@ const Dashboard = () => {
         navigate('/login');
         return;
       }
+      if (cursor) {
+        setError('Failed to load more invoices');
+        return;
+      }
       setInvoices([]); // Set empty array on error
       setError(''); // Clear error - no invoices is normal
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -255,7 +274,7 @@ const Dashboard = () => {
                     <CardMedia
                       component="img"
                       height="140"
-                      image={`http://localhost:5000/api/invoice/invoices/${invoice.id}/image`}
+                      image={`http://localhost:5000/api/invoice/invoices/${invoice.id}/image?size=thumb${invoice.image_hash ? `&v=${invoice.image_hash}` : ''}`}
                       alt="Invoice"
                       sx={{ objectFit: 'cover', flexShrink: 0 }}
                       onError={(e) => {
@@ -317,6 +336,19 @@ const Dashboard = () => {
         </Grid>
       )}
 
+      {nextCursor && (
+        <Box display="flex" justifyContent="center" mt={3}>
+          <Button
+            variant="outlined"
+            onClick={() => fetchInvoices(nextCursor)}
+            disabled={loadingMore}
+            startIcon={loadingMore ? <CircularProgress size={16} /> : null}
+          >
+            Load more
+          </Button>
+        </Box>
+      )}
+
       {/* Action Menu */}
       <Menu
         anchorEl={anchorEl}
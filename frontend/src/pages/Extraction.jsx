@@ -12,6 +12,8 @@ import {
   RadioGroup,
   FormControlLabel,
   Radio,
+  Checkbox,
+  FormGroup,
   Alert,
   CircularProgress,
   Card,
@@ -28,6 +30,7 @@ import api from '../services/api';
 const Extraction = () => {
   const [files, setFiles] = useState([]);
   const [method, setMethod] = useState('layoutlmv3');
+  const [compareEngines, setCompareEngines] = useState(['layoutlmv3', 'groq', 'ollama']);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const navigate = useNavigate();
@@ -58,12 +61,27 @@ const Extraction = () => {
     try {
       const formData = new FormData();
       formData.append('file', files[0]);
+      if (method === 'cascade') {
+        formData.append('method', 'cascade');
+        formData.append('llm_backend', 'groq');
+      }
+      if (method === 'compare') {
+        if (compareEngines.length === 0) {
+          setError('Please select at least one engine to compare');
+          setLoading(false);
+          return;
+        }
+        formData.append('method', 'compare');
+        formData.append('engines', compareEngines.join(','));
+      }
 
       // Map methods to dedicated backend endpoints
       const endpointMap = {
         layoutlmv3: '/layoutlmv3/extract_layoutlmv3',
         groq: '/groq/extract_llm_groq',
         ollama: '/ollama/extract_llm_ollama',
+        cascade: '/extraction/extract',
+        compare: '/extraction/extract',
       };
 
       const endpoint = endpointMap[method];
@@ -94,6 +112,12 @@ const Extraction = () => {
     }
   };
 
+  const toggleCompareEngine = (engine) => {
+    setCompareEngines((prev) =>
+      prev.includes(engine) ? prev.filter((e) => e !== engine) : [...prev, engine]
+    );
+  };
+
   const removeFile = (index) => {
     setFiles(files.filter((_, i) => i !== index));
   };
@@ -201,6 +225,18 @@ const Extraction = () => {
                     </Box>
                   }
                 />
+                <FormControlLabel
+                  value="cascade"
+                  control={<Radio />}
+                  label={
+                    <Box>
+                      <Typography variant="body1">Cascade (LayoutLMv3 + Groq)</Typography>
+                      <Typography variant="caption" color="text.secondary">
+                        LayoutLMv3 first, LLM only for uncertain fields and line items
+                      </Typography>
+                    </Box>
+                  }
+                />
                 <FormControlLabel
                   value="ollama"
                   control={<Radio />}
@@ -213,7 +249,41 @@ const Extraction = () => {
                     </Box>
                   }
                 />
+                <FormControlLabel
+                  value="compare"
+                  control={<Radio />}
+                  label={
+                    <Box>
+                      <Typography variant="body1">Compare engines</Typography>
+                      <Typography variant="caption" color="text.secondary">
+                        One OCR pass, selected engines run side by side with their latency
+                      </Typography>
+                    </Box>
+                  }
+                />
               </RadioGroup>
+              {method === 'compare' && (
+                <FormGroup row sx={{ ml: 4 }}>
+                  {[
+                    ['layoutlmv3', 'LayoutLMv3'],
+                    ['groq', 'Groq'],
+                    ['ollama', 'Ollama'],
+                    ['cascade', 'Cascade'],
+                  ].map(([engine, label]) => (
+                    <FormControlLabel
+                      key={engine}
+                      control={
+                        <Checkbox
+                          size="small"
+                          checked={compareEngines.includes(engine)}
+                          onChange={() => toggleCompareEngine(engine)}
+                        />
+                      }
+                      label={label}
+                    />
+                  ))}
+                </FormGroup>
+              )}
             </FormControl>
           </Paper>
         </Grid>
@@ -435,7 +435,7 @@ const InvoiceDetail = () => {
               {invoice?.image_exists ? (
                 <Box>
                   <img
-                    src={`http://localhost:5000/api/invoice/invoices/${id}/image`}
+                    src={`http://localhost:5000/api/invoice/invoices/${id}/image?size=${zoom > 1 ? 'full' : 'preview'}${invoice.image_hash ? `&v=${invoice.image_hash}` : ''}`}
                     alt="Invoice"
                     style={{ width: '100%', height: 'auto', transform: `scale(${zoom})`, transformOrigin: 'top left' }}
                     onError={(e) => { e.currentTarget.onerror = null; e.currentTarget.style.display = 'none'; }}
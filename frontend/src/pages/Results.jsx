@@ -46,6 +46,11 @@ const Results = () => {
   const [addItemDialog, setAddItemDialog] = useState(false);
   const [newItem, setNewItem] = useState({ description: '', quantity: '', unit_price: '', total_price: '' });
   const [zoom, setZoom] = useState(1);
+  // Per-engine results of a "compare" extraction, one of them being edited
+  const [comparison, setComparison] = useState(null);
+  const [engine, setEngine] = useState('');
+  // Upload kept on the server by the extraction, saved without re-uploading
+  const [stagingId, setStagingId] = useState(null);
 
   // Helper function to clean numeric values
   const cleanNumericValue = (value) => {
@@ -64,14 +69,33 @@ const Results = () => {
 
   useEffect(() => {
     if (location.state) {
-      setExtractedData(location.state.extractedData);
+      const data = location.state.extractedData;
       setFiles(location.state.files);
-      setMethod(location.state.method);
+      setStagingId(data?.staging_id || null);
+      if (data?.method === 'compare') {
+        setComparison(data);
+        const first = Object.keys(data.engines).find((name) => data.engines[name].status === 'ok');
+        if (first) {
+          selectEngine(data, first);
+        } else {
+          setError('None of the engines returned a result');
+          setExtractedData({ extracted_fields: {} });
+        }
+      } else {
+        setExtractedData(data);
+        setMethod(location.state.method);
+      }
     } else {
       navigate('/extract');
     }
   }, [location.state, navigate]);
 
+  const selectEngine = (data, name) => {
+    setEngine(name);
+    setMethod(name);
+    setExtractedData({ method: name, extracted_fields: data.engines[name].extracted_fields });
+  };
+
   const handleFieldChange = (fieldName, value) => {
     setExtractedData(prev => ({
       ...prev,
@@ -115,20 +139,38 @@ const Results = () => {
     setError('');
     setSuccess('');
     try {
-      if (!files || files.length === 0) {
-        setError('No file to save. Please go back and upload an invoice image.');
-        return;
-      }
-
-      const formData = new FormData();
-      formData.append('image', files[0]);
-      formData.append('extracted_fields', JSON.stringify(extractedData.extracted_fields));
-      formData.append('method', method || 'unknown');
-
-      await api.post('/invoice/invoices', formData, {
+      const buildForm = (useStaged) => {
+        const formData = new FormData();
+        if (useStaged) {
+          formData.append('staging_id', stagingId);
+        } else {
+          formData.append('image', files[0]);
+        }
+        formData.append('extracted_fields', JSON.stringify(extractedData.extracted_fields));
+        formData.append('method', method || 'unknown');
+        return formData;
+      };
+      const post = (formData) => api.post('/invoice/invoices', formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
       });
 
+      if (stagingId) {
+        try {
+          await post(buildForm(true));
+        } catch (err) {
+          // Staged upload gone (404 unknown or evicted, 410 expired): send the image after all
+          if (![404, 410].includes(err.response?.status) || !files?.length) throw err;
+          await post(buildForm(false));
+        }
+        setStagingId(null);
+      } else {
+        if (!files || files.length === 0) {
+          setError('No file to save. Please go back and upload an invoice image.');
+          return;
+        }
+        await post(buildForm(false));
+      }
+
       setSuccess('Invoice saved successfully!');
       setTimeout(() => navigate('/'), 1000);
     } catch (err) {
@@ -209,6 +251,38 @@ const Results = () => {
         </Box>
       </Box>
 
+      {error && (
+        <Alert severity="error" sx={{ mb: 2 }} onClose={() => setError('')}>
+          {error}
+        </Alert>
+      )}
+      {success && (
+        <Alert severity="success" sx={{ mb: 2 }}>
+          {success}
+        </Alert>
+      )}
+
+      {/* Engine comparison: pick the result to review and save */}
+      {comparison && (
+        <Paper sx={{ p: 2, mb: 3 }}>
+          <Box display="flex" alignItems="center" flexWrap="wrap" gap={1}>
+            <Typography variant="subtitle2" sx={{ mr: 1 }}>
+              OCR {comparison.ocr_latency.toFixed(2)}s, total {comparison.latency.toFixed(2)}s
+            </Typography>
+            {Object.entries(comparison.engines).map(([name, result]) => (
+              <Chip
+                key={name}
+                label={`${name} · ${result.status === 'ok' ? `${result.latency.toFixed(2)}s` : result.status}`}
+                color={result.status === 'ok' ? (name === engine ? 'primary' : 'default') : 'error'}
+                variant={name === engine ? 'filled' : 'outlined'}
+                title={result.error || ''}
+                onClick={result.status === 'ok' ? () => selectEngine(comparison, name) : undefined}
+              />
+            ))}
+          </Box>
+        </Paper>
+      )}
+
       {/* Side-by-side layout using flex to ensure columns */}
       <Box sx={{ display: 'flex', gap: 3, alignItems: 'flex-start' }}>
         {/* Left: Image */}
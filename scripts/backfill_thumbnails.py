@@ -0,0 +1,64 @@
+"""
+Compute the content hash and WebP thumbnails of invoices saved before
+thumbnails existed, so the dashboard never renders them on first view.
+
+Safe to re-run: invoices with a hash and all their thumbnails are skipped.
+
+Usage:
+    python scripts/backfill_thumbnails.py
+    python scripts/backfill_thumbnails.py --db path/to/invoices.db --force
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.api.routes.invoice_routes import resolve_image_path
+from backend.services.thumbnails import THUMBNAIL_WIDTHS, create_thumbnails, file_sha256, thumbnail_path
+from backend.utils.db import DB_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill invoice image hashes and thumbnails")
+    parser.add_argument("--db", default=DB_PATH, help="Path to the invoices database")
+    parser.add_argument("--force", action="store_true", help="Recompute hashes of invoices that have one")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(invoices)")]
+    if 'image_hash' not in cols:
+        # Database created before the column existed (the app adds it on start)
+        conn.execute("ALTER TABLE invoices ADD COLUMN image_hash TEXT")
+        conn.commit()
+    rows = conn.execute("SELECT id, image_path, image_hash FROM invoices").fetchall()
+
+    done = skipped = failed = 0
+    for invoice_id, image_path, image_hash in rows:
+        path = resolve_image_path(image_path)
+        if path is None:
+            # Placeholder rows (saved without an image) and deleted files
+            skipped += 1
+            continue
+        if image_hash and not args.force and all(
+                os.path.exists(thumbnail_path(image_hash, size)) for size in THUMBNAIL_WIDTHS):
+            skipped += 1
+            continue
+        try:
+            image_hash = create_thumbnails(path, file_sha256(path))
+        except Exception as e:
+            print(f"Invoice {invoice_id}: could not create thumbnails for {path}: {str(e)}")
+            failed += 1
+            continue
+        conn.execute("UPDATE invoices SET image_hash = ? WHERE id = ?", (image_hash, invoice_id))
+        conn.commit()
+        done += 1
+
+    conn.close()
+    print(f"Backfilled {done} invoices ({skipped} skipped, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
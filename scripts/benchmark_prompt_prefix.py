@@ -0,0 +1,107 @@
+"""
+Compare time-to-first-token (TTFT) of the old prompt layout (OCR text
+first, instructions after it, all in one prompt) with the static-prefix
+layout (fixed system instructions first, then the invoice OCR text).
+
+With the static prefix the backend can keep the instructions in its prompt
+cache (Ollama KV cache while the model is resident), so only the OCR text
+is evaluated per invoice.
+
+Usage:
+    python scripts/benchmark_prompt_prefix.py --backend ollama --samples 10
+    python scripts/ollama_stub_server.py --port 11434   # no GPU needed
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services.llm_client import get_llm_client
+from backend.services.ollama_manager import get_ollama_manager
+from backend.utils.prompts import EXTRACTION_SYSTEM_PROMPT, build_llm_prompt
+
+SAMPLES_FILE = "data/invoices-8/layoutlmv3_test.jsonl"
+
+
+def load_ocr_samples(path, limit):
+    """OCR text of the first `limit` invoices of a LayoutLMv3 jsonl file"""
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if len(samples) >= limit:
+                break
+            record = json.loads(line)
+            samples.append("\n".join(record["tokens"]))
+    return samples
+
+
+def legacy_prompt(ocr_text):
+    """Old layout: invoice content first, so no two prompts share a prefix"""
+    return f"OCR Text:\n{ocr_text}\n\n{EXTRACTION_SYSTEM_PROMPT}\n\nExtract the data now:"
+
+
+def time_to_first_token(client, prompt, **options):
+    start = time.monotonic()
+    stream = client.stream(prompt, **options)
+    try:
+        for chunk in stream:
+            if chunk:
+                return time.monotonic() - start
+    finally:
+        stream.close()
+    return time.monotonic() - start
+
+
+def run(backend, samples, repeats):
+    client = get_llm_client(backend)
+    options = {"max_tokens": 16} if backend == "groq" else {}
+    if backend == "ollama":
+        get_ollama_manager().preload()
+
+    layouts = {
+        "legacy": lambda text: (legacy_prompt(text), {}),
+        "static_prefix": lambda text: (build_llm_prompt(text), {"system": EXTRACTION_SYSTEM_PROMPT}),
+    }
+    results = {}
+    for name, build in layouts.items():
+        timings = []
+        for _ in range(repeats):
+            for text in samples:
+                prompt, extra = build(text)
+                if backend == "ollama":
+                    extra.update(get_ollama_manager().request_options(extra.get("system", "") + prompt))
+                timings.append(time_to_first_token(client, prompt, **options, **extra))
+        results[name] = timings
+        print(f"{name:>14}: mean {statistics.mean(timings) * 1000:.0f} ms, "
+              f"p50 {statistics.median(timings) * 1000:.0f} ms over {len(timings)} requests")
+
+    legacy = statistics.median(results["legacy"])
+    prefixed = statistics.median(results["static_prefix"])
+    if prefixed > 0:
+        print(f"p50 TTFT speedup: {legacy / prefixed:.2f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TTFT of the legacy vs static-prefix prompt layout")
+    parser.add_argument("--backend", choices=["ollama", "groq"], default="ollama")
+    parser.add_argument("--samples", type=int, default=10, help="number of invoices from the samples file")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--file", default=SAMPLES_FILE)
+    args = parser.parse_args()
+
+    samples = load_ocr_samples(args.file, args.samples)
+    if not samples:
+        print(f"No samples found in {args.file}")
+        return
+    print(f"Benchmarking {args.backend} on {len(samples)} invoices x {args.repeats}")
+    run(args.backend, samples, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
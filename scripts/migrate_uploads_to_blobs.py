@@ -0,0 +1,93 @@
+"""
+Move invoices saved as uploads/{user_id}_{timestamp}_{filename} into the
+content-addressed blob store (uploads/blobs/ab/cd/<sha256><ext>), merging
+duplicate files and counting references in the `blobs` table.
+
+Each invoice is moved in its own transaction, so the script can be stopped
+and re-run: invoices already in the store are skipped.
+
+Usage:
+    python scripts/migrate_uploads_to_blobs.py --dry-run
+    python scripts/migrate_uploads_to_blobs.py
+
+The database is the backend's (DB_PATH, invoices.db at the repo root by default).
+"""
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.api.routes.invoice_routes import init_invoice_db, resolve_image_path
+from backend.services.blob_store import get_blob_store
+from backend.services.thumbnails import file_sha256
+from backend.utils.db import get_connection, transaction
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move invoice uploads into the blob store")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be moved")
+    args = parser.parse_args()
+
+    # Creates the blobs table (and image_hash column) if the app never ran since
+    init_invoice_db()
+
+    blobs = get_blob_store()
+    conn = get_connection()
+    rows = conn.execute("SELECT id, image_path FROM invoices ORDER BY id").fetchall()
+
+    moved = duplicates = skipped = missing = 0
+    saved_bytes = 0
+    seen = set()
+    # Legacy path -> (hash, blob path), for invoices sharing one file
+    migrated = {}
+    for invoice_id, image_path in rows:
+        if image_path in migrated:
+            image_hash, blob_path = migrated[image_path]
+            with transaction(immediate=True):
+                conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE hash = ?", (image_hash,))
+                conn.execute("UPDATE invoices SET image_path = ?, image_hash = ? WHERE id = ?",
+                             (blob_path, image_hash, invoice_id))
+            duplicates += 1
+            continue
+        path = resolve_image_path(image_path)
+        if path is None:
+            # Placeholder rows (saved without an image) and deleted files
+            missing += 1
+            continue
+        if blobs.is_blob(path):
+            skipped += 1
+            continue
+
+        image_hash = file_sha256(path)
+        size = os.path.getsize(path)
+        known = image_hash in seen or conn.execute(
+            "SELECT 1 FROM blobs WHERE hash = ?", (image_hash,)).fetchone() is not None
+        seen.add(image_hash)
+        if known:
+            duplicates += 1
+            saved_bytes += size
+        else:
+            moved += 1
+        if args.dry_run:
+            print(f"Invoice {invoice_id}: {path} -> {image_hash}{' (duplicate)' if known else ''}")
+            continue
+
+        ext = os.path.splitext(path)[1]
+        try:
+            with transaction(immediate=True):
+                _, blob_path = blobs.add(conn, path, ext, image_hash)
+                conn.execute("UPDATE invoices SET image_path = ?, image_hash = ? WHERE id = ?",
+                             (blob_path, image_hash, invoice_id))
+            migrated[image_path] = (image_hash, blob_path)
+        except Exception as e:
+            print(f"Invoice {invoice_id}: could not move {path}: {str(e)}")
+
+    action = "Would move" if args.dry_run else "Moved"
+    print(f"{action} {moved} files, merged {duplicates} duplicates ({saved_bytes / 1e6:.1f} MB freed); "
+          f"{skipped} already in the store, {missing} without a file")
+
+
+if __name__ == "__main__":
+    main()
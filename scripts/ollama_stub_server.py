@@ -0,0 +1,173 @@
+"""
+Minimal stand-in for a local Ollama server, for exercising the Ollama
+backend (preload, keep_alive, num_ctx, streaming, prefix reuse) without a GPU.
+
+Implements /api/generate (streaming and not), /api/ps and /api/tags.
+Loading the model takes --load-seconds and it stays resident for the
+requested keep_alive. Prompt evaluation is simulated at --prompt-rate
+tokens/s, except for the prefix shared with the previous prompt, which is
+treated as already in the KV cache the way Ollama reuses it.
+
+Usage:
+    python scripts/ollama_stub_server.py --port 11434
+    OLLAMA_URL=http://localhost:11434/api/generate python -m backend.api.main
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RESPONSE = json.dumps({
+    "supplier_name": "ACME SARL",
+    "supplier_address": "12 Rue de la Paix, Tunis",
+    "customer_name": "Client Test",
+    "customer_address": "5 Avenue Habib Bourguiba, Sfax",
+    "invoice_number": "2024001",
+    "invoice_date": "15/01/2024",
+    "due_date": "15/02/2024",
+    "invoice_subtotal": "150.00",
+    "tax_amount": "28.50",
+    "tax_rate": "19%",
+    "invoice_total": "178.50",
+    "items": [
+        {"description": "Service", "quantity": "1", "unit_price": "150.00", "total_price": "150.00"}
+    ]
+})
+
+_state = {"loaded_until": 0.0, "last_prompt": "", "lock": threading.Lock()}
+
+
+def parse_keep_alive(value):
+    """Convert an Ollama keep_alive ('30m', '10s', 300, -1) to seconds."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+    if not match:
+        return 300.0
+    amount = float(match.group(1))
+    if amount < 0:
+        return float("inf")
+    return amount * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def common_prefix_len(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+    args = None
+
+    def log_message(self, fmt, *params):
+        print(f"[stub] {fmt % params}")
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            models = []
+            with _state["lock"]:
+                if _state["loaded_until"] > time.time():
+                    expires = _state["loaded_until"]
+                    models.append({
+                        "name": self.args.model,
+                        "model": self.args.model,
+                        "size_vram": 4 * 1024 ** 3,
+                        "expires_at": (datetime.fromtimestamp(expires, timezone.utc).isoformat()
+                                       if expires != float("inf") else None),
+                    })
+            self._send_json({"models": models})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.args.model, "model": self.args.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        keep_alive = parse_keep_alive(body.get("keep_alive"))
+        prompt = (body.get("system") or "") + (body.get("prompt") or "")
+        options = body.get("options") or {}
+        num_ctx = options.get("num_ctx", 2048)
+
+        # Model load
+        load_duration = 0.0
+        with _state["lock"]:
+            needs_load = _state["loaded_until"] <= time.time()
+        if needs_load:
+            time.sleep(self.args.load_seconds)
+            load_duration = self.args.load_seconds
+            with _state["lock"]:
+                _state["last_prompt"] = ""
+
+        with _state["lock"]:
+            _state["loaded_until"] = time.time() + keep_alive
+            reused_chars = common_prefix_len(_state["last_prompt"], prompt)
+            _state["last_prompt"] = prompt
+
+        if not body.get("prompt"):
+            self._send_json({"model": self.args.model, "response": "", "done": True,
+                             "load_duration": int(load_duration * 1e9)})
+            return
+
+        prompt_tokens = len(prompt) // 4 + 1
+        if prompt_tokens > num_ctx:
+            print(f"[stub] prompt of ~{prompt_tokens} tokens truncated to num_ctx={num_ctx}")
+        new_tokens = max(1, (len(prompt) - reused_chars) // 4)
+        time.sleep(new_tokens / self.args.prompt_rate)
+
+        pieces = re.findall(r".{1,8}", SAMPLE_RESPONSE, flags=re.S)
+        stats = {"load_duration": int(load_duration * 1e9), "prompt_eval_count": new_tokens,
+                 "eval_count": len(pieces)}
+        if not body.get("stream", True):
+            time.sleep(len(pieces) * self.args.token_delay)
+            self._send_json({"model": self.args.model, "response": SAMPLE_RESPONSE, "done": True, **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                self.wfile.write((json.dumps({"model": self.args.model, "response": piece, "done": False}) + "\n").encode())
+                self.wfile.flush()
+                time.sleep(self.args.token_delay)
+            self.wfile.write((json.dumps({"model": self.args.model, "response": "", "done": True, **stats}) + "\n").encode())
+        except (BrokenPipeError, ConnectionResetError):
+            print("[stub] client closed the stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for local testing")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", default="llama2")
+    parser.add_argument("--load-seconds", type=float, default=3.0)
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="prompt tokens evaluated per second")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds per generated chunk")
+    args = parser.parse_args()
+
+    OllamaStubHandler.args = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), OllamaStubHandler)
+    print(f"Ollama stub listening on http://127.0.0.1:{args.port} (model {args.model})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
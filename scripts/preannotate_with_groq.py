@@ -1,7 +1,6 @@
 import os
 import json
 import sys
-import time
 from PIL import Image
 
 # Add parent directory to path
@@ -103,30 +102,26 @@ def convert_to_coco_format(annotations, image_files):
     }
 
 def process_batch(groq_service, image_files, batch_start, batch_end):
-    """Process a batch of images"""
-    batch_annotations = []
+    """Process a batch of images: OCR sequentially, then call Groq concurrently"""
+    batch_files = image_files[batch_start:min(batch_end, len(image_files))]
+    prompts = []
     
-    for i in range(batch_start, min(batch_end, len(image_files))):
-        image_path = image_files[i]
-        print(f"Processing {i+1}/{len(image_files)}: {os.path.basename(image_path)}")
+    for offset, image_path in enumerate(batch_files):
+        print(f"Processing {batch_start+offset+1}/{len(image_files)}: {os.path.basename(image_path)}")
         
         try:
             # Run OCR
             ocr_tokens = run_paddle_ocr(image_path)
-            
-            # Build prompt and call Groq
-            prompt = groq_service.build_llm_prompt2(ocr_tokens)
-            annotation = groq_service.call_groq(prompt)
-            
-            batch_annotations.append(annotation)
-            
-            # Progress indicator
-            if (i + 1) % 10 == 0:
-                print(f"Completed {i+1} images...")
-                
+            prompts.append(groq_service.build_llm_prompt2(ocr_tokens))
         except Exception as e:
             print(f"Error processing {image_path}: {e}")
-            batch_annotations.append({"result": []})
+            prompts.append(None)
+    
+    # Send all prompts of the batch through the pooled client at once
+    valid = [p for p in prompts if p is not None]
+    results = iter(groq_service.call_groq_many(valid))
+    batch_annotations = [next(results) if p is not None else {"result": []} for p in prompts]
+    print(f"Completed {batch_start+len(batch_files)} images...")
     
     return batch_annotations
 
@@ -167,10 +162,7 @@ def main():
             json.dump(all_annotations, f, indent=2)
         print(f"Saved intermediate results to {temp_file}")
 
-        # Wait between batches to respect rate limits
-        if batch_end < len(image_files):
-            print("Waiting 30 seconds between batches...")
-            time.sleep(30)
+        # Groq rate limits are enforced by the shared limiter in the LLM client
 
     # Convert to COCO format
     print("\nConverting to COCO format...")
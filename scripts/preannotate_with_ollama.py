@@ -8,8 +8,8 @@ from PIL import Image
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.utils.utils import run_paddle_ocr
-from backend.services.ollama_service import call_ollama
-from backend.services.groq_service import GroqService  # Import for build_llm_prompt2
+from backend.services.ollama_service import call_ollama_many
+from backend.utils.prompts import build_llm_prompt
 
 # Configuration
 DATASET_DIR = "data/invoices/valid"
@@ -154,15 +154,12 @@ def convert_to_coco_format(annotations, image_files):
     }
 
 def process_batch(image_files, batch_start, batch_end):
-    """Process a batch of images with Ollama"""
-    batch_annotations = []
-    
-    # Create a temporary GroqService instance just for the prompt building
-    groq_service = GroqService()
+    """Process a batch of images: OCR sequentially, then call Ollama concurrently"""
+    batch_files = image_files[batch_start:min(batch_end, len(image_files))]
+    prompts = []
     
-    for i in range(batch_start, min(batch_end, len(image_files))):
-        image_path = image_files[i]
-        print(f"Processing {i+1}/{len(image_files)}: {os.path.basename(image_path)}")
+    for offset, image_path in enumerate(batch_files):
+        print(f"Processing {batch_start+offset+1}/{len(image_files)}: {os.path.basename(image_path)}")
         
         try:
             # Run OCR
@@ -170,29 +167,29 @@ def process_batch(image_files, batch_start, batch_end):
             
             if not ocr_tokens:
                 print(f"Warning: No OCR tokens found for {os.path.basename(image_path)}")
-                batch_annotations.append({"result": []})
+                prompts.append(None)
                 continue
             
-            # Build prompt using the same method as Groq
-            prompt = groq_service.build_llm_prompt2(ocr_tokens)
-            
-            # Call Ollama instead of Groq
-            annotation = call_ollama(prompt, force_result_key=True)
-            
-            # Validate that we got a proper response
-            if not isinstance(annotation, dict) or "result" not in annotation:
-                print(f"Warning: Invalid response format for {os.path.basename(image_path)}")
-                annotation = {"result": []}
-            
-            batch_annotations.append(annotation)
-            
-            # Progress indicator
-            if (i + 1) % 5 == 0:  # More frequent updates for debugging
-                print(f"Completed {i+1} images...")
-                
+            prompts.append(build_llm_prompt(ocr_tokens))
         except Exception as e:
             print(f"Error processing {image_path}: {e}")
-            batch_annotations.append({"result": []})
+            prompts.append(None)
+    
+    # Send all prompts of the batch through the pooled client at once
+    valid = [p for p in prompts if p is not None]
+    results = iter(call_ollama_many(valid))
+    
+    batch_annotations = []
+    for image_path, prompt in zip(batch_files, prompts):
+        annotation = next(results) if prompt is not None else {"result": []}
+        
+        # Validate that we got a proper response
+        if not isinstance(annotation, dict) or "result" not in annotation:
+            print(f"Warning: Invalid response format for {os.path.basename(image_path)}")
+            annotation = {"result": []}
+        
+        batch_annotations.append(annotation)
+    print(f"Completed {batch_start+len(batch_files)} images...")
     
     return batch_annotations
 